@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Module animation engine cho overlay ảnh
+
+Thay vì sinh biểu thức if(lt(t,...))/sin() cho scale/overlay/rotate (FFmpeg
+phải tính lại mỗi frame, scale còn khởi tạo lại swscale mỗi frame), engine
+tính trước bảng keyframe theo từng frame bằng NumPy:
+
+- scale / alpha / góc xoay  -> render sẵn thành chuỗi sprite PNG bằng Pillow (có cache)
+- vị trí (slide, bounce)    -> file lệnh sendcmd điều khiển x/y của overlay
+
+Nhờ vậy overlay có animation tốn chi phí gần như overlay tĩnh. Khi thiếu
+NumPy/Pillow, engine dùng lại biểu thức FFmpeg như trước.
+"""
+
+import os
+import math
+import shutil
+import hashlib
+import tempfile
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+try:
+    from PIL import Image
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+from image_cache import get_image_cache, image_overlay_input
+from filter_graph import escape_filter_path
+
+# FPS của sprite / bảng keyframe (khớp với mặc định của -loop 1)
+DEFAULT_FPS = 25
+
+ANIMATION_TYPES = (
+    "fade_in", "fade_out", "fade_in_out",
+    "slide_left", "slide_right", "slide_up", "slide_down",
+    "zoom_in", "zoom_out", "rotate_in", "bounce", "pulse"
+)
+
+# Tham số chung cho các hiệu ứng
+ZOOM_IN_FROM = 0.3       # zoom_in bắt đầu từ 30% kích thước
+ZOOM_OUT_TO = 0.1        # zoom_out thu nhỏ còn 10%
+BOUNCE_HEIGHT = 50       # Biên độ bounce (pixel)
+PULSE_AMPLITUDE = 0.3    # pulse dao động ±30%
+PULSE_FREQUENCY = 1.5    # Số nhịp pulse mỗi giây
+
+
+class AnimatedOverlay:
+    """Overlay có animation, gắn được vào bất kỳ FilterGraph nào"""
+
+    def __init__(self, build, instance=None):
+        self.build = build        # build(graph) -> (stream, x, y)
+        self.instance = instance  # Tên instance overlay (đích của sendcmd), None nếu không cần
+
+    def apply(self, graph, base, start_time, end_time):
+        """Thêm input + filter animation + overlay lên base, trả về stream kết quả"""
+        stream, x_expr, y_expr = self.build(graph)
+        return graph.overlay(base, stream, x_expr, y_expr, start_time, end_time, instance=self.instance)
+
+
+def compute_keyframes(animation, start_time, duration, animation_duration,
+                      size=(0, 0), fps=DEFAULT_FPS):
+    """
+    Tính bảng keyframe cho từng frame trong cửa sổ hiển thị
+
+    Args:
+        animation (str): Loại animation
+        start_time (float): Thời điểm bắt đầu hiển thị (giây)
+        duration (float): Thời lượng hiển thị (giây)
+        animation_duration (float): Thời lượng hiệu ứng (giây)
+        size (tuple): (width, height) của ảnh overlay, dùng cho slide
+        fps (int): Số frame mỗi giây
+
+    Returns:
+        dict: Mảng NumPy 't', 'dx', 'dy', 'scale', 'alpha', 'angle' (độ)
+    """
+    width, height = size
+    frame_count = max(1, int(math.ceil(duration * fps)))
+    t = start_time + np.arange(frame_count) / fps
+    anim_duration = max(animation_duration, 1.0 / fps)
+
+    # Tiến độ hiệu ứng vào (0 -> 1) và hiệu ứng ra (0 -> 1)
+    p_in = np.clip((t - start_time) / anim_duration, 0.0, 1.0)
+    p_out = np.clip((t - (start_time + duration - anim_duration)) / anim_duration, 0.0, 1.0)
+
+    dx = np.zeros(frame_count)
+    dy = np.zeros(frame_count)
+    scale = np.ones(frame_count)
+    alpha = np.ones(frame_count)
+    angle = np.zeros(frame_count)
+
+    if animation == "fade_out":
+        alpha = 1.0 - p_out
+    elif animation == "fade_in_out":
+        alpha = p_in * (1.0 - p_out)
+    elif animation == "slide_left":
+        dx = width * (1.0 - p_in)
+    elif animation == "slide_right":
+        dx = -width * (1.0 - p_in)
+    elif animation == "slide_up":
+        dy = height * (1.0 - p_in)
+    elif animation == "slide_down":
+        dy = -height * (1.0 - p_in)
+    elif animation == "zoom_in":
+        scale = ZOOM_IN_FROM + (1.0 - ZOOM_IN_FROM) * p_in
+    elif animation == "zoom_out":
+        scale = 1.0 - (1.0 - ZOOM_OUT_TO) * p_out
+    elif animation == "rotate_in":
+        angle = np.where(p_in < 1.0, 360.0 * p_in, 0.0)
+    elif animation == "bounce":
+        dy = np.where(p_in < 1.0, np.abs(np.sin(4 * np.pi * p_in)) * BOUNCE_HEIGHT, 0.0)
+    elif animation == "pulse":
+        scale = 1.0 + PULSE_AMPLITUDE * np.sin(2 * np.pi * PULSE_FREQUENCY * (t - start_time))
+    else:
+        # Mặc định: fade_in
+        alpha = p_in
+
+    return {
+        't': t,
+        'dx': np.rint(dx).astype(int),
+        'dy': np.rint(dy).astype(int),
+        'scale': np.round(scale, 3),
+        'alpha': np.round(alpha, 3),
+        'angle': np.round(angle, 1)
+    }
+
+def build_image_animation(image_path, scale, animation, start_time, duration, animation_duration,
+                          x_expr, y_expr, name, fps=DEFAULT_FPS):
+    """
+    Chuẩn bị một ảnh overlay có animation
+
+    Args:
+        image_path (str): Đường dẫn ảnh gốc
+        scale (float): Tỉ lệ thu nhỏ so với ảnh gốc
+        animation (str): Loại animation ('none' = ảnh tĩnh)
+        start_time (float): Thời điểm bắt đầu (giây)
+        duration (float): Thời lượng hiển thị (giây)
+        animation_duration (float): Thời lượng hiệu ứng (giây)
+        x_expr (str): Biểu thức x của overlay (có thể dùng overlay_w)
+        y_expr (str): Biểu thức y của overlay (có thể dùng overlay_h)
+        name (str): Tên duy nhất trong graph (dùng cho overlay@name)
+
+    Returns:
+        AnimatedOverlay: Overlay gắn vào graph bằng .apply()
+    """
+    if not animation or animation == "none":
+        def build_static(graph):
+            stream = image_overlay_input(graph, image_path, scale, start_time, duration)
+            return stream, x_expr, y_expr
+        return AnimatedOverlay(build_static)
+
+    cached_path = get_image_cache().get_scaled_image(image_path, scale)
+    if HAS_NUMPY and HAS_PIL and cached_path:
+        try:
+            return _build_precomputed(cached_path, animation, start_time, duration, animation_duration,
+                                      x_expr, y_expr, name, fps)
+        except Exception as e:
+            print(f"⚠️ Không thể render sprite animation, dùng biểu thức FFmpeg: {e}")
+
+    # Fallback: biểu thức FFmpeg tính theo từng frame
+    def build_expression(graph):
+        stream = image_overlay_input(graph, image_path, scale, start_time, duration)
+        return expression_animation(graph, stream, animation, start_time, duration,
+                                    animation_duration, x_expr, y_expr)
+    return AnimatedOverlay(build_expression)
+
+def _build_precomputed(cached_path, animation, start_time, duration, animation_duration,
+                       x_expr, y_expr, name, fps):
+    """Overlay dựa trên keyframe: sprite cho scale/alpha/xoay, sendcmd cho vị trí"""
+    with Image.open(cached_path) as img:
+        base_size = img.size
+
+    keyframes = compute_keyframes(animation, start_time, duration, animation_duration, base_size, fps)
+
+    needs_sprite = (
+        np.any(keyframes['scale'] != 1.0) or
+        np.any(keyframes['alpha'] != 1.0) or
+        np.any(keyframes['angle'] != 0.0)
+    )
+    needs_position = np.any(keyframes['dx'] != 0) or np.any(keyframes['dy'] != 0)
+
+    sprite_pattern = None
+    if needs_sprite:
+        sprite_pattern, sprite_size = _render_sprites(
+            cached_path, keyframes, animation, duration, animation_duration, fps
+        )
+        # Sprite có khung lớn hơn ảnh gốc (để chứa lúc phóng to/xoay), bù lại vị trí
+        x_expr = _anchor_expression(x_expr, 'overlay_w', base_size[0], sprite_size[0])
+        y_expr = _anchor_expression(y_expr, 'overlay_h', base_size[1], sprite_size[1])
+
+    instance = None
+    command_path = None
+    if needs_position:
+        instance = name
+        command_path = _write_position_commands(f"overlay@{instance}", keyframes, x_expr, y_expr, fps)
+        x_expr = f"{x_expr}{int(keyframes['dx'][0]):+d}"
+        y_expr = f"{y_expr}{int(keyframes['dy'][0]):+d}"
+
+    def build(graph):
+        if sprite_pattern:
+            stream = graph.input(sprite_pattern, ['-framerate', str(fps)])
+            stream = graph.shift_pts(stream, start_time)
+        else:
+            stream = image_overlay_input(graph, cached_path, 1.0, start_time, duration)
+        if command_path:
+            stream = graph.filter(stream, 'sendcmd', f=f"'{escape_filter_path(command_path)}'")
+        return stream, x_expr, y_expr
+
+    return AnimatedOverlay(build, instance)
+
+def _anchor_expression(expr, size_var, base_size, sprite_size):
+    """Giữ tâm sprite trùng tâm ảnh gốc: thay overlay_w/h bằng kích thước gốc rồi trừ phần đệm"""
+    expr = expr.replace(size_var, str(base_size))
+    pad = (sprite_size - base_size) // 2
+    return f"({expr})-{pad}" if pad else expr
+
+def _sprite_cache_dir(cached_path, animation, duration, animation_duration, fps):
+    """Thư mục cache sprite theo (ảnh, animation, thời lượng, fps)"""
+    key_source = f"{get_image_cache().file_hash(cached_path)}|{animation}|{duration}|{animation_duration}|{fps}"
+    key = hashlib.sha1(key_source.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(get_image_cache().cache_dir, "sprites", key)
+
+def _render_sprites(cached_path, keyframes, animation, duration, animation_duration, fps):
+    """
+    Render chuỗi sprite PNG từ bảng keyframe (chỉ render frame có trạng thái mới,
+    frame trùng trạng thái được hard-link lại)
+
+    Render vào thư mục tạm cạnh cache rồi đổi tên (atomic) thành thư mục cache:
+    process khác (segment worker, daemon, job API) không bao giờ thấy thư mục dở
+    dang; nhiều process cùng render thì bản đổi tên trước được giữ.
+
+    Returns:
+        tuple: (pattern đường dẫn cho -i, (width, height) của sprite)
+    """
+    sprite_dir = _sprite_cache_dir(cached_path, animation, duration, animation_duration, fps)
+    pattern = os.path.join(sprite_dir, "frame_%05d.png")
+    done_marker = os.path.join(sprite_dir, "done")
+
+    with Image.open(cached_path) as img:
+        base = img.convert("RGBA")
+    base_width, base_height = base.size
+
+    # Kích thước khung sprite cố định: đủ chứa ảnh lúc lớn nhất (và khi xoay)
+    max_scale = max(1.0, float(keyframes['scale'].max()))
+    if np.any(keyframes['angle'] != 0.0):
+        diagonal = int(math.ceil(math.hypot(base_width, base_height) * max_scale))
+        sprite_size = (diagonal, diagonal)
+    else:
+        sprite_size = (int(math.ceil(base_width * max_scale)), int(math.ceil(base_height * max_scale)))
+
+    if os.path.exists(done_marker):
+        return pattern, sprite_size
+
+    parent_dir = os.path.dirname(sprite_dir)
+    os.makedirs(parent_dir, exist_ok=True)
+    temp_dir = tempfile.mkdtemp(prefix=f".{os.path.basename(sprite_dir)}.", dir=parent_dir)
+    temp_pattern = os.path.join(temp_dir, "frame_%05d.png")
+    try:
+        previous_state = None
+        previous_path = None
+
+        for i in range(len(keyframes['t'])):
+            frame_path = temp_pattern % (i + 1)
+            state = (float(keyframes['scale'][i]), float(keyframes['alpha'][i]), float(keyframes['angle'][i]))
+
+            if state == previous_state:
+                try:
+                    os.link(previous_path, frame_path)
+                except OSError:
+                    shutil.copyfile(previous_path, frame_path)
+                continue
+
+            frame_scale, frame_alpha, frame_angle = state
+            sprite = base
+            if frame_scale != 1.0:
+                sprite = sprite.resize((max(1, round(base_width * frame_scale)),
+                                        max(1, round(base_height * frame_scale))), Image.LANCZOS)
+            if frame_angle:
+                sprite = sprite.rotate(frame_angle, resample=Image.BICUBIC, expand=True)
+            if frame_alpha != 1.0:
+                pixels = np.array(sprite)
+                pixels[..., 3] = (pixels[..., 3] * frame_alpha).astype(np.uint8)
+                sprite = Image.fromarray(pixels, "RGBA")
+
+            canvas = Image.new("RGBA", sprite_size, (0, 0, 0, 0))
+            canvas.alpha_composite(sprite, ((sprite_size[0] - sprite.width) // 2,
+                                            (sprite_size[1] - sprite.height) // 2))
+            canvas.save(frame_path, format="PNG")
+
+            previous_state = state
+            previous_path = frame_path
+
+        with open(os.path.join(temp_dir, "done"), 'w') as f:
+            f.write(str(len(keyframes['t'])))
+
+        if os.path.isdir(sprite_dir) and not os.path.exists(done_marker):
+            # Thư mục dở dang từ phiên bản cũ (render thẳng vào cache)
+            shutil.rmtree(sprite_dir, ignore_errors=True)
+        try:
+            os.rename(temp_dir, sprite_dir)
+        except OSError:
+            # Process khác đã đổi tên xong trước: dùng bản của nó
+            if not os.path.exists(done_marker):
+                raise
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print(f"🎞️ Sprite animation {animation}: {len(keyframes['t'])} frame ({sprite_size[0]}x{sprite_size[1]})")
+    return pattern, sprite_size
+
+def _write_position_commands(overlay_name, keyframes, x_expr, y_expr, fps):
+    """Ghi file lệnh sendcmd cập nhật x/y của overlay mỗi khi vị trí thay đổi"""
+    lines = []
+    previous = None
+    for t, dx, dy in zip(keyframes['t'], keyframes['dx'], keyframes['dy']):
+        position = (int(dx), int(dy))
+        if position == previous:
+            continue
+        lines.append(
+            f"{t:.4f} {overlay_name} x {x_expr}{position[0]:+d}, "
+            f"{overlay_name} y {y_expr}{position[1]:+d};"
+        )
+        previous = position
+
+    content = "\n".join(lines) + "\n"
+    command_dir = os.path.join(get_image_cache().cache_dir, "commands")
+    os.makedirs(command_dir, exist_ok=True)
+    command_path = os.path.join(command_dir, f"{hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]}.txt")
+
+    if not os.path.exists(command_path):
+        with open(command_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+    return command_path
+
+def expression_animation(graph, stream, animation, start_time, duration, animation_duration,
+                         x_expr, y_expr):
+    """
+    Animation bằng biểu thức FFmpeg (fallback khi không có NumPy/Pillow,
+    và cho overlay là video - không thể render sprite)
+
+    Returns:
+        tuple: (stream, x_expr, y_expr)
+    """
+    fade_start = start_time
+    fade_end = start_time + animation_duration
+    fade_out_start = start_time + duration - animation_duration
+
+    if animation == "fade_out":
+        return graph.fade(stream, 'out', fade_out_start, animation_duration), x_expr, y_expr
+
+    elif animation == "fade_in_out":
+        stream = graph.fade(stream, 'in', fade_start, animation_duration)
+        return graph.fade(stream, 'out', fade_out_start, animation_duration), x_expr, y_expr
+
+    elif animation in ("slide_left", "slide_right", "slide_up", "slide_down"):
+        progress = f"(1-min(1,(t-{fade_start})/{animation_duration}))"
+        if animation == "slide_left":
+            x_expr = f"{x_expr}+overlay_w*{progress}"
+        elif animation == "slide_right":
+            x_expr = f"{x_expr}-overlay_w*{progress}"
+        elif animation == "slide_up":
+            y_expr = f"{y_expr}+overlay_h*{progress}"
+        else:
+            y_expr = f"{y_expr}-overlay_h*{progress}"
+        return stream, f"'{x_expr}'", f"'{y_expr}'"
+
+    elif animation == "zoom_in":
+        zoom_factor = f"if(lt(t,{fade_end}),{ZOOM_IN_FROM}+{1 - ZOOM_IN_FROM}*(t-{fade_start})/{animation_duration},1)"
+        return graph.scale(stream, f"'iw*({zoom_factor})'", f"'ih*({zoom_factor})'", eval='frame'), x_expr, y_expr
+
+    elif animation == "zoom_out":
+        zoom_factor = f"if(gt(t,{fade_out_start}),1-{1 - ZOOM_OUT_TO}*(t-{fade_out_start})/{animation_duration},1)"
+        return graph.scale(stream, f"'iw*({zoom_factor})'", f"'ih*({zoom_factor})'", eval='frame'), x_expr, y_expr
+
+    elif animation == "rotate_in":
+        angle = f"if(lt(t,{fade_end}),2*PI*(t-{fade_start})/{animation_duration},0)"
+        return graph.filter(stream, 'rotate', f"'{angle}'", fillcolor='none'), x_expr, y_expr
+
+    elif animation == "bounce":
+        y_expr = f"{y_expr}+if(lt(t,{fade_end}),abs(sin(4*PI*(t-{fade_start})/{animation_duration}))*{BOUNCE_HEIGHT},0)"
+        return stream, x_expr, f"'{y_expr}'"
+
+    elif animation == "pulse":
+        pulse_scale = f"1+{PULSE_AMPLITUDE}*sin(2*PI*{PULSE_FREQUENCY}*(t-{fade_start}))"
+        return graph.scale(stream, f"'iw*({pulse_scale})'", f"'ih*({pulse_scale})'", eval='frame'), x_expr, y_expr
+
+    else:
+        # Mặc định: fade_in
+        return graph.fade(stream, 'in', fade_start, animation_duration), x_expr, y_expr
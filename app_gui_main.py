@@ -40,6 +40,7 @@ OPTIMAL_CHROMA_REMOVAL = {
 # Import main application
 try:
     from main import AutoVideoEditor
+    from ffmpeg_runner import add_progress_listener, remove_progress_listener, progress_context
 except ImportError as e:
     print(f"❌ Lỗi import main application: {e}")
     sys.exit(1)
@@ -671,7 +672,8 @@ class VideoEditorGUI:
         self.progress_bar = ttk.Progressbar(
             main_frame,
             variable=self.progress_var,
-            mode='indeterminate'
+            mode='determinate',
+            maximum=100
         )
         self.progress_bar.grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(0, 10))
         row += 1
@@ -1719,15 +1721,37 @@ class VideoEditorGUI:
 
         self.status_label.config(text=f"🎬 Đang xử lý {len(video_files)} video... Vui lòng chờ.")
         self.progress_var.set(0)
-        self.progress_bar.start()
+
+        total_files = len(video_files)
+
+        # Tiến độ FFmpeg trực tiếp: % tổng = (video đã xong + phần video hiện tại) / tổng
+        def show_progress(event):
+            stage_count = event.get('stage_count') or 1
+            video_fraction = min((event.get('stage_index', 0) + (event.get('fraction') or 0)) / stage_count, 1.0)
+            percentage = (event.get('video_index', 0) + video_fraction) / total_files * 100
+
+            status = (f"🎬 ({event.get('video_index', 0) + 1}/{total_files}) "
+                      f"{event.get('stage', 'ffmpeg')} {event.get('stage_index', 0) + 1}/{stage_count}")
+            if event.get('fraction') is not None:
+                status += f" {event['fraction'] * 100:.0f}%"
+            if event.get('speed'):
+                status += f" | {event['speed']:.1f}x"
+            if event.get('eta') is not None:
+                status += f" | còn {int(event['eta'])}s"
+            self.progress_var.set(percentage)
+            self.status_label.config(text=status)
+
+        def on_progress(event):
+            if 'video_index' in event:
+                self.root.after(0, show_progress, event)
 
         # Thực hiện xử lý trong thread riêng
         def worker():
+            add_progress_listener(on_progress)
             try:
                 self.log_message(f"🎬 Bắt đầu xử lý hàng loạt {len(video_files)} video...")
                 editor = AutoVideoEditor()
                 
-                total_files = len(video_files)
                 success_count = 0
                 error_count = 0
                 
@@ -1740,17 +1764,19 @@ class VideoEditorGUI:
                         self.log_message(f"📹 ({i+1}/{total_files}) Đang xử lý: {os.path.basename(input_video_path)}")
                         
                         # Xử lý video với kiểu phụ đề
-                        editor.process_video(
-                            input_video_path=input_video_path,
-                            output_video_path=output_video_path,
-                            source_language=self.source_language.get(),
-                            target_language=self.target_language.get(),
-                            video_overlay_settings=video_overlay_settings,
-                            words_per_line=self.words_per_line.get(),
-                            enable_subtitle=self.enable_subtitle.get(),
-                            subtitle_style=subtitle_style
-                        )
+                        with progress_context(video_index=i):
+                            editor.process_video(
+                                input_video_path=input_video_path,
+                                output_video_path=output_video_path,
+                                source_language=self.source_language.get(),
+                                target_language=self.target_language.get(),
+                                video_overlay_settings=video_overlay_settings,
+                                words_per_line=self.words_per_line.get(),
+                                enable_subtitle=self.enable_subtitle.get(),
+                                subtitle_style=subtitle_style
+                            )
                         
+                        self.root.after(0, self.progress_var.set, (i + 1) / total_files * 100)
                         success_count += 1
                         self.log_message(f"✅ ({i+1}/{total_files}) Hoàn thành: {os.path.basename(output_video_path)}")
                         
@@ -1771,8 +1797,7 @@ class VideoEditorGUI:
                 import traceback
                 self.log_message(f"Chi tiết lỗi: {traceback.format_exc()}")
             finally:
-                self.progress_bar.stop()
-                self.progress_var.set(0)
+                remove_progress_listener(on_progress)
 
         threading.Thread(target=worker, daemon=True).start()
     
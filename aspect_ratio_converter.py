@@ -1,12 +1,85 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-Module chuyển đổi tỉ lệ khung hình video thành 9:16
+Module chuyển đổi tỉ lệ khung hình video (9:16 và xuất nhiều tỉ lệ cùng lúc)
 """
 
 import os
 import subprocess
 from pathlib import Path
+from filter_graph import FilterGraph
+from stage_planner import matches_frame, materialize
+from encoder_profiles import encoder_args
+from ffmpeg_runner import run_ffmpeg
+
+# Các tỉ lệ khung hình thường dùng cho mạng xã hội
+ASPECT_PRESETS = {
+    "9:16": (9, 16),   # TikTok / Reels / Shorts
+    "1:1": (1, 1),     # Feed vuông
+    "4:5": (4, 5),     # Feed dọc Instagram/Facebook
+    "16:9": (16, 9)    # YouTube ngang
+}
+
+def parse_aspect(aspect):
+    """
+    Chuyển tỉ lệ dạng "9:16" hoặc (9, 16) thành tuple số nguyên
+
+    Returns:
+        tuple: (aspect_width, aspect_height)
+    """
+    if isinstance(aspect, str):
+        if aspect in ASPECT_PRESETS:
+            return ASPECT_PRESETS[aspect]
+        try:
+            aspect_width, aspect_height = (int(part) for part in aspect.split(':'))
+        except ValueError:
+            raise Exception(f"Tỉ lệ khung hình không hợp lệ: {aspect}")
+    else:
+        aspect_width, aspect_height = aspect
+
+    if aspect_width <= 0 or aspect_height <= 0:
+        raise Exception(f"Tỉ lệ khung hình không hợp lệ: {aspect}")
+    return int(aspect_width), int(aspect_height)
+
+def aspect_output_size(aspect, target_width=1080):
+    """Kích thước đầu ra cho tỉ lệ (chiều cao làm tròn số chẵn cho yuv420p)"""
+    aspect_width, aspect_height = parse_aspect(aspect)
+    target_height = int(round(target_width * aspect_height / aspect_width / 2)) * 2
+    return target_width, target_height
+
+BLUR_DOWNSCALE = 8   # Lớp nền mờ được tính ở 1/8 độ phân giải
+BLUR_RADIUS = 4      # Bán kính boxblur ở độ phân giải thấp (~32px ở khung đầy đủ)
+
+def blur_fill(graph, stream, width, height, downscale=BLUR_DOWNSCALE, blur_radius=BLUR_RADIUS):
+    """
+    Đưa stream vào khung width x height với nền là bản phóng to + làm mờ của chính nó.
+    Nền được scale nhỏ downscale lần, blur rồi scale lại, rẻ hơn nhiều so với
+    blur ở độ phân giải đầy đủ; vẫn chậm hơn pad do overlay và do x264 phải
+    encode nền có chi tiết (xem benchmarks/bench_fill_modes.py).
+    
+    Args:
+        graph (FilterGraph): Graph đang dựng
+        stream (Stream): Video nguồn
+        width, height (int): Kích thước khung đích
+        
+    Returns:
+        Stream: Video đã ghép nền mờ
+    """
+    small_width = max(2, width // downscale // 2 * 2)
+    small_height = max(2, height // downscale // 2 * 2)
+    
+    # Nền: phủ kín khung ở độ phân giải thấp, blur, rồi phóng về kích thước đích
+    # fast_bilinear cả lúc thu nhỏ: aliasing bị boxblur xóa, rẻ hơn bicubic trên frame đầy đủ
+    background = graph.scale(stream, small_width, small_height, force_original_aspect_ratio='increase',
+                             flags='fast_bilinear')
+    background = graph.filter(background, 'crop', small_width, small_height)
+    background = graph.filter(background, 'boxblur', luma_radius=blur_radius, luma_power=2)
+    background = graph.scale(background, width, height, flags='fast_bilinear')
+    
+    # Tiền cảnh: giữ toàn bộ nội dung, căn giữa
+    foreground = graph.scale(stream, width, height, force_original_aspect_ratio='decrease')
+    combined = graph.overlay(background, foreground, '(W-w)/2', '(H-h)/2', eof_action=None)
+    return graph.filter(combined, 'setsar', 1)
 
 class AspectRatioConverter:
     def __init__(self):
@@ -39,7 +112,8 @@ class AspectRatioConverter:
         )
     
     def convert_to_9_16(self, input_video_path, output_video_path, 
-                       target_width=1080, background_color='black'):
+                       target_width=1080, background_color='black', fill_mode='pad',
+                       encoder_profile=None, force_encode=False):
         """
         Chuyển đổi video thành tỉ lệ 9:16
         
@@ -48,11 +122,18 @@ class AspectRatioConverter:
             output_video_path (str): Đường dẫn lưu video đầu ra
             target_width (int): Chiều rộng đích (mặc định 1080)
             background_color (str): Màu nền ('black', 'white', etc.)
+            fill_mode (str): Cách lấp khung khi khác tỉ lệ: 'pad' (viền màu),
+                             'blur' (nền mờ từ chính video) hoặc 'smart_crop'
+                             (video ngang: cắt theo chủ thể)
+            encoder_profile (str, optional): Profile encoder (encoder_profiles), None = mặc định
+            force_encode (bool): Encode lại kể cả khi video đã đúng khung đích
         """
         try:
             # Tính toán chiều cao cho tỉ lệ 9:16
             target_height = int(target_width * 16 / 9)
             
+            video_args = encoder_args(encoder_profile)
+            
             print(f"📱 Đang chuyển đổi video thành tỉ lệ 9:16 ({target_width}x{target_height})...")
             
             # Lấy thông tin video gốc
@@ -66,88 +147,168 @@ class AspectRatioConverter:
             print(f"📊 Video đích: {target_width}x{target_height} (tỉ lệ: {target_ratio:.2f})")
             
             # Xác định phương pháp chuyển đổi
-            if abs(original_ratio - target_ratio) < 0.01:
+            if not force_encode and matches_frame(video_info, target_width, target_height):
+                # Đã đúng khung đích: không encode lại, chỉ copy/remux
+                method = materialize(input_video_path, output_video_path, ffmpeg_path=self.ffmpeg_path)
+                print(f"⚡ Video đã đúng {target_width}x{target_height}, bỏ qua scale ({method})")
+            elif abs(original_ratio - target_ratio) < 0.01:
                 # Video đã có tỉ lệ gần đúng, chỉ cần resize
                 self._simple_resize(input_video_path, output_video_path, 
-                                  target_width, target_height)
+                                  target_width, target_height, video_args)
+            elif fill_mode == 'blur':
+                # Khác tỉ lệ, lấp khung bằng nền mờ tính ở độ phân giải thấp
+                self._convert_with_blur_background(input_video_path, output_video_path,
+                                                   target_width, target_height, video_args)
+            elif original_ratio > target_ratio and fill_mode == 'smart_crop':
+                # Video rộng hơn mục tiêu, cắt theo chủ thể thay vì thu nhỏ thành dải ngang
+                self._convert_wide_video_smart_crop(input_video_path, output_video_path,
+                                                    target_width, target_height, video_info,
+                                                    background_color, video_args)
             elif original_ratio > target_ratio:
                 # Video rộng hơn mục tiêu, cần cắt hoặc thêm thanh đen
                 self._convert_wide_video(input_video_path, output_video_path,
-                                       target_width, target_height, background_color)
+                                       target_width, target_height, background_color, video_args)
             else:
                 # Video hẹp hơn mục tiêu, cần thêm thanh đen
                 self._convert_narrow_video(input_video_path, output_video_path,
-                                         target_width, target_height, background_color)
+                                         target_width, target_height, background_color, video_args)
             
             print(f"✅ Chuyển đổi tỉ lệ khung hình thành công: {output_video_path}")
             
         except Exception as e:
             raise Exception(f"Lỗi chuyển đổi tỉ lệ khung hình: {str(e)}")
     
-    def _simple_resize(self, input_path, output_path, width, height):
+    def _simple_resize(self, input_path, output_path, width, height, video_args=()):
         """Resize đơn giản video"""
+        graph = FilterGraph()
+        graph.scale(graph.input(input_path), width, height)
+        
         cmd = [
             self.ffmpeg_path,
             '-i', input_path,
-            '-vf', f'scale={width}:{height}',
+            '-vf', graph.compile_simple(),
+            *video_args,
             '-c:a', 'copy',
             '-y',
             output_path
         ]
         
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = run_ffmpeg(cmd)
         if result.returncode != 0:
             raise Exception(f"Lỗi resize video: {result.stderr}")
     
-    def _convert_wide_video(self, input_path, output_path, target_width, target_height, bg_color):
+    def _convert_wide_video(self, input_path, output_path, target_width, target_height, bg_color,
+                           video_args=()):
         """
         Chuyển đổi video rộng thành 9:16
         Có thể cắt hoặc thêm thanh đen tùy chọn
         """
         # Phương pháp 1: Cắt video để vừa khung hình 9:16 (crop center)
-        crop_filter = f"crop={target_width}:{target_height}:(iw-{target_width})/2:(ih-{target_height})/2"
-        
         # Phương pháp 2: Scale video và thêm thanh đen
-        scale_filter = f"scale={target_width}:-1"
-        pad_filter = f"pad={target_width}:{target_height}:(ow-iw)/2:(oh-ih)/2:{bg_color}"
-        
         # Sử dụng phương pháp scale + pad để giữ toàn bộ nội dung
-        video_filter = f"{scale_filter},{pad_filter}"
+        graph = FilterGraph()
+        stream = graph.scale(graph.input(input_path), target_width, -1)
+        graph.filter(stream, 'pad', target_width, target_height, '(ow-iw)/2', '(oh-ih)/2', bg_color)
         
         cmd = [
             self.ffmpeg_path,
             '-i', input_path,
-            '-vf', video_filter,
+            '-vf', graph.compile_simple(),
+            *video_args,
             '-c:a', 'copy',
             '-y',
             output_path
         ]
         
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = run_ffmpeg(cmd)
         if result.returncode != 0:
             raise Exception(f"Lỗi chuyển đổi video rộng: {result.stderr}")
     
-    def _convert_narrow_video(self, input_path, output_path, target_width, target_height, bg_color):
+    def _convert_with_blur_background(self, input_path, output_path, target_width, target_height,
+                                      video_args=()):
+        """Chuyển đổi sang khung đích với nền mờ thay cho viền màu"""
+        graph = FilterGraph()
+        graph.output(blur_fill(graph, graph.input(input_path), target_width, target_height))
+        input_args, filter_complex, _ = graph.compile()
+        
+        cmd = [
+            self.ffmpeg_path,
+            *input_args,
+            '-filter_complex', filter_complex,
+            *video_args,
+            '-c:a', 'copy',
+            '-y',
+            output_path
+        ]
+        
+        result = run_ffmpeg(cmd)
+        if result.returncode != 0:
+            raise Exception(f"Lỗi chuyển đổi với nền mờ: {result.stderr}")
+    
+    def _convert_wide_video_smart_crop(self, input_path, output_path, target_width, target_height,
+                                       video_info, bg_color, video_args=()):
+        """
+        Chuyển đổi video rộng thành 9:16 bằng smart crop: phân tích chủ thể trên
+        frame nhỏ rồi điều khiển một filter crop duy nhất bằng sendcmd
+        """
+        from smart_crop import plan_smart_crop, CROP_INSTANCE
+        from filter_graph import escape_filter_path
+        
+        try:
+            plan = plan_smart_crop(
+                self.ffmpeg_path, input_path,
+                (video_info['width'], video_info['height']),
+                target_width / target_height
+            )
+        except Exception as e:
+            print(f"⚠️ Không thể phân tích smart crop, dùng pad: {e}")
+            return self._convert_wide_video(input_path, output_path, target_width, target_height, bg_color,
+                                           video_args)
+        
+        graph = FilterGraph()
+        stream = graph.input(input_path)
+        stream = graph.filter(stream, 'sendcmd', f=f"'{escape_filter_path(plan['command_path'])}'")
+        stream = graph.filter(stream, 'crop', instance=CROP_INSTANCE,
+                              w=plan['crop_width'], h='ih', x=plan['initial_x'], y=0)
+        stream = graph.scale(stream, target_width, target_height)
+        graph.filter(stream, 'setsar', 1)
+        
+        cmd = [
+            self.ffmpeg_path,
+            '-i', input_path,
+            '-vf', graph.compile_simple(),
+            *video_args,
+            '-c:a', 'copy',
+            '-y',
+            output_path
+        ]
+        
+        result = run_ffmpeg(cmd)
+        if result.returncode != 0:
+            raise Exception(f"Lỗi smart crop video rộng: {result.stderr}")
+    
+    def _convert_narrow_video(self, input_path, output_path, target_width, target_height, bg_color,
+                              video_args=()):
         """
         Chuyển đổi video hẹp thành 9:16
         Thêm thanh đen ở hai bên
         """
         # Scale video theo chiều cao và thêm thanh đen hai bên
-        scale_filter = f"scale=-1:{target_height}"
-        pad_filter = f"pad={target_width}:{target_height}:(ow-iw)/2:(oh-ih)/2:{bg_color}"
-        
-        video_filter = f"{scale_filter},{pad_filter}"
+        graph = FilterGraph()
+        stream = graph.scale(graph.input(input_path), -1, target_height)
+        graph.filter(stream, 'pad', target_width, target_height, '(ow-iw)/2', '(oh-ih)/2', bg_color)
         
         cmd = [
             self.ffmpeg_path,
             '-i', input_path,
-            '-vf', video_filter,
+            '-vf', graph.compile_simple(),
+            *video_args,
             '-c:a', 'copy',
             '-y',
             output_path
         ]
         
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = run_ffmpeg(cmd)
         if result.returncode != 0:
             raise Exception(f"Lỗi chuyển đổi video hẹp: {result.stderr}")
     
@@ -192,16 +353,87 @@ class AspectRatioConverter:
                 'width': int(video_stream['width']),
                 'height': int(video_stream['height']),
                 'fps': eval(video_stream.get('r_frame_rate', '30/1')),
-                'duration': float(video_stream.get('duration', 0))
+                'duration': float(video_stream.get('duration', 0)),
+                'sar': video_stream.get('sample_aspect_ratio', '1:1')
             }
             
         except Exception as e:
             raise Exception(f"Không thể lấy thông tin video: {str(e)}")
     
+    def convert_multi_aspect(self, input_path, outputs, target_width=1080,
+                             background_color='black', fit_mode='pad', encoder_profile=None):
+        """
+        Xuất nhiều tỉ lệ khung hình từ một lần decode: stream nguồn được split,
+        mỗi nhánh scale/pad (hoặc crop) về một tỉ lệ, tất cả ghi trong một lệnh FFmpeg.
+        Số output chỉ làm tăng chi phí encode, không decode lại nguồn.
+        
+        Args:
+            input_path (str): Đường dẫn video đầu vào
+            outputs (dict): {tỉ lệ: đường dẫn}, vd {"9:16": "a.mp4", "1:1": "b.mp4", (4, 5): "c.mp4"}
+            target_width (int): Chiều rộng đầu ra của mọi tỉ lệ
+            background_color (str): Màu nền khi pad
+            fit_mode (str): 'pad' (giữ toàn bộ nội dung, thêm viền), 'blur' (giữ toàn bộ nội dung,
+                            nền mờ) hoặc 'crop' (cắt giữa, lấp đầy khung)
+            encoder_profile (str, optional): Profile encoder dùng cho mọi output
+            
+        Returns:
+            dict: {tỉ lệ: (width, height)} đã xuất
+        """
+        if not outputs:
+            raise Exception("Chưa chọn tỉ lệ khung hình nào để xuất")
+        if fit_mode not in ('pad', 'blur', 'crop'):
+            raise Exception(f"fit_mode không hợp lệ: {fit_mode}")
+        
+        video_args = encoder_args(encoder_profile)
+        graph = FilterGraph()
+        source = graph.input(input_path)
+        
+        output_sizes = {}
+        output_args = []
+        for i, (aspect, output_path) in enumerate(outputs.items()):
+            width, height = aspect_output_size(aspect, target_width)
+            output_sizes[aspect] = (width, height)
+            
+            if fit_mode == 'pad':
+                branch = graph.scale(source, width, height, force_original_aspect_ratio='decrease')
+                branch = graph.filter(branch, 'pad', width, height, '(ow-iw)/2', '(oh-ih)/2', background_color)
+                branch = graph.filter(branch, 'setsar', 1)
+            elif fit_mode == 'blur':
+                branch = blur_fill(graph, source, width, height)
+            else:
+                branch = graph.scale(source, width, height, force_original_aspect_ratio='increase')
+                branch = graph.filter(branch, 'crop', width, height)
+                branch = graph.filter(branch, 'setsar', 1)
+            
+            label = f"aspect{i}"
+            graph.output(branch, label)
+            output_args.extend(['-map', f'[{label}]', '-map', '0:a?', *video_args, '-c:a', 'copy', output_path])
+        
+        input_args, filter_complex, _ = graph.compile()
+        
+        cmd = [
+            self.ffmpeg_path,
+            '-y',
+            *input_args,
+            '-filter_complex', filter_complex,
+            *output_args
+        ]
+        
+        print(f"🎯 Đang xuất {len(outputs)} tỉ lệ khung hình từ một lần decode...")
+        for aspect, (width, height) in output_sizes.items():
+            print(f"   📐 {aspect}: {width}x{height} -> {outputs[aspect]}")
+        
+        result = run_ffmpeg(cmd)
+        if result.returncode != 0:
+            raise Exception(f"Lỗi xuất nhiều tỉ lệ khung hình: {result.stderr}")
+        
+        print(f"✅ Xuất {len(outputs)} tỉ lệ khung hình thành công!")
+        return output_sizes
+    
     def create_custom_aspect_ratio(self, input_path, output_path, 
                                   aspect_width, aspect_height, 
                                   target_resolution_width=1080,
-                                  background_color='black'):
+                                  background_color='black', encoder_profile=None):
         """
         Tạo video với tỉ lệ khung hình tùy chỉnh
         
@@ -212,15 +444,18 @@ class AspectRatioConverter:
             aspect_height (int): Tỉ lệ chiều cao
             target_resolution_width (int): Độ phân giải chiều rộng mục tiêu
             background_color (str): Màu nền
+            encoder_profile (str, optional): Profile encoder
         """
-        target_resolution_height = int(target_resolution_width * aspect_height / aspect_width)
+        aspect = (aspect_width, aspect_height)
+        target_resolution_height = aspect_output_size(aspect, target_resolution_width)[1]
         
         print(f"🎯 Chuyển đổi thành tỉ lệ {aspect_width}:{aspect_height} "
               f"({target_resolution_width}x{target_resolution_height})")
         
-        self.convert_to_9_16(
-            input_path, 
-            output_path,
+        self.convert_multi_aspect(
+            input_path,
+            {aspect: output_path},
             target_width=target_resolution_width,
-            background_color=background_color
+            background_color=background_color,
+            encoder_profile=encoder_profile
         )
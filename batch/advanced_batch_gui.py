@@ -13,6 +13,7 @@ import time
 import psutil
 from datetime import datetime, timedelta
 from .advanced_batch_processor import AdvancedBatchProcessor, process_large_batch
+from resource_monitor import get_sampler
 
 class AdvancedBatchGUI:
     """GUI nâng cao cho batch processing"""
@@ -29,7 +30,7 @@ class AdvancedBatchGUI:
         self.max_workers = tk.IntVar(value=psutil.cpu_count())
         self.memory_limit = tk.IntVar(value=8)
         self.priority_mode = tk.BooleanVar(value=True)
-        self.priority_by_size = tk.BooleanVar(value=True)
+        self.priority_by_size = tk.BooleanVar(value=False)
         
         # Language settings
         self.source_lang = tk.StringVar(value='vi')
@@ -204,8 +205,8 @@ class AdvancedBatchGUI:
         options_frame = ttk.LabelFrame(parent, text="🔧 Tùy chọn xử lý", padding="10")
         options_frame.pack(fill=tk.X, pady=(0, 10))
         
-        ttk.Checkbutton(options_frame, text="Priority mode (xử lý video nhỏ trước)", variable=self.priority_mode).pack(anchor=tk.W, pady=2)
-        ttk.Checkbutton(options_frame, text="Sắp xếp theo kích thước", variable=self.priority_by_size).pack(anchor=tk.W, pady=2)
+        ttk.Checkbutton(options_frame, text="Priority mode (video dự đoán lâu nhất chạy trước)", variable=self.priority_mode).pack(anchor=tk.W, pady=2)
+        ttk.Checkbutton(options_frame, text="Ưu tiên file nhỏ trước (kiểu cũ)", variable=self.priority_by_size).pack(anchor=tk.W, pady=2)
         
         # System recommendations
         rec_frame = ttk.LabelFrame(parent, text="💡 Khuyến nghị hệ thống", padding="10")
@@ -452,20 +453,20 @@ class AdvancedBatchGUI:
         elif preset_type == 'full':
             self.custom_timeline.set(True)
             self.priority_mode.set(True)
-            self.priority_by_size.set(True)
+            self.priority_by_size.set(False)
             
         messagebox.showinfo("Preset", f"Đã áp dụng preset {preset_type.upper()}")
         
     def update_system_info(self):
         """Cập nhật thông tin hệ thống"""
         try:
-            # CPU and Memory
-            cpu_percent = psutil.cpu_percent(interval=0.1)
-            memory = psutil.virtual_memory()
+            # CPU and Memory (snapshot của sampler nền, không chặn main loop của Tk)
+            resources = get_sampler().snapshot()
             
             # Update system label
             self.system_label.configure(
-                text=f"💻 CPU: {cpu_percent:.1f}% | RAM: {memory.percent:.1f}% | Available: {memory.available/1024**3:.1f}GB"
+                text=f"💻 CPU: {resources['cpu_percent']:.1f}% | RAM: {resources['memory_percent']:.1f}% | "
+                     f"Available: {resources['memory_available_gb']:.1f}GB"
             )
             
             # Schedule next update
@@ -569,11 +570,28 @@ class AdvancedBatchGUI:
             # Update progress bar
             self.progress_var.set(progress['percentage'])
             
-            # Update status
-            self.status_text.set(
+            # Update status (kèm stage đang encode của video đầu tiên đang chạy)
+            status = (
                 f"Tiến độ: {progress['percentage']:.1f}% | "
                 f"Hoàn thành: {progress['completed']}/{progress['total']}"
             )
+            active_tasks = progress.get('active_tasks', [])
+            if active_tasks:
+                task = active_tasks[0]
+                status += f" | {task['video']}: {task['stage']} {task['stage_index'] + 1}/{task['stage_count']}"
+                if task['stage_fraction'] is not None:
+                    status += f" {task['stage_fraction'] * 100:.0f}%"
+                if task['speed']:
+                    status += f" ({task['speed']:.1f}x)"
+                if task['stage_eta_seconds'] is not None:
+                    status += f" còn {int(task['stage_eta_seconds'])}s"
+                if len(active_tasks) > 1:
+                    status += f" (+{len(active_tasks) - 1} video)"
+            if progress.get('paused'):
+                status = f"⏸️ Đã tạm dừng | {status}"
+            elif progress.get('waiting_for_resources'):
+                status = f"⏳ Chờ tài nguyên | {status}"
+            self.status_text.set(status)
             
             # Update stats labels
             for key in self.stats_labels:
@@ -638,15 +656,24 @@ class AdvancedBatchGUI:
         self.processing = False
         
     def pause_processing(self):
-        """Tạm dừng xử lý"""
-        # Implementation for pause/resume
-        pass
+        """Tạm dừng / tiếp tục xử lý"""
+        if not self.processor or not self.processing:
+            return
+            
+        if self.processor.is_paused:
+            self.processor.resume_processing()
+            self.pause_button.configure(text="⏸️ Tạm dừng")
+            self.status_text.set("▶️ Đang tiếp tục xử lý...")
+        else:
+            self.processor.pause_processing()
+            self.pause_button.configure(text="▶️ Tiếp tục")
+            self.status_text.set("⏸️ Đã tạm dừng (video đang encode được giữ nguyên tiến độ)")
         
     def processing_finished(self):
         """Xử lý hoàn thành"""
         self.start_button.configure(state=tk.NORMAL)
         self.stop_button.configure(state=tk.DISABLED)
-        self.pause_button.configure(state=tk.DISABLED)
+        self.pause_button.configure(state=tk.DISABLED, text="⏸️ Tạm dừng")
         
         if self.processor:
             stats = self.processor.get_statistics()
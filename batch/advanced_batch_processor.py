@@ -6,17 +6,30 @@ Hỗ trợ xử lý 100+ video cùng lúc với tối ưu hiệu năng
 """
 
 import os
+import shutil
 import threading
 import queue
 import time
 import psutil
 import json
+import heapq
 import hashlib
+import itertools
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from dataclasses import dataclass, asdict
 from typing import List, Dict, Optional, Callable
 from main import AutoVideoEditor
+from ffmpeg_runner import add_progress_listener, remove_progress_listener, progress_context
+from job_control import CancelToken, cancel_scope, JobCancelled
+from instrumentation import recorder, span
+from metrics import MetricsServer, format_metric, DEFAULT_PORT as METRICS_PORT
+from resource_monitor import get_sampler, SAMPLE_INTERVAL
+from memory_estimator import MemoryEstimator
+from stage_planner import probe_video
+from job_store import JobStore
+from throughput_model import ThroughputModel
+from retry_policy import classify_error, retry_delay, PERMANENT
 
 @dataclass
 class VideoTask:
@@ -26,11 +39,15 @@ class VideoTask:
     config: Dict
     priority: int = 0  # 0 = cao nhất
     file_size: int = 0
-    estimated_time: float = 0
+    estimated_time: float = 0  # Giây xử lý dự đoán (ThroughputModel)
     retry_count: int = 0
     max_retries: int = 3
     task_id: str = ""
     created_time: datetime = None
+    memory_estimate: Dict = None  # Ước lượng peak RSS của job (MemoryEstimator.estimate)
+    features: Dict = None  # Đặc trưng đầu vào cho mô hình thời gian (ThroughputModel.features)
+    queue_priority: int = 0  # Priority lúc vào hàng đợi (trước khi aging)
+    enqueued_at: float = 0  # time.monotonic() lúc vào hàng đợi
     
     def __post_init__(self):
         if not self.task_id:
@@ -40,6 +57,13 @@ class VideoTask:
         if self.file_size == 0 and os.path.exists(self.input_path):
             self.file_size = os.path.getsize(self.input_path)
 
+# Fit lại mô hình thời gian sau mỗi chừng này job thành công (trên thread dispatcher)
+MODEL_REFIT_EVERY = 5
+
+# Priority aging: mỗi khoảng này chờ trong hàng đợi thì priority giảm 1 (ưu tiên hơn),
+# để task retry (priority + 10) không bị task mới chèn trước mãi
+PRIORITY_AGING_SECONDS = 60
+
 class AdvancedBatchProcessor:
     """Xử lý hàng loạt video nâng cao với tối ưu hiệu năng"""
     
@@ -54,22 +78,48 @@ class AdvancedBatchProcessor:
         self.memory_limit_gb = memory_limit_gb
         self.priority_mode = priority_mode
         
-        # Task management
+        # Task management (priority mode: (priority, -giây dự đoán, thứ tự thêm, task) => job dài chạy trước)
         self.task_queue = queue.PriorityQueue() if priority_mode else queue.Queue()
+        self.queue_sequence = itertools.count()
         self.completed_tasks = []
         self.failed_tasks = []
         self.processing_tasks = {}
+        self.task_progress = {}  # task_id -> sự kiện tiến độ FFmpeg mới nhất
+        self.cancel_tokens = {}  # task_id -> CancelToken của task đang chạy
+        self.reserved_memory = {}  # task_id -> MB đã giữ chỗ cho task đã submit
+        self.task_ffmpeg_peak = {}  # task_id -> peak RSS lớn nhất của FFmpeg (MB)
+        self.retry_timers = {}  # task_id -> (Timer, task) chờ backoff trước khi vào lại hàng đợi
+        self.result_listeners = []  # callback(task, result) khi task xong hẳn (thành công / thất bại / hủy)
+        self.cancelled_tasks = set()  # task_id đang chạy bị cancel_task: hủy hẳn, không đưa lại hàng đợi
+        self.editors = threading.local()  # AutoVideoEditor của từng worker thread (Whisper load một lần)
         
         # Threading
         self.executor = None
         self.is_processing = False
+        self.is_paused = False
+        self.waiting_for_resources = False
         self.lock = threading.Lock()
+        self.wakeup = threading.Event()  # Đánh thức dispatcher: task xong, task mới vào hàng đợi, resume, stop
+        
+        # Thread lấy mẫu CPU/RAM/disk nền: kiểm tra tài nguyên chỉ đọc snapshot, không chặn
+        self.resource_sampler = get_sampler()
+        self.cpu_limit_percent = 90
+        self.min_disk_free_gb = 1
+        
+        # Ước lượng bộ nhớ mỗi job: chỉ nhận task khi tổng ước lượng nằm trong memory_limit_gb
+        self.memory_estimator = MemoryEstimator()
+        
+        # Lịch sử job + mô hình dự đoán thời gian xử lý (xếp lịch và ETA)
+        self.job_store = JobStore()
+        self.throughput_model = ThroughputModel().fit(self.job_store.recent_runs())
+        self.runs_since_fit = 0
         
         # Statistics
         self.stats = {
             'total': 0,
             'completed': 0,
             'failed': 0,
+            'cancelled': 0,
             'processing': 0,
             'queued': 0,
             'start_time': None,
@@ -81,14 +131,25 @@ class AdvancedBatchProcessor:
         # Checkpoint for resume
         self.checkpoint_file = "batch_checkpoint.json"
         
+        # Artifact từng stage của mỗi task (retry tiếp tục từ stage đã xong)
+        self.work_root = "batch_work"
+        
+        # HTTP /metrics (tùy chọn, xem start_metrics_server)
+        self.metrics_server = None
+        
         print(f"🔧 Advanced Batch Processor khởi tạo:")
         print(f"   💻 CPU cores: {psutil.cpu_count()}")
         print(f"   🧵 Max workers: {self.max_workers}")
         print(f"   💾 Memory limit: {self.memory_limit_gb}GB")
         print(f"   📊 Priority mode: {self.priority_mode}")
         
-    def add_video_task(self, input_path: str, output_path: str, config: Dict = None, priority: int = 0):
-        """Thêm video task với priority"""
+    def add_video_task(self, input_path: str, output_path: str, config: Dict = None, priority: int = 0,
+                       task_id: str = None):
+        """Thêm video task với priority
+        
+        task_id: mặc định theo đường dẫn input; truyền id riêng khi cùng một input
+        có thể được gửi nhiều lần (HTTP API)
+        """
         if not os.path.exists(input_path):
             raise FileNotFoundError(f"Video không tồn tại: {input_path}")
         
@@ -96,30 +157,77 @@ class AdvancedBatchProcessor:
             input_path=input_path,
             output_path=output_path,
             config=config or {},
-            priority=priority
+            priority=priority,
+            task_id=task_id or ""
         )
         
-        # Estimate processing time based on file size (rough estimate)
-        task.estimated_time = task.file_size / (50 * 1024 * 1024)  # ~50MB/s
+        # Ước lượng thời gian và bộ nhớ theo metadata thực + cấu hình (probe lỗi thì coi như 1080p)
+        try:
+            info = probe_video(input_path)
+        except Exception:
+            info = None
+        task.features = ThroughputModel.features(task.config, info, task.file_size)
+        task.estimated_time = self.throughput_model.predict(task.features)
+        task.memory_estimate = self.memory_estimator.estimate(task.config, info)
         
-        if self.priority_mode:
-            # Priority queue: (priority, file_size, task)
-            # Smaller files first within same priority
-            self.task_queue.put((priority, task.file_size, task))
-        else:
-            self.task_queue.put(task)
+        # Cập nhật thống kê trước khi vào hàng đợi (có thể được thêm từ thread khác khi batch đang chạy)
+        with self.lock:
+            self.stats['total'] += 1
+            self.stats['queued'] += 1
+            self.stats['total_file_size'] += task.file_size
         
-        self.stats['total'] += 1
-        self.stats['queued'] += 1
-        self.stats['total_file_size'] += task.file_size
+        self._enqueue(task, priority)
         
-        print(f"➕ Thêm task: {os.path.basename(task.input_path)} ({task.file_size/1024/1024:.1f}MB)")
+        print(f"➕ Thêm task: {os.path.basename(task.input_path)} ({task.file_size/1024/1024:.1f}MB, ~{task.estimated_time:.0f}s)")
         
         return task.task_id
     
+    def _enqueue(self, task: VideoTask, priority: int):
+        """Đưa task vào hàng đợi: cùng priority thì job dự đoán lâu nhất chạy trước (LPT)"""
+        task.queue_priority = priority
+        task.enqueued_at = time.monotonic()
+        if self.priority_mode:
+            self.task_queue.put((priority, -task.estimated_time, next(self.queue_sequence), task))
+        else:
+            self.task_queue.put(task)
+        self.wakeup.set()
+    
+    def _age_queue(self):
+        """Priority aging: giảm priority của task theo thời gian đã chờ (tối thiểu 0)"""
+        if not self.priority_mode:
+            return
+        now = time.monotonic()
+        with self.task_queue.mutex:
+            items = self.task_queue.queue
+            changed = False
+            for i, (priority, cost, sequence, task) in enumerate(items):
+                aged = max(0, task.queue_priority - int((now - task.enqueued_at) // PRIORITY_AGING_SECONDS))
+                if aged != priority:
+                    items[i] = (aged, cost, sequence, task)
+                    changed = True
+            if changed:
+                heapq.heapify(items)
+    
+    @staticmethod
+    def prepare_config(config: Dict = None) -> Dict:
+        """Load và validate timeline trước khi xếp hàng để lỗi cấu hình không làm hỏng cả batch"""
+        if config and config.get('timeline') is not None:
+            from overlay_timeline import load_timeline, validate_timeline
+            config = {**config, 'timeline': load_timeline(config['timeline'])}
+            if config.get('img_folder'):
+                errors = validate_timeline(config['timeline'], base_dir=config['img_folder'])
+                if errors:
+                    raise ValueError("Timeline không hợp lệ:\n  - " + "\n  - ".join(errors))
+        return config or {}
+    
     def add_folder_videos(self, input_folder: str, output_folder: str, config: Dict = None,
-                         video_extensions: List[str] = None, priority_by_size: bool = True):
-        """Thêm tất cả video trong folder với smart priority"""
+                         video_extensions: List[str] = None, priority_by_size: bool = False):
+        """Thêm tất cả video trong folder
+        
+        Mặc định mọi video cùng priority, hàng đợi chạy video dự đoán lâu nhất
+        trước (longest-processing-time-first) để giảm tổng thời gian batch.
+        priority_by_size=True: kiểu cũ, file nhỏ chạy trước.
+        """
         if video_extensions is None:
             video_extensions = ['.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm']
         
@@ -128,6 +236,8 @@ class AdvancedBatchProcessor:
         
         os.makedirs(output_folder, exist_ok=True)
         
+        config = self.prepare_config(config)
+        
         # Scan all videos and sort by size if needed
         video_files = []
         for filename in os.listdir(input_folder):
@@ -152,64 +262,98 @@ class AdvancedBatchProcessor:
             task_id = self.add_video_task(input_path, output_path, config, priority)
             task_ids.append(task_id)
         
+        with self.task_queue.mutex:
+            predicted = sum(item[-1].estimated_time for item in self.task_queue.queue)
+        print(f"⏱️ Tổng thời gian xử lý dự đoán: {predicted / 60:.1f} phút "
+              f"(~{predicted / 60 / self.max_workers:.1f} phút với {self.max_workers} worker)")
+        
         return task_ids
     
     def check_system_resources(self):
-        """Kiểm tra tài nguyên hệ thống"""
-        # Memory check
-        memory = psutil.virtual_memory()
-        memory_usage_gb = (memory.total - memory.available) / 1024**3
-        
-        # CPU check
-        cpu_percent = psutil.cpu_percent(interval=1)
-        
-        # Disk space check
-        disk = psutil.disk_usage('.')
-        disk_free_gb = disk.free / 1024**3
+        """Kiểm tra tài nguyên hệ thống (đọc snapshot của sampler nền, không chặn)
         
+        CPU được so với trung bình trên cửa sổ mẫu để một đỉnh ngắn không chặn task mới.
+        """
+        snapshot = self.resource_sampler.snapshot()
+        with self.lock:
+            reserved_gb = sum(self.reserved_memory.values()) / 1024
         return {
-            'memory_usage_gb': memory_usage_gb,
-            'memory_available_gb': memory.available / 1024**3,
-            'cpu_percent': cpu_percent,
-            'disk_free_gb': disk_free_gb,
+            **snapshot,
+            'reserved_memory_gb': reserved_gb,
             'can_process': (
-                memory_usage_gb < self.memory_limit_gb and
-                cpu_percent < 90 and
-                disk_free_gb > 1
+                reserved_gb < self.memory_limit_gb and
+                snapshot['cpu_percent_avg'] < self.cpu_limit_percent and
+                snapshot['disk_free_gb'] > self.min_disk_free_gb
             )
         }
     
+    def _has_headroom(self, task: VideoTask, running: int) -> bool:
+        """Admission: còn tài nguyên để nhận task này không
+        
+        Bộ nhớ: tổng ước lượng của các task đã nhận + task mới phải nằm trong
+        memory_limit_gb, và task mới không vượt RAM khả dụng thực tế.
+        Khi không có task nào chạy thì luôn nhận một task, tránh batch đứng
+        chờ mãi trên máy đang bận vì tiến trình khác.
+        """
+        resources = self.check_system_resources()
+        needed_gb = task.memory_estimate['total_mb'] / 1024 if task.memory_estimate else 0
+        fits_memory = (
+            resources['reserved_memory_gb'] + needed_gb <= self.memory_limit_gb and
+            needed_gb <= resources['memory_available_gb']
+        )
+        if (resources['can_process'] and fits_memory) or running == 0:
+            if self.waiting_for_resources:
+                self.waiting_for_resources = False
+                print("▶️ Tài nguyên đã đủ, tiếp tục nhận task")
+            return True
+        
+        if not self.waiting_for_resources:
+            self.waiting_for_resources = True
+            print(f"⏳ Tài nguyên hệ thống không đủ (job cần ~{needed_gb:.1f}GB, đã giữ "
+                  f"{resources['reserved_memory_gb']:.1f}/{self.memory_limit_gb}GB, RAM {resources['memory_usage_gb']:.1f}GB, "
+                  f"CPU {resources['cpu_percent_avg']:.1f}%, disk trống {resources['disk_free_gb']:.1f}GB), "
+                  f"giữ task trong hàng đợi")
+        return False
+    
     def process_single_video(self, task: VideoTask) -> Dict:
         """Xử lý một video"""
         task_start = time.time()
         
+        token = CancelToken(task.task_id)
         with self.lock:
             self.processing_tasks[task.task_id] = task
+            self.cancel_tokens[task.task_id] = token
             self.stats['processing'] += 1
             self.stats['queued'] -= 1
+        if not self.is_processing:
+            token.cancel()  # stop_processing chạy đúng lúc task bắt đầu
+        elif self.is_paused:
+            token.pause()
         
         print(f"🔄 [{task.task_id}] Bắt đầu xử lý {os.path.basename(task.input_path)}")
         
         try:
-            # Check system resources before processing
-            resources = self.check_system_resources()
-            if not resources['can_process']:
-                raise Exception(f"Tài nguyên hệ thống không đủ: RAM {resources['memory_usage_gb']:.1f}GB, CPU {resources['cpu_percent']:.1f}%")
-            
-            # Create editor instance
-            editor = AutoVideoEditor()
+            # Editor của worker thread (model Whisper đã load sẵn từ task trước)
+            editor = self._get_editor()
             
-            # Process video
-            editor.process_video(
-                input_video_path=task.input_path,
-                output_video_path=task.output_path,
-                source_language=task.config.get('source_language', 'vi'),
-                target_language=task.config.get('target_language', 'en'),
-                img_folder=task.config.get('img_folder'),
-                overlay_times=task.config.get('overlay_times'),
-                video_overlay_settings=task.config.get('video_overlay_settings'),
-                custom_timeline=task.config.get('custom_timeline', False)
-            )
+            # Process video (sự kiện tiến độ FFmpeg được gắn task_id, tiến trình con đăng ký với token)
+            with progress_context(task_id=task.task_id, video=os.path.basename(task.input_path)), \
+                    cancel_scope(token), span('video', category='task', input_size=task.file_size):
+                editor.process_video(
+                    input_video_path=task.input_path,
+                    output_video_path=task.output_path,
+                    source_language=task.config.get('source_language', 'vi'),
+                    target_language=task.config.get('target_language', 'en'),
+                    img_folder=task.config.get('img_folder'),
+                    overlay_times=task.config.get('overlay_times'),
+                    video_overlay_settings=task.config.get('video_overlay_settings'),
+                    custom_timeline=task.config.get('custom_timeline', False),
+                    timeline=task.config.get('timeline'),
+                    fill_mode=task.config.get('fill_mode', 'pad'),
+                    encoder_profile=task.config.get('encoder_profile'),
+                    intermediate_profile=task.config.get('intermediate_profile', 'intermediate'),
+                    work_dir=self._task_work_dir(task)
+                )
             
             duration = time.time() - task_start
             
@@ -233,43 +377,91 @@ class AdvancedBatchProcessor:
                 'thread_id': threading.current_thread().ident
             }
             
+            # Hiệu chỉnh ước lượng bộ nhớ bằng peak RSS FFmpeg đo được
+            with self.lock:
+                measured_peak = self.task_ffmpeg_peak.get(task.task_id)
+                concurrent = len(self.processing_tasks)
+            
+            # Lưu lịch sử (dispatcher fit lại mô hình sau mỗi MODEL_REFIT_EVERY job)
+            if task.features:
+                self.job_store.record_run(task.task_id, task.input_path, 'success', task.features,
+                                          duration, concurrent)
+                with self.lock:
+                    self.runs_since_fit += 1
+                result['predicted_duration'] = task.estimated_time
+            if task.memory_estimate:
+                self.memory_estimator.observe(task.memory_estimate, measured_peak)
+                result['memory_estimate_mb'] = task.memory_estimate['total_mb']
+                result['ffmpeg_peak_rss_mb'] = measured_peak
+            
             with self.lock:
                 self.completed_tasks.append(result)
                 self.stats['completed'] += 1
                 self.stats['processing'] -= 1
                 self.stats['processed_file_size'] += task.file_size
                 del self.processing_tasks[task.task_id]
+                self.task_progress.pop(task.task_id, None)
+                self.cancel_tokens.pop(task.task_id, None)
+                self.cancelled_tasks.discard(task.task_id)
             
             print(f"✅ [{task.task_id}] Hoàn thành {os.path.basename(task.input_path)} ({duration:.1f}s)")
+            self._notify_result(task, result)
             return result
             
+        except JobCancelled:
+            with self.lock:
+                user_cancelled = task.task_id in self.cancelled_tasks
+                self.cancelled_tasks.discard(task.task_id)
+            
+            # Bị dừng (stop_processing): trả task về hàng đợi (không tính retry) để lần chạy sau xử lý lại
+            if not user_cancelled:
+                self._enqueue(task, task.priority)
+            
+            with self.lock:
+                if not user_cancelled:
+                    self.stats['queued'] += 1
+                self.stats['processing'] -= 1
+                del self.processing_tasks[task.task_id]
+                self.task_progress.pop(task.task_id, None)
+                self.cancel_tokens.pop(task.task_id, None)
+            
+            if user_cancelled:
+                return self._finish_cancelled(task)
+            print(f"🛑 [{task.task_id}] Đã hủy {os.path.basename(task.input_path)}")
+            return None
+            
         except Exception as e:
             error_msg = str(e)
+            error_class = classify_error(e, task.input_path, task.output_path)
             
-            # Retry logic
-            if task.retry_count < task.max_retries:
+            # Retry logic: lỗi vĩnh viễn (input hỏng, codec không hỗ trợ) không retry;
+            # lỗi khác retry sau backoff, tiếp tục từ stage đã xong trong work dir
+            if error_class != PERMANENT and task.retry_count < task.max_retries:
                 task.retry_count += 1
-                print(f"🔄 [{task.task_id}] Retry {task.retry_count}/{task.max_retries}: {error_msg}")
-                
-                # Add back to queue with lower priority
-                if self.priority_mode:
-                    self.task_queue.put((task.priority + 10, task.file_size, task))
-                else:
-                    self.task_queue.put(task)
+                delay = retry_delay(task.retry_count)
+                print(f"🔄 [{task.task_id}] Retry {task.retry_count}/{task.max_retries} sau {delay:.0f}s "
+                      f"(lỗi {error_class}): {error_msg}")
                 
                 with self.lock:
                     self.stats['queued'] += 1
                     self.stats['processing'] -= 1
                     del self.processing_tasks[task.task_id]
+                    self.task_progress.pop(task.task_id, None)
+                    self.cancel_tokens.pop(task.task_id, None)
+                    self.cancelled_tasks.discard(task.task_id)
                 
+                # Add back to queue with lower priority (sau thời gian chờ)
+                self._schedule_retry(task, delay)
                 return None  # Will be processed again
             
             # Final failure
+            shutil.rmtree(self._task_work_dir(task), ignore_errors=True)
             result = {
                 'status': 'failed',
                 'task_id': task.task_id,
                 'input_path': task.input_path,
                 'error': error_msg,
+                'error_class': error_class,
                 'retry_count': task.retry_count,
                 'duration': time.time() - task_start,
                 'completed_time': datetime.now(),
@@ -281,31 +473,80 @@ class AdvancedBatchProcessor:
                 self.stats['failed'] += 1
                 self.stats['processing'] -= 1
                 del self.processing_tasks[task.task_id]
+                self.task_progress.pop(task.task_id, None)
+                self.cancel_tokens.pop(task.task_id, None)
+                self.cancelled_tasks.discard(task.task_id)
             
             print(f"❌ [{task.task_id}] Thất bại {os.path.basename(task.input_path)}: {error_msg}")
+            self._notify_result(task, result)
             return result
     
-    def start_processing(self, progress_callback: Optional[Callable] = None):
-        """Bắt đầu xử lý với ThreadPoolExecutor"""
+    def _get_editor(self) -> AutoVideoEditor:
+        """AutoVideoEditor dùng lại trong cùng worker thread: Whisper chỉ load một lần mỗi worker"""
+        editor = getattr(self.editors, 'editor', None)
+        if editor is None:
+            editor = self.editors.editor = AutoVideoEditor()
+        return editor
+    
+    def _finish_cancelled(self, task: VideoTask) -> Dict:
+        """Ghi nhận task bị hủy bằng cancel_task (không retry, không xử lý lại)"""
+        shutil.rmtree(self._task_work_dir(task), ignore_errors=True)
+        result = {
+            'status': 'cancelled',
+            'task_id': task.task_id,
+            'input_path': task.input_path,
+            'retry_count': task.retry_count,
+            'completed_time': datetime.now()
+        }
+        with self.lock:
+            self.stats['cancelled'] += 1
+        
+        print(f"🚫 [{task.task_id}] Đã hủy {os.path.basename(task.input_path)}")
+        self._notify_result(task, result)
+        return result
+    
+    def add_result_listener(self, callback: Callable):
+        """Gọi callback(task, result) khi một task xong hẳn (thành công, hết retry hoặc bị hủy)"""
+        self.result_listeners.append(callback)
+    
+    def _notify_result(self, task: VideoTask, result: Dict):
+        for callback in self.result_listeners:
+            try:
+                callback(task, result)
+            except Exception as e:
+                print(f"⚠️ Result listener lỗi: {e}")
+    
+    def start_processing(self, progress_callback: Optional[Callable] = None, keep_alive: bool = False):
+        """Bắt đầu xử lý với ThreadPoolExecutor
+        
+        keep_alive=True: chạy như dịch vụ, không dừng khi hết việc mà chờ task mới
+        (hot folder, HTTP API) tới khi stop_processing() được gọi.
+        """
         if self.is_processing:
             raise Exception("Batch processing đang chạy!")
         
-        if self.task_queue.empty():
+        if self.task_queue.empty() and not keep_alive:
             raise Exception("Không có video nào để xử lý!")
         
         self.is_processing = True
         self.stats['start_time'] = datetime.now()
+        recorder.clear()  # Trace riêng cho lần chạy này
         
         print(f"🚀 Bắt đầu Advanced Batch Processing")
         print(f"   🧵 Workers: {self.max_workers}")
         print(f"   📊 Tổng video: {self.stats['total']}")
         print(f"   💾 Tổng dung lượng: {self.stats['total_file_size'] / 1024**3:.2f}GB")
         
+        # Nhận tiến độ FFmpeg trực tiếp của các task đang chạy (và peak RSS để hiệu chỉnh ước lượng bộ nhớ)
+        add_progress_listener(self._on_ffmpeg_progress)
+        recorder.add_listener(self._on_trace_event)
+        
         # Create ThreadPoolExecutor
         self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
         
-        # Submit initial batch of tasks
-        futures = []
+        # Task đang chạy (Future)
+        futures = set()
+        last_checkpoint = len(self.completed_tasks)
         
         # Start progress monitoring thread
         if progress_callback:
@@ -313,44 +554,57 @@ class AdvancedBatchProcessor:
             progress_thread.daemon = True
             progress_thread.start()
         
-        # Process tasks
+        # Dispatcher theo sự kiện: ngủ tới khi có task xong / task mới / resume / stop,
+        # chỉ thức định kỳ khi đang chờ tài nguyên
         try:
-            while self.is_processing and (not self.task_queue.empty() or self.stats['processing'] > 0):
-                # Submit new tasks if we have capacity
-                while len(futures) < self.max_workers and not self.task_queue.empty():
+            while self.is_processing:
+                self.wakeup.clear()
+                
+                # Thu các task đã xong (kết quả đã được xử lý trong process_single_video)
+                done, futures = wait(futures, timeout=0, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        print(f"❌ Future exception: {str(e)}")
+                
+                # Save checkpoint mỗi 10 video xong
+                if len(self.completed_tasks) - last_checkpoint >= 10:
+                    last_checkpoint = len(self.completed_tasks)
+                    self.save_checkpoint()
+                
+                if self.runs_since_fit >= MODEL_REFIT_EVERY:
+                    self._refit_model()
+                
+                # Submit new tasks if we have capacity (không nhận task mới khi tạm dừng
+                # hoặc khi hết tài nguyên: task nằm lại hàng đợi tới khi có headroom)
+                if len(futures) < self.max_workers and not self.is_paused:
+                    self._age_queue()
+                while len(futures) < self.max_workers and not self.is_paused:
+                    next_task = self._peek_task()
+                    if next_task is None or not self._has_headroom(next_task, len(futures)):
+                        break
                     try:
                         if self.priority_mode:
-                            _, _, task = self.task_queue.get_nowait()
+                            task = self.task_queue.get_nowait()[-1]
                         else:
                             task = self.task_queue.get_nowait()
-                        
-                        future = self.executor.submit(self.process_single_video, task)
-                        futures.append(future)
-                        
                     except queue.Empty:
                         break
+                    
+                    self._reserve_memory(task)
+                    future = self.executor.submit(self.process_single_video, task)
+                    future.add_done_callback(lambda done_future, task=task: self._on_task_done(done_future, task))
+                    futures.add(future)
                 
-                # Check completed tasks
-                completed_futures = []
-                for future in futures:
-                    if future.done():
-                        completed_futures.append(future)
-                        try:
-                            result = future.result()
-                            # Result is already handled in process_single_video
-                        except Exception as e:
-                            print(f"❌ Future exception: {str(e)}")
-                
-                # Remove completed futures
-                for future in completed_futures:
-                    futures.remove(future)
-                
-                # Short sleep to prevent busy waiting
-                time.sleep(0.1)
+                # Hết việc: không task chạy, hàng đợi rỗng, không task chờ retry.
+                # Task retry/hủy được đưa lại hàng đợi (hoặc đăng ký timer) trước khi Future xong
+                with self.lock:
+                    pending_retries = len(self.retry_timers)
+                if not futures and self.task_queue.empty() and not pending_retries and not keep_alive:
+                    break
                 
-                # Save checkpoint periodically
-                if len(self.completed_tasks) % 10 == 0:
-                    self.save_checkpoint()
+                self.wakeup.wait(timeout=SAMPLE_INTERVAL if self.waiting_for_resources else None)
             
         except KeyboardInterrupt:
             print("⚠️ Nhận tín hiệu dừng, đang dọn dẹp...")
@@ -358,22 +612,219 @@ class AdvancedBatchProcessor:
         
         # Final cleanup
         self.executor.shutdown(wait=True)
+        if self.runs_since_fit:
+            self._refit_model()
+        remove_progress_listener(self._on_ffmpeg_progress)
+        recorder.remove_listener(self._on_trace_event)
         self.stats['end_time'] = datetime.now()
         self.is_processing = False
+        self.waiting_for_resources = False
         
         print(f"🏁 Hoàn thành batch processing!")
         self.print_final_stats()
     
+    def cancel_task(self, task_id: str) -> bool:
+        """Hủy hẳn một task: đang chạy thì dừng ngay FFmpeg, đang chờ (hàng đợi / retry) thì bỏ ra
+        
+        Returns:
+            bool: False nếu không tìm thấy task (đã xong hoặc không tồn tại)
+        """
+        with self.lock:
+            token = self.cancel_tokens.get(task_id)
+            if token:
+                self.cancelled_tasks.add(task_id)
+                retry = None
+            else:
+                retry = self.retry_timers.pop(task_id, None)
+        if token:
+            token.cancel()
+            return True
+        
+        if retry:
+            retry[0].cancel()
+            task = retry[1]
+        else:
+            task = self._remove_queued(task_id)
+            if task is None:
+                return False
+        with self.lock:
+            self.stats['queued'] -= 1
+        self._finish_cancelled(task)
+        return True
+    
+    def _remove_queued(self, task_id: str) -> Optional[VideoTask]:
+        """Lấy task ra khỏi hàng đợi theo task_id"""
+        with self.task_queue.mutex:
+            items = self.task_queue.queue
+            for i, item in enumerate(items):
+                task = item[-1] if self.priority_mode else item
+                if task.task_id == task_id:
+                    del items[i]
+                    if self.priority_mode:
+                        heapq.heapify(items)
+                    return task
+        return None
+    
+    def get_task_status(self, task_id: str) -> Optional[Dict]:
+        """Trạng thái của một task chưa xong: running / queued / retry_wait (None nếu không có)"""
+        with self.lock:
+            task = self.processing_tasks.get(task_id)
+            event = self.task_progress.get(task_id, {})
+            retry = self.retry_timers.get(task_id)
+        if task:
+            return {
+                'state': 'running',
+                'stage': event.get('stage'),
+                'video_fraction': self._video_fraction(event),
+                'speed': event.get('speed'),
+                'stage_eta_seconds': event.get('eta'),
+                'predicted_seconds': self._predict_seconds(task),
+                'retry_count': task.retry_count
+            }
+        if retry:
+            task = retry[1]
+            state = 'retry_wait'
+        else:
+            # Thứ tự lấy ra: (priority, -giây dự đoán, thứ tự thêm) với priority mode, FIFO nếu không
+            with self.task_queue.mutex:
+                items = sorted(self.task_queue.queue) if self.priority_mode else list(self.task_queue.queue)
+            ahead = [item[-1] for item in items] if self.priority_mode else items
+            position = next((i for i, t in enumerate(ahead) if t.task_id == task_id), None)
+            if position is None:
+                return None
+            task = ahead[position]
+            state = 'queued'
+        status = {'state': state, 'predicted_seconds': self._predict_seconds(task), 'retry_count': task.retry_count}
+        if state == 'queued':
+            status['queue_position'] = position
+        return status
+    
+    def pause_processing(self):
+        """Tạm dừng: ngừng nhận task mới và SIGSTOP các FFmpeg đang chạy (giữ nguyên phần đã encode)"""
+        if not self.is_processing or self.is_paused:
+            return
+        self.is_paused = True
+        with self.lock:
+            tokens = list(self.cancel_tokens.values())
+        for token in tokens:
+            token.pause()
+        print(f"⏸️ Đã tạm dừng batch processing ({len(tokens)} video đang xử lý được giữ lại)")
+    
+    def resume_processing(self):
+        """Tiếp tục sau khi tạm dừng"""
+        if not self.is_paused:
+            return
+        self.is_paused = False
+        with self.lock:
+            tokens = list(self.cancel_tokens.values())
+        for token in tokens:
+            token.resume()
+        self.wakeup.set()
+        print("▶️ Tiếp tục batch processing")
+    
     def stop_processing(self):
-        """Dừng xử lý"""
+        """Dừng xử lý: hủy mọi task đang chạy (dừng FFmpeg, dọn file tạm)"""
         print("🛑 Đang dừng batch processing...")
         self.is_processing = False
+        self.is_paused = False
+        
+        with self.lock:
+            tokens = list(self.cancel_tokens.values())
+            pending_retries = list(self.retry_timers.values())
+            self.retry_timers.clear()
+        for token in tokens:
+            token.cancel()
+        # Task đang chờ retry vào lại hàng đợi ngay (lần chạy sau xử lý)
+        for timer, task in pending_retries:
+            timer.cancel()
+            self._enqueue(task, task.priority + 10)
         
         if self.executor:
-            self.executor.shutdown(wait=False)
+            self.executor.shutdown(wait=False, cancel_futures=True)
         
+        self.wakeup.set()
         self.save_checkpoint()
     
+    def _on_ffmpeg_progress(self, event: Dict):
+        """Lưu sự kiện tiến độ FFmpeg mới nhất của từng task"""
+        task_id = event.get('task_id')
+        if not task_id:
+            return
+        with self.lock:
+            if task_id in self.processing_tasks:
+                self.task_progress[task_id] = event
+    
+    def _task_work_dir(self, task: VideoTask) -> str:
+        """Thư mục artifact của task (giữ giữa các lần retry, xóa khi xong)"""
+        return os.path.join(self.work_root, task.task_id)
+    
+    def _schedule_retry(self, task: VideoTask, delay: float):
+        """Đưa task vào lại hàng đợi sau delay giây (không giữ worker trong lúc chờ)"""
+        def requeue():
+            with self.lock:
+                if task.task_id not in self.retry_timers:
+                    return  # stop_processing đã đưa task vào hàng đợi
+                # Vào hàng đợi trước rồi mới bỏ timer: vòng dispatch không thấy batch "hết việc" giữa chừng
+                self._enqueue(task, task.priority + 10)
+                del self.retry_timers[task.task_id]
+        
+        timer = threading.Timer(delay, requeue)
+        timer.daemon = True
+        with self.lock:
+            self.retry_timers[task.task_id] = (timer, task)
+        timer.start()
+    
+    def _peek_task(self) -> Optional[VideoTask]:
+        """Task sẽ được lấy tiếp theo (không lấy ra khỏi hàng đợi)"""
+        with self.task_queue.mutex:
+            if not self.task_queue.queue:
+                return None
+            item = self.task_queue.queue[0]
+        return item[-1] if self.priority_mode else item
+    
+    def _reserve_memory(self, task: VideoTask):
+        with self.lock:
+            self.reserved_memory[task.task_id] = task.memory_estimate['total_mb'] if task.memory_estimate else 0
+    
+    def _on_task_done(self, future, task: VideoTask):
+        """Callback khi Future của task xong: trả bộ nhớ đã giữ và đánh thức dispatcher"""
+        with self.lock:
+            self.reserved_memory.pop(task.task_id, None)
+            self.task_ffmpeg_peak.pop(task.task_id, None)
+        if future.cancelled():
+            # Bị hủy trước khi chạy (stop_processing): trả task về hàng đợi cho lần chạy sau
+            self._enqueue(task, task.queue_priority)
+        self.wakeup.set()
+    
+    def _on_trace_event(self, event: Dict):
+        """Ghi peak RSS của các tiến trình FFmpeg theo task"""
+        task_id = event['context'].get('task_id')
+        peak = event['args'].get('peak_rss_mb')
+        if event['category'] != 'subprocess' or not task_id or not peak:
+            return
+        with self.lock:
+            if task_id in self.reserved_memory:
+                self.task_ffmpeg_peak[task_id] = max(self.task_ffmpeg_peak.get(task_id, 0), peak)
+    
+    def _refit_model(self):
+        """Fit lại mô hình thời gian từ lịch sử (chỉ gọi từ thread dispatcher, không chặn worker)"""
+        with self.lock:
+            self.runs_since_fit = 0
+        self.throughput_model.fit(self.job_store.recent_runs())
+    
+    def _predict_seconds(self, task: VideoTask) -> float:
+        """Giây xử lý dự đoán theo mô hình hiện tại (đã fit thêm các job vừa xong)"""
+        if task.features:
+            return self.throughput_model.predict(task.features)
+        return task.estimated_time
+    
+    @staticmethod
+    def _video_fraction(event: Dict) -> float:
+        """Phần đã xong của cả video: (stage đã xong + % stage hiện tại) / số stage"""
+        stage_count = event.get('stage_count') or 1
+        fraction = event.get('fraction') or 0
+        return min((event.get('stage_index', 0) + fraction) / stage_count, 1.0)
+    
     def _progress_monitor(self, callback: Callable):
         """Monitor tiến độ"""
         while self.is_processing:
@@ -391,21 +842,49 @@ class AdvancedBatchProcessor:
             total = self.stats['total']
             completed = self.stats['completed']
             failed = self.stats['failed']
+            cancelled = self.stats['cancelled']
             processing = self.stats['processing']
             queued = self.stats['queued']
             
             processed_size = self.stats['processed_file_size']
             total_size = self.stats['total_file_size']
+            task_progress = dict(self.task_progress)
+            running_tasks = list(self.processing_tasks.values())
+        with self.task_queue.mutex:
+            queued_tasks = [item[-1] if self.priority_mode else item for item in self.task_queue.queue]
         
-        remaining = total - completed - failed
-        percentage = ((completed + failed) / total * 100) if total > 0 else 0
+        # Tiến độ từng phần của các video đang encode
+        active_tasks = []
+        partial = 0.0
+        for task_id, event in task_progress.items():
+            video_fraction = self._video_fraction(event)
+            partial += video_fraction
+            active_tasks.append({
+                'task_id': task_id,
+                'video': event.get('video'),
+                'stage': event.get('stage'),
+                'stage_index': event.get('stage_index', 0),
+                'stage_count': event.get('stage_count', 1),
+                'stage_fraction': event.get('fraction'),
+                'video_fraction': video_fraction,
+                'speed': event.get('speed'),
+                'stage_eta_seconds': event.get('eta')
+            })
+        
+        remaining = total - completed - failed - cancelled
+        percentage = ((completed + failed + cancelled + partial) / total * 100) if total > 0 else 0
         size_percentage = (processed_size / total_size * 100) if total_size > 0 else 0
         
-        # Estimate remaining time
-        if self.stats['start_time'] and completed > 0:
-            elapsed = (datetime.now() - self.stats['start_time']).total_seconds()
-            avg_time = elapsed / completed
-            estimated_remaining = avg_time * remaining
+        # Thời gian còn lại theo mô hình: phần chưa xong của video đang chạy + video trong hàng đợi,
+        # chia cho số worker, nhưng không ngắn hơn video còn lại lâu nhất
+        remaining_work = []
+        for task in running_tasks:
+            predicted = self._predict_seconds(task)
+            remaining_work.append(predicted * (1 - self._video_fraction(task_progress.get(task.task_id, {}))))
+        remaining_work.extend(self._predict_seconds(task) for task in queued_tasks)
+        if remaining_work:
+            workers = min(self.max_workers, len(remaining_work))
+            estimated_remaining = max(sum(remaining_work) / workers, max(remaining_work))
         else:
             estimated_remaining = 0
         
@@ -413,15 +892,74 @@ class AdvancedBatchProcessor:
             'total': total,
             'completed': completed,
             'failed': failed,
+            'cancelled': cancelled,
             'processing': processing,
             'queued': queued,
             'remaining': remaining,
             'percentage': percentage,
             'size_percentage': size_percentage,
             'estimated_remaining_seconds': estimated_remaining,
+            'active_tasks': active_tasks,
+            'paused': self.is_paused,
+            'waiting_for_resources': self.waiting_for_resources,
             'system_info': self.check_system_resources()
         }
     
+    def collect_metrics(self) -> str:
+        """Metric trạng thái batch dạng Prometheus text (gọi mỗi lần scrape /metrics)"""
+        with self.lock:
+            stats = dict(self.stats)
+            task_progress = dict(self.task_progress)
+        
+        states = ('queued', 'processing', 'completed', 'failed', 'cancelled')
+        partial = sum(self._video_fraction(event) for event in task_progress.values())
+        elapsed = (datetime.now() - stats['start_time']).total_seconds() if stats['start_time'] else 0
+        resources = self.check_system_resources()
+        
+        return '\n'.join([
+            format_metric('editvideo_batch_tasks', 'gauge', 'Số video theo trạng thái',
+                          [({'state': state}, stats[state]) for state in states]),
+            format_metric('editvideo_batch_tasks_total', 'gauge', 'Tổng số video trong batch',
+                          [({}, stats['total'])]),
+            format_metric('editvideo_batch_progress_ratio', 'gauge', 'Tiến độ batch (0-1, gồm phần đã encode)',
+                          [({}, (stats['completed'] + stats['failed'] + stats['cancelled'] + partial) / stats['total']
+                                 if stats['total'] else 0)]),
+            format_metric('editvideo_batch_processed_bytes_total', 'counter', 'Dung lượng video input đã xử lý xong',
+                          [({}, stats['processed_file_size'])]),
+            format_metric('editvideo_batch_elapsed_seconds', 'gauge', 'Thời gian từ lúc bắt đầu batch',
+                          [({}, elapsed)]),
+            format_metric('editvideo_batch_running', 'gauge', '1 nếu batch đang chạy',
+                          [({}, int(self.is_processing))]),
+            format_metric('editvideo_batch_paused', 'gauge', '1 nếu batch đang tạm dừng',
+                          [({}, int(self.is_paused))]),
+            format_metric('editvideo_batch_workers', 'gauge', 'Số worker tối đa',
+                          [({}, self.max_workers)]),
+            format_metric('editvideo_batch_waiting_for_resources', 'gauge', '1 nếu đang giữ task vì thiếu tài nguyên',
+                          [({}, int(self.waiting_for_resources))]),
+            format_metric('editvideo_batch_reserved_memory_bytes', 'gauge', 'Tổng bộ nhớ ước lượng của các task đã nhận',
+                          [({}, int(resources['reserved_memory_gb'] * 1024**3))]),
+            format_metric('editvideo_batch_memory_budget_bytes', 'gauge', 'Ngân sách bộ nhớ cho các task (memory_limit_gb)',
+                          [({}, int(self.memory_limit_gb * 1024**3))]),
+            format_metric('editvideo_system_cpu_percent', 'gauge', 'CPU hệ thống (%, trung bình cửa sổ mẫu)',
+                          [({}, resources['cpu_percent_avg'])]),
+            format_metric('editvideo_system_memory_available_bytes', 'gauge', 'RAM khả dụng',
+                          [({}, int(resources['memory_available_gb'] * 1024**3))]),
+            format_metric('editvideo_system_disk_free_bytes', 'gauge', 'Dung lượng đĩa trống',
+                          [({}, int(resources['disk_free_gb'] * 1024**3))]),
+        ])
+    
+    def start_metrics_server(self, port: int = METRICS_PORT, host: str = '127.0.0.1') -> MetricsServer:
+        """Mở HTTP endpoint /metrics (Prometheus) để giám sát batch không cần GUI"""
+        if self.metrics_server is None:
+            self.metrics_server = MetricsServer(self.collect_metrics, host=host, port=port).start()
+        return self.metrics_server
+    
+    def stop_metrics_server(self):
+        """Đóng endpoint /metrics"""
+        if self.metrics_server:
+            self.metrics_server.stop()
+            self.metrics_server = None
+    
     def save_checkpoint(self):
         """Lưu checkpoint để resume"""
         checkpoint = {
@@ -466,6 +1004,8 @@ class AdvancedBatchProcessor:
         print("="*60)
         print(f"✅ Thành công: {stats['completed']}")
         print(f"❌ Thất bại: {stats['failed']}")
+        if stats['cancelled']:
+            print(f"🚫 Đã hủy: {stats['cancelled']}")
         print(f"📈 Tổng cộng: {stats['total']}")
         
         if 'total_duration' in stats:
@@ -490,13 +1030,18 @@ class AdvancedBatchProcessor:
         return stats
     
     def export_report(self, output_path: str):
-        """Xuất báo cáo chi tiết"""
+        """Xuất báo cáo chi tiết (kèm file trace Chrome/Perfetto <report>.trace.json)"""
+        trace_path = os.path.splitext(output_path)[0] + '.trace.json'
+        recorder.export_chrome_trace(trace_path)
+        
         report = {
             'summary': self.get_statistics(),
             'progress': self.get_progress(),
             'completed_tasks': self.completed_tasks,
             'failed_tasks': self.failed_tasks,
             'system_info': self.check_system_resources(),
+            'stage_timings': recorder.summary(),
+            'trace_file': trace_path,
             'export_time': datetime.now().isoformat(),
             'processor_config': {
                 'max_workers': self.max_workers,
@@ -512,8 +1057,12 @@ class AdvancedBatchProcessor:
 
 # Convenience functions
 def process_large_batch(input_folder: str, output_folder: str, config: Dict = None, 
-                       max_workers: int = None, memory_limit_gb: int = 8) -> AdvancedBatchProcessor:
-    """Xử lý batch lớn (100+ video) với cấu hình tối ưu"""
+                       max_workers: int = None, memory_limit_gb: int = 8,
+                       metrics_port: int = None) -> AdvancedBatchProcessor:
+    """Xử lý batch lớn (100+ video) với cấu hình tối ưu
+    
+    metrics_port: mở endpoint Prometheus /metrics trên cổng này (None = không mở)
+    """
     
     print(f"🎬 ADVANCED BATCH PROCESSING - LARGE SCALE")
     print(f"📁 Input: {input_folder}")
@@ -526,12 +1075,14 @@ def process_large_batch(input_folder: str, output_folder: str, config: Dict = No
         priority_mode=True
     )
     
-    # Add all videos with smart priority
+    if metrics_port:
+        processor.start_metrics_server(port=metrics_port)
+    
+    # Add all videos (video dự đoán lâu nhất chạy trước)
     task_ids = processor.add_folder_videos(
         input_folder=input_folder,
         output_folder=output_folder,
-        config=config,
-        priority_by_size=True
+        config=config
     )
     
     print(f"📋 Đã thêm {len(task_ids)} video vào queue")
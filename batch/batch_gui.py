@@ -11,6 +11,7 @@ import os
 import time
 from datetime import datetime
 from .batch_processor import BatchProcessor, create_batch_config
+from encoder_profiles import FINAL_PROFILES
 
 class BatchProcessingGUI:
     """GUI cho batch processing"""
@@ -172,6 +173,23 @@ class BatchProcessingGUI:
         ext_entry = ttk.Entry(ext_frame, textvariable=self.extensions_var, width=30)
         ext_entry.pack(side=tk.LEFT, padx=(10, 0))
         
+        # Encoder profile
+        encoder_frame = ttk.Frame(settings_frame)
+        encoder_frame.pack(fill=tk.X, pady=5)
+        
+        ttk.Label(encoder_frame, text="🎚️ Chất lượng encode:").pack(side=tk.LEFT)
+        self.encoder_profile_var = tk.StringVar(value="balanced")
+        encoder_combo = ttk.Combobox(
+            encoder_frame,
+            textvariable=self.encoder_profile_var,
+            values=list(FINAL_PROFILES),
+            state="readonly",
+            width=10
+        )
+        encoder_combo.pack(side=tk.LEFT, padx=(10, 20))
+        
+        ttk.Label(encoder_frame, text="(draft: QA nhanh, archive: chất lượng cao)", foreground="gray").pack(side=tk.LEFT)
+        
     def create_progress_section(self, parent):
         """Tạo phần hiển thị tiến độ"""
         progress_frame = ttk.LabelFrame(parent, text="📊 Tiến độ xử lý", padding="10")
@@ -335,7 +353,8 @@ class BatchProcessingGUI:
                 source_lang=self.source_lang_var.get(),
                 target_lang=self.target_lang_var.get(),
                 img_folder=self.img_folder_var.get() if self.img_folder_var.get() else None,
-                custom_timeline=self.custom_timeline_var.get()
+                custom_timeline=self.custom_timeline_var.get(),
+                encoder_profile=self.encoder_profile_var.get()
             )
             
             # Add videos
@@ -11,6 +11,9 @@ import time
 from datetime import datetime
 import json
 from main import AutoVideoEditor
+from job_control import CancelToken, cancel_scope, JobCancelled
+from ffmpeg_runner import progress_context
+from instrumentation import recorder, span
 
 class BatchProcessor:
     """Xử lý hàng loạt video với multi-threading"""
@@ -20,6 +23,7 @@ class BatchProcessor:
         self.video_queue = queue.Queue()
         self.result_queue = queue.Queue()
         self.workers = []
+        self.cancel_tokens = {}  # worker_id -> CancelToken của video đang xử lý
         self.is_processing = False
         self.stats = {
             'total': 0,
@@ -76,18 +80,29 @@ class BatchProcessor:
                 start_time = time.time()
                 print(f"🔄 Worker {worker_id}: Bắt đầu xử lý {os.path.basename(task['input_path'])}")
                 
+                token = CancelToken(f"worker-{worker_id}")
+                self.cancel_tokens[worker_id] = token
+                if not self.is_processing:
+                    token.cancel()  # Dừng đúng lúc vừa lấy task
+                
                 try:
-                    # Xử lý video
-                    editor.process_video(
-                        input_video_path=task['input_path'],
-                        output_video_path=task['output_path'],
-                        source_language=task['config'].get('source_language', 'vi'),
-                        target_language=task['config'].get('target_language', 'en'),
-                        img_folder=task['config'].get('img_folder'),
-                        overlay_times=task['config'].get('overlay_times'),
-                        video_overlay_settings=task['config'].get('video_overlay_settings'),
-                        custom_timeline=task['config'].get('custom_timeline', False)
-                    )
+                    # Xử lý video (tiến trình FFmpeg đăng ký với token để Dừng có hiệu lực ngay)
+                    with cancel_scope(token), progress_context(video=os.path.basename(task['input_path'])), \
+                            span('video', category='task'):
+                        editor.process_video(
+                            input_video_path=task['input_path'],
+                            output_video_path=task['output_path'],
+                            source_language=task['config'].get('source_language', 'vi'),
+                            target_language=task['config'].get('target_language', 'en'),
+                            img_folder=task['config'].get('img_folder'),
+                            overlay_times=task['config'].get('overlay_times'),
+                            video_overlay_settings=task['config'].get('video_overlay_settings'),
+                            custom_timeline=task['config'].get('custom_timeline', False),
+                            timeline=task['config'].get('timeline'),
+                            fill_mode=task['config'].get('fill_mode', 'pad'),
+                            encoder_profile=task['config'].get('encoder_profile'),
+                            intermediate_profile=task['config'].get('intermediate_profile', 'intermediate')
+                        )
                     
                     end_time = time.time()
                     duration = end_time - start_time
@@ -104,6 +119,15 @@ class BatchProcessor:
                     self.stats['completed'] += 1
                     print(f"✅ Worker {worker_id}: Hoàn thành {os.path.basename(task['input_path'])} ({duration:.1f}s)")
                     
+                except JobCancelled:
+                    result = {
+                        'status': 'cancelled',
+                        'input_path': task['input_path'],
+                        'worker_id': worker_id,
+                        'completed_time': datetime.now()
+                    }
+                    print(f"🛑 Worker {worker_id}: Đã hủy {os.path.basename(task['input_path'])}")
+                    
                 except Exception as e:
                     result = {
                         'status': 'failed',
@@ -115,6 +139,8 @@ class BatchProcessor:
                     
                     self.stats['failed'] += 1
                     print(f"❌ Worker {worker_id}: Lỗi xử lý {os.path.basename(task['input_path'])}: {str(e)}")
+                finally:
+                    self.cancel_tokens.pop(worker_id, None)
                 
                 self.result_queue.put(result)
                 self.video_queue.task_done()
@@ -137,6 +163,7 @@ class BatchProcessor:
         self.stats['start_time'] = datetime.now()
         self.stats['completed'] = 0
         self.stats['failed'] = 0
+        recorder.clear()  # Trace riêng cho lần chạy này
         
         print(f"🚀 Bắt đầu batch processing với {self.max_workers} workers")
         print(f"📊 Tổng số video: {self.stats['total']}")
@@ -159,6 +186,10 @@ class BatchProcessor:
         self.is_processing = False
         self.stats['end_time'] = datetime.now()
         
+        # Hủy video đang xử lý: dừng ngay FFmpeg, file tạm được dọn trong process_video
+        for token in list(self.cancel_tokens.values()):
+            token.cancel()
+        
         # Đợi workers hoàn thành
         for worker in self.workers:
             worker.join(timeout=5)
@@ -208,10 +239,15 @@ class BatchProcessor:
         return stats
         
     def export_report(self, output_path):
-        """Xuất báo cáo ra file JSON"""
+        """Xuất báo cáo ra file JSON (kèm file trace Chrome/Perfetto <report>.trace.json)"""
+        trace_path = os.path.splitext(output_path)[0] + '.trace.json'
+        recorder.export_chrome_trace(trace_path)
+        
         report = {
             'statistics': self.get_statistics(),
             'results': self.get_results(),
+            'stage_timings': recorder.summary(),
+            'trace_file': trace_path,
             'export_time': datetime.now().isoformat()
         }
         
@@ -222,14 +258,25 @@ class BatchProcessor:
 
 # Utility functions
 def create_batch_config(source_lang='vi', target_lang='en', img_folder=None, 
-                       custom_timeline=False, video_overlay_settings=None):
+                       custom_timeline=False, video_overlay_settings=None, timeline=None,
+                       fill_mode='pad', encoder_profile='balanced',
+                       intermediate_profile='intermediate'):
     """Tạo cấu hình cho batch processing"""
+    if timeline is not None:
+        # Load + validate timeline một lần, dùng chung cho cả batch
+        from overlay_timeline import load_timeline
+        timeline = load_timeline(timeline)
+    
     return {
         'source_language': source_lang,
         'target_language': target_lang,
         'img_folder': img_folder,
         'custom_timeline': custom_timeline,
-        'video_overlay_settings': video_overlay_settings
+        'video_overlay_settings': video_overlay_settings,
+        'timeline': timeline,
+        'fill_mode': fill_mode,
+        'encoder_profile': encoder_profile,
+        'intermediate_profile': intermediate_profile
     }
 
 def quick_batch_process(input_folder, output_folder, config=None, max_workers=3):
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Hot Folder Daemon - Tự động xử lý video được thả vào thư mục input
+
+- Theo dõi thư mục bằng inotify (Linux, nếu có inotify_simple), ngược lại quét định kỳ
+- Chỉ nhận file khi đã ghi xong: kích thước + mtime không đổi trong settle_seconds
+- Đưa vào AdvancedBatchProcessor chạy liên tục (keep_alive) với cấu hình mẫu
+- Video ra được ghi vào file tạm ẩn rồi đổi tên (atomic), kèm báo cáo <tên>.json
+  ghi qua file tạm + rename; file đã có báo cáo khớp input thì không xử lý lại
+- Mỗi phiên bản file (đường dẫn, kích thước, mtime) là một task riêng; file bị
+  ghi đè khi bản cũ còn chờ / đang chạy thì bản cũ bị hủy
+
+    python -m batch.hot_folder /data/inbox /data/shorts --config template.json --workers 4
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import signal
+import argparse
+import threading
+from datetime import datetime
+
+from .advanced_batch_processor import AdvancedBatchProcessor
+
+try:
+    from inotify_simple import INotify, flags
+    HAS_INOTIFY = True
+except ImportError:
+    HAS_INOTIFY = False
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm')
+PARTIAL_SUFFIX = '.partial'
+
+class HotFolderDaemon:
+    """Theo dõi thư mục input và xử lý video mới liên tục"""
+
+    def __init__(self, input_folder, output_folder, config=None, processor=None,
+                 poll_interval=2.0, settle_seconds=5.0, use_inotify=True):
+        """
+        Args:
+            config (dict, optional): Cấu hình mẫu áp dụng cho mọi video (như config của batch)
+            processor (AdvancedBatchProcessor, optional): Engine dùng chung, None = tạo mới
+            poll_interval (float): Chu kỳ quét thư mục / kiểm tra file đang ghi (giây)
+            settle_seconds (float): File phải đứng yên (kích thước, mtime) chừng này giây mới xử lý
+            use_inotify (bool): Dùng inotify khi có, False = luôn quét định kỳ
+        """
+        if not os.path.isdir(input_folder):
+            raise FileNotFoundError(f"Thư mục không tồn tại: {input_folder}")
+        os.makedirs(output_folder, exist_ok=True)
+
+        self.input_folder = input_folder
+        self.output_folder = output_folder
+        self.processor = processor or AdvancedBatchProcessor()
+        self.config = self.processor.prepare_config(config)
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.use_inotify = use_inotify and HAS_INOTIFY
+
+        self.pending = {}     # đường dẫn -> (size, mtime, thời điểm bắt đầu đứng yên)
+        self.submitted = {}   # đường dẫn -> (size, mtime) đã đưa vào engine
+        self.in_flight = {}   # task_id -> (đường dẫn, size, mtime) chưa xong
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.engine_thread = None
+
+        self.processor.add_result_listener(self._on_result)
+
+    @staticmethod
+    def task_id_for(input_path, size, mtime):
+        """task_id theo phiên bản file: file bị ghi đè / thả lại là task khác (work dir, file tạm riêng)"""
+        return hashlib.md5(f"{input_path}|{size}|{mtime}".encode()).hexdigest()[:8]
+
+    def output_paths(self, input_path, task_id=None):
+        """(video đang ghi, video cuối, báo cáo) cho một input"""
+        name, ext = os.path.splitext(os.path.basename(input_path))
+        final_path = os.path.join(self.output_folder, f"{name}_processed{ext.lower()}")
+        # File tạm ẩn riêng cho từng task, giữ phần mở rộng để FFmpeg chọn đúng muxer
+        partial_path = os.path.join(self.output_folder, f".{name}_processed.{task_id}{PARTIAL_SUFFIX}{ext.lower()}")
+        report_path = os.path.join(self.output_folder, f"{name}_processed.json")
+        return partial_path, final_path, report_path
+
+    def _already_processed(self, input_path, size, mtime):
+        """Đã có báo cáo cho đúng phiên bản file này (cùng kích thước, mtime)"""
+        report_path = self.output_paths(input_path)[2]
+        if not os.path.exists(report_path):
+            return False
+        try:
+            with open(report_path, 'r', encoding='utf-8') as f:
+                report = json.load(f)
+            return report.get('input_size') == size and report.get('input_mtime') == mtime
+        except Exception:
+            return False
+
+    def _candidates(self):
+        """Video trong thư mục input"""
+        try:
+            entries = list(os.scandir(self.input_folder))
+        except OSError as e:
+            print(f"⚠️ Không đọc được thư mục input: {e}")
+            return []
+        return [entry.path for entry in entries if entry.is_file() and self._is_video_name(entry.name)]
+
+    @staticmethod
+    def _is_video_name(name):
+        """Bỏ file ẩn / file tạm của trình upload và file không phải video"""
+        return not name.startswith('.') and os.path.splitext(name)[1].lower() in VIDEO_EXTENSIONS
+
+    def _observe(self, paths):
+        """Cập nhật trạng thái các file, đưa file đã ghi xong vào engine"""
+        now = time.monotonic()
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self.pending.pop(path, None)
+                continue
+            signature = (stat.st_size, stat.st_mtime)
+
+            with self.lock:
+                if self.submitted.get(path) == signature:
+                    continue
+            if stat.st_size == 0:
+                continue
+
+            previous = self.pending.get(path)
+            if not previous or previous[:2] != signature:
+                # Mới thấy hoặc vẫn đang được ghi: bắt đầu đếm lại
+                self.pending[path] = (*signature, now)
+                continue
+
+            if now - previous[2] >= self.settle_seconds:
+                del self.pending[path]
+                self._submit(path, *signature)
+
+    def _submit(self, input_path, size, mtime):
+        task_id = self.task_id_for(input_path, size, mtime)
+        with self.lock:
+            self.submitted[input_path] = (size, mtime)
+            # Phiên bản cũ của cùng file còn đang chờ / chạy: hủy, chỉ xử lý bản mới nhất
+            outdated = [other_id for other_id, entry in self.in_flight.items() if entry[0] == input_path]
+        for other_id in outdated:
+            if self.processor.cancel_task(other_id):
+                print(f"♻️ Hot folder: {os.path.basename(input_path)} đã thay đổi, hủy bản cũ [{other_id}]")
+        if self._already_processed(input_path, size, mtime):
+            return
+
+        partial_path = self.output_paths(input_path, task_id)[0]
+        with self.lock:
+            self.in_flight[task_id] = (input_path, size, mtime)
+        try:
+            self.processor.add_video_task(input_path, partial_path, self.config, task_id=task_id)
+            print(f"📥 Hot folder: nhận {os.path.basename(input_path)}")
+        except Exception as e:
+            with self.lock:
+                self.in_flight.pop(task_id, None)
+            print(f"❌ Hot folder: không thể thêm {input_path}: {e}")
+
+    def _on_result(self, task, result):
+        """Task xong: đổi tên video tạm thành video cuối, ghi báo cáo (đều atomic)"""
+        with self.lock:
+            entry = self.in_flight.pop(task.task_id, None)
+        if entry is None:
+            return  # Task không do hot folder thêm vào
+        _, size, mtime = entry
+        partial_path, final_path, report_path = self.output_paths(task.input_path, task.task_id)
+
+        if result['status'] == 'cancelled':
+            # Bị thay bằng phiên bản mới hơn của file: không ghi báo cáo
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            return
+
+        report = {
+            'status': result['status'],
+            'input_path': task.input_path,
+            'input_size': size,
+            'input_mtime': mtime,
+            'output_path': final_path if result['status'] == 'success' else None,
+            'duration': result.get('duration'),
+            'predicted_duration': task.estimated_time,
+            'retry_count': task.retry_count,
+            'error': result.get('error'),
+            'error_class': result.get('error_class'),
+            'config': self.config,
+            'completed_time': datetime.now().isoformat()
+        }
+
+        if result['status'] == 'success':
+            os.replace(partial_path, final_path)
+            report['output_size'] = os.path.getsize(final_path)
+        elif os.path.exists(partial_path):
+            os.remove(partial_path)
+
+        temp_report = report_path + PARTIAL_SUFFIX
+        with open(temp_report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+        os.replace(temp_report, report_path)
+        print(f"📤 Hot folder: {os.path.basename(final_path)} ({result['status']})")
+
+    def _watch_inotify(self):
+        inotify = INotify()
+        inotify.add_watch(self.input_folder, flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE | flags.MODIFY)
+        try:
+            while not self.stop_event.is_set():
+                events = inotify.read(timeout=int(self.poll_interval * 1000))
+                changed = {os.path.join(self.input_folder, event.name) for event in events
+                           if event.name and self._is_video_name(event.name)}
+                # File đang chờ đứng yên cũng cần kiểm tra lại dù không có sự kiện mới
+                self._observe(list(changed | set(self.pending)))
+        finally:
+            inotify.close()
+
+    def _watch_polling(self):
+        while not self.stop_event.wait(self.poll_interval):
+            self._observe(self._candidates())
+
+    def start(self):
+        """Chạy engine nền (keep_alive) và nhận các video đã có sẵn trong thư mục"""
+        self.engine_thread = threading.Thread(
+            target=self.processor.start_processing, kwargs={'keep_alive': True}, daemon=True
+        )
+        self.engine_thread.start()
+        self._observe(self._candidates())
+        return self
+
+    def run_forever(self):
+        """Theo dõi thư mục tới khi stop() được gọi (chặn thread hiện tại)"""
+        if not self.engine_thread:
+            self.start()
+        mode = 'inotify' if self.use_inotify else f'quét mỗi {self.poll_interval}s'
+        print(f"👀 Hot folder: theo dõi {self.input_folder} ({mode}) → {self.output_folder}")
+        if self.use_inotify:
+            self._watch_inotify()
+        else:
+            self._watch_polling()
+
+    def stop(self):
+        """Ngừng theo dõi và dừng engine (task dở dang được xử lý lại ở lần chạy sau)"""
+        self.stop_event.set()
+        if self.processor.is_processing:
+            self.processor.stop_processing()
+        if self.engine_thread:
+            self.engine_thread.join()
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot folder: tự động xử lý video mới trong thư mục")
+    parser.add_argument("input_folder", help="Thư mục nhận video")
+    parser.add_argument("output_folder", help="Thư mục ghi video đã xử lý + báo cáo")
+    parser.add_argument("--config", help="File JSON cấu hình mẫu (source_language, fill_mode, timeline...)")
+    parser.add_argument("--workers", type=int, default=None, help="Số worker (mặc định theo số CPU)")
+    parser.add_argument("--memory-limit", type=float, default=8, help="Ngân sách bộ nhớ cho các job (GB)")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="Chu kỳ kiểm tra thư mục (giây)")
+    parser.add_argument("--settle-seconds", type=float, default=5.0, help="Thời gian file đứng yên trước khi xử lý")
+    parser.add_argument("--no-inotify", action="store_true", help="Luôn quét định kỳ thay vì dùng inotify")
+    parser.add_argument("--metrics-port", type=int, help="Mở endpoint Prometheus /metrics trên cổng này")
+    args = parser.parse_args()
+
+    config = None
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+
+    processor = AdvancedBatchProcessor(max_workers=args.workers, memory_limit_gb=args.memory_limit)
+    if args.metrics_port:
+        processor.start_metrics_server(port=args.metrics_port)
+
+    daemon = HotFolderDaemon(
+        args.input_folder, args.output_folder, config=config, processor=processor,
+        poll_interval=args.poll_interval, settle_seconds=args.settle_seconds,
+        use_inotify=not args.no_inotify
+    )
+
+    # SIGTERM (systemd, docker stop) dừng êm như Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop_event.set())
+    try:
+        daemon.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("🛑 Hot folder: đang dừng...")
+        daemon.stop()
+        processor.stop_metrics_server()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Job API - HTTP/JSON server cục bộ bọc một AdvancedBatchProcessor chạy liên tục
+
+Dịch vụ khác gửi job qua HTTP thay vì gọi main.py mỗi lần: engine chạy sẵn
+(keep_alive), mỗi worker giữ model Whisper đã load, số job chạy song song
+giới hạn bởi --workers và số job chờ giới hạn bởi --max-queued.
+Chỉ nghe 127.0.0.1, chỉ dùng thư viện chuẩn.
+
+Bảo vệ khỏi trang web gọi vào localhost: request có header Origin bị từ chối,
+POST phải là application/json (trình duyệt buộc preflight, server không trả lời).
+Input phải là file video; output luôn nằm trong output_folder (output_path
+tương đối so với thư mục đó) vì job bị hủy sẽ xóa file output.
+
+    POST   /jobs              {"input_path": "...", "output_path": "a/b.mp4", "config": {...}, "priority": 0}
+    GET    /jobs              Danh sách job
+    GET    /jobs/<id>         Trạng thái + tiến độ
+    DELETE /jobs/<id>         Hủy job (đang chạy hoặc đang chờ)
+    GET    /jobs/<id>/result  Tải video kết quả
+    GET    /status            Tiến độ chung của engine
+    GET    /metrics           Prometheus
+
+    python -m batch.job_api --port 8765 --workers 2 --config defaults.json
+    curl -X POST localhost:8765/jobs -H 'Content-Type: application/json' \
+         -d '{"input_path": "/data/a.mp4", "config": {"fill_mode": "blur"}}'
+"""
+
+import os
+import sys
+import json
+import uuid
+import shutil
+import signal
+import argparse
+import mimetypes
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .advanced_batch_processor import AdvancedBatchProcessor
+from .hot_folder import VIDEO_EXTENSIONS
+from metrics import MetricsServer, CONTENT_TYPE as METRICS_CONTENT_TYPE
+
+DEFAULT_PORT = 8765
+MAX_QUEUED = 100
+MAX_BODY_BYTES = 1024 * 1024  # Body JSON của một job (config, timeline)
+CHUNK_SIZE = 1024 * 1024
+
+class JobAPIError(Exception):
+    """Lỗi trả về cho client kèm HTTP status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class JobServer:
+    """HTTP server nhận job và theo dõi kết quả của một AdvancedBatchProcessor"""
+
+    def __init__(self, processor=None, output_folder="api_output", config=None,
+                 host='127.0.0.1', port=DEFAULT_PORT, max_queued=MAX_QUEUED):
+        """
+        Args:
+            processor (AdvancedBatchProcessor, optional): Engine dùng chung, None = tạo mới
+            output_folder (str): Nơi ghi video khi job không chỉ định output_path
+            config (dict, optional): Cấu hình mặc định, config của từng job ghi đè lên
+            host (str): Mặc định chỉ nghe localhost
+            max_queued (int): Số job chờ tối đa, vượt quá trả 429
+        """
+        self.processor = processor or AdvancedBatchProcessor()
+        self.output_folder = output_folder
+        self.config = config or {}
+        self.host = host
+        self.port = port
+        self.max_queued = max_queued
+
+        self.jobs = {}  # job_id -> thông tin job (kết quả ghi vào khi xong)
+        self.lock = threading.Lock()
+        self.metrics = MetricsServer(self.processor.collect_metrics)
+        self.httpd = None
+        self.thread = None
+        self.engine_thread = None
+
+        self.processor.add_result_listener(self._on_result)
+
+    def submit(self, payload):
+        """Tạo job từ body JSON, trả về thông tin job"""
+        input_path = payload.get('input_path')
+        if not input_path:
+            raise JobAPIError(400, "Thiếu input_path")
+        input_path = os.path.abspath(input_path)
+        if os.path.splitext(input_path)[1].lower() not in VIDEO_EXTENSIONS:
+            raise JobAPIError(400, f"Không phải file video: {input_path}")
+        if not os.path.isfile(input_path):
+            raise JobAPIError(400, f"Video không tồn tại: {input_path}")
+        if not isinstance(payload.get('config', {}), dict):
+            raise JobAPIError(400, "config phải là object JSON")
+        try:
+            priority = int(payload.get('priority', 0))
+        except (TypeError, ValueError):
+            raise JobAPIError(400, f"priority phải là số nguyên: {payload.get('priority')!r}")
+
+        with self.processor.lock:
+            queued = self.processor.stats['queued']
+        if queued >= self.max_queued:
+            raise JobAPIError(429, f"Hàng đợi đầy ({queued} job), thử lại sau")
+
+        try:
+            config = self.processor.prepare_config({**self.config, **payload.get('config', {})})
+        except Exception as e:
+            raise JobAPIError(400, f"Cấu hình không hợp lệ: {e}")
+
+        job_id = uuid.uuid4().hex[:12]
+        output_path = self._resolve_output(payload.get('output_path'), input_path, job_id)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+        job = {
+            'id': job_id,
+            'input_path': input_path,
+            'output_path': output_path,
+            'config': config,
+            'priority': priority,
+            'status': 'queued',
+            'submitted_time': datetime.now().isoformat(),
+            'result': None
+        }
+        with self.lock:
+            self.jobs[job_id] = job
+        try:
+            self.processor.add_video_task(input_path, output_path, config, job['priority'], task_id=job_id)
+        except Exception as e:
+            with self.lock:
+                del self.jobs[job_id]
+            raise JobAPIError(400, str(e))
+        return self.describe(job_id)
+
+    def _resolve_output(self, output_path, input_path, job_id):
+        """
+        Đường dẫn output tuyệt đối, luôn nằm trong output_folder
+
+        Job bị hủy sẽ xóa file output nên không cho client trỏ ra ngoài thư mục này,
+        kể cả qua '..' hay symlink.
+        """
+        root = os.path.realpath(self.output_folder)
+        if not output_path:
+            name, ext = os.path.splitext(os.path.basename(input_path))
+            return os.path.join(root, f"{name}_{job_id}_processed{ext.lower()}")
+
+        if not isinstance(output_path, str) or os.path.isabs(output_path):
+            raise JobAPIError(400, f"output_path phải là đường dẫn tương đối trong {self.output_folder}")
+        resolved = os.path.realpath(os.path.join(root, output_path))
+        try:
+            inside = os.path.commonpath([root, resolved]) == root and resolved != root
+        except ValueError:  # Khác ổ đĩa (Windows)
+            inside = False
+        if not inside:
+            raise JobAPIError(400, f"output_path nằm ngoài {self.output_folder}: {output_path}")
+        if os.path.splitext(resolved)[1].lower() not in VIDEO_EXTENSIONS:
+            raise JobAPIError(400, f"output_path phải là file video: {output_path}")
+        return resolved
+
+    def describe(self, job_id):
+        """Thông tin job + tiến độ (job chưa xong lấy trực tiếp từ engine)"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            job = dict(job) if job else None
+        if job is None:
+            raise JobAPIError(404, f"Không có job {job_id}")
+        if job['result'] is None:
+            progress = self.processor.get_task_status(job_id)
+            if progress:
+                job['status'] = progress.pop('state')
+                job['progress'] = progress
+        return job
+
+    def list_jobs(self):
+        with self.lock:
+            job_ids = list(self.jobs)
+        return [self.describe(job_id) for job_id in job_ids]
+
+    def cancel(self, job_id):
+        job = self.describe(job_id)
+        if job['result'] is not None:
+            raise JobAPIError(409, f"Job {job_id} đã kết thúc ({job['status']})")
+        if not self.processor.cancel_task(job_id):
+            raise JobAPIError(409, f"Không thể hủy job {job_id}")
+        return {'id': job_id, 'cancelling': True}
+
+    def _on_result(self, task, result):
+        """Task xong (thành công / thất bại / hủy): lưu kết quả vào job"""
+        with self.lock:
+            job = self.jobs.get(task.task_id)
+            if job is None:
+                return  # Task không do API thêm vào
+            job['status'] = result['status']
+            job['result'] = {
+                'duration': result.get('duration'),
+                'predicted_duration': task.estimated_time,
+                'output_size': result.get('output_size'),
+                'retry_count': task.retry_count,
+                'error': result.get('error'),
+                'error_class': result.get('error_class'),
+                'completed_time': datetime.now().isoformat()
+            }
+
+    def result_file(self, job_id):
+        """Đường dẫn video kết quả của job đã thành công"""
+        job = self.describe(job_id)
+        if job['status'] != 'success':
+            raise JobAPIError(409, f"Job {job_id} chưa có kết quả ({job['status']})")
+        if not os.path.exists(job['output_path']):
+            raise JobAPIError(410, f"File kết quả đã bị xóa: {job['output_path']}")
+        return job['output_path']
+
+    def start(self):
+        """Chạy engine nền (keep_alive) và HTTP server trên daemon thread"""
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _route(self):
+                parts = [part for part in self.path.split('?')[0].split('/') if part]
+                return parts
+
+            def _send_json(self, status, data):
+                body = json.dumps(data, ensure_ascii=False, indent=2, default=str).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                if status == 429:
+                    self.send_header('Retry-After', '30')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _handle(self, action):
+                try:
+                    if self.headers.get('Origin'):
+                        # Request từ trình duyệt (trang web bất kỳ gọi vào localhost)
+                        raise JobAPIError(403, "Không nhận request từ trình duyệt (có header Origin)")
+                    action()
+                except JobAPIError as e:
+                    self._send_json(e.status, {'error': str(e)})
+                except Exception as e:
+                    self._send_json(500, {'error': str(e)})
+
+            def _read_json(self):
+                content_type = (self.headers.get('Content-Type') or '').split(';')[0].strip().lower()
+                if content_type != 'application/json':
+                    raise JobAPIError(415, "Content-Type phải là application/json")
+                length = int(self.headers.get('Content-Length') or 0)
+                if length > MAX_BODY_BYTES:
+                    raise JobAPIError(413, "Body quá lớn")
+                try:
+                    payload = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError as e:
+                    raise JobAPIError(400, f"JSON không hợp lệ: {e}")
+                if not isinstance(payload, dict):
+                    raise JobAPIError(400, "Body phải là object JSON")
+                return payload
+
+            def _send_file(self, path):
+                content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(os.path.getsize(path)))
+                self.send_header('Content-Disposition', f'attachment; filename="{os.path.basename(path)}"')
+                self.end_headers()
+                with open(path, 'rb') as f:
+                    shutil.copyfileobj(f, self.wfile, CHUNK_SIZE)
+
+            def _send_metrics(self):
+                body = server.metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', METRICS_CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                def action():
+                    parts = self._route()
+                    if parts == ['jobs']:
+                        self._send_json(200, server.list_jobs())
+                    elif len(parts) == 2 and parts[0] == 'jobs':
+                        self._send_json(200, server.describe(parts[1]))
+                    elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'result':
+                        self._send_file(server.result_file(parts[1]))
+                    elif parts == ['status']:
+                        self._send_json(200, server.processor.get_progress())
+                    elif parts == ['metrics']:
+                        self._send_metrics()
+                    else:
+                        raise JobAPIError(404, f"Không có endpoint {self.path}")
+                self._handle(action)
+
+            def do_POST(self):
+                def action():
+                    parts = self._route()
+                    if parts == ['jobs']:
+                        self._send_json(201, server.submit(self._read_json()))
+                    elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'cancel':
+                        self._send_json(202, server.cancel(parts[1]))
+                    else:
+                        raise JobAPIError(404, f"Không có endpoint {self.path}")
+                self._handle(action)
+
+            def do_DELETE(self):
+                def action():
+                    parts = self._route()
+                    if len(parts) != 2 or parts[0] != 'jobs':
+                        raise JobAPIError(404, f"Không có endpoint {self.path}")
+                    self._send_json(202, server.cancel(parts[1]))
+                self._handle(action)
+
+            def log_message(self, format, *args):
+                pass  # Không in mỗi request (client poll trạng thái liên tục)
+
+        self.engine_thread = threading.Thread(
+            target=self.processor.start_processing, kwargs={'keep_alive': True}, daemon=True
+        )
+        self.engine_thread.start()
+
+        self.httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"🌐 Job API: http://{self.host}:{self.port}/jobs")
+        return self
+
+    def stop(self):
+        """Đóng HTTP server và dừng engine (job dở dang không được xử lý tiếp)"""
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+        if self.processor.is_processing:
+            self.processor.stop_processing()
+        if self.engine_thread:
+            self.engine_thread.join()
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP/JSON API cục bộ để gửi và theo dõi job xử lý video")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Cổng HTTP (chỉ nghe 127.0.0.1)")
+    parser.add_argument("--output-folder", default="api_output", help="Thư mục kết quả khi job không có output_path")
+    parser.add_argument("--config", help="File JSON cấu hình mặc định cho mọi job")
+    parser.add_argument("--workers", type=int, default=None, help="Số job chạy song song (mặc định theo số CPU)")
+    parser.add_argument("--memory-limit", type=float, default=8, help="Ngân sách bộ nhớ cho các job (GB)")
+    parser.add_argument("--max-queued", type=int, default=MAX_QUEUED, help="Số job chờ tối đa")
+    args = parser.parse_args()
+
+    config = None
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+
+    processor = AdvancedBatchProcessor(max_workers=args.workers, memory_limit_gb=args.memory_limit)
+    server = JobServer(processor, output_folder=args.output_folder, config=config,
+                       port=args.port, max_queued=args.max_queued).start()
+
+    # SIGTERM (systemd, docker stop) dừng êm như Ctrl+C
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    try:
+        while not stop_event.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("🛑 Job API: đang dừng...")
+        server.stop()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark chi phí các fill mode khi đưa video 16:9 về 9:16
+
+So sánh pad, blur (nền mờ tính ở 1/8 độ phân giải) và blur ở độ phân giải
+đầy đủ (tham chiếu) trên video tổng hợp lavfi, ra null muxer, hai phép đo:
+- filter: chỉ chạy filter graph (không encode)
+- encode: filter + libx264 (chi phí thực tế; nền mờ có chi tiết nên x264
+  tốn hơn vùng pad đen phẳng, phần này không phụ thuộc cách dựng graph)
+
+Thoát với mã 1 nếu blur (filter) không nhanh hơn blur_full_res ít nhất
+BLUR_MIN_SPEEDUP: đó là phần kỹ thuật tính nền ở độ phân giải thấp quyết định.
+Chênh lệch so với pad chỉ được báo cáo, không dùng làm ngưỡng: ghép hai
+stream (overlay / vstack) và encode dải nền có chi tiết là chi phí của chính
+tính năng (đo được +42–45% so với pad, 1 CPU, libx264 veryfast).
+
+    python benchmarks/bench_fill_modes.py --duration 20 --runs 3
+"""
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from filter_graph import FilterGraph
+from aspect_ratio_converter import blur_fill, aspect_output_size
+
+BLUR_MIN_SPEEDUP = 0.4   # blur phải nhanh hơn blur_full_res ít nhất 40% (filter)
+
+def _source_args(duration, size):
+    """Input lavfi tổng hợp (không cần file mẫu)"""
+    # yuv420p như video đã decode (testsrc2 không ép format sẽ thêm bước chuyển màu)
+    return ['-f', 'lavfi', '-i', f'testsrc2=size={size}:rate=30:duration={duration},format=yuv420p']
+
+def _pad_graph(width, height):
+    graph = FilterGraph()
+    stream = graph.scale(graph.input('src'), width, height, force_original_aspect_ratio='decrease')
+    stream = graph.filter(stream, 'pad', width, height, '(ow-iw)/2', '(oh-ih)/2', 'black')
+    graph.output(graph.filter(stream, 'setsar', 1))
+    return graph
+
+def _blur_graph(width, height):
+    graph = FilterGraph()
+    graph.output(blur_fill(graph, graph.input('src'), width, height))
+    return graph
+
+def _full_res_blur_graph(width, height):
+    graph = FilterGraph()
+    graph.output(blur_fill(graph, graph.input('src'), width, height, downscale=1, blur_radius=32))
+    return graph
+
+FILL_MODES = {
+    'pad': _pad_graph,
+    'blur': _blur_graph,
+    'blur_full_res': _full_res_blur_graph,
+}
+
+PHASES = {
+    'filter': [],                                         # wrapped_avframe: không encode
+    'encode': ['-c:v', 'libx264', '-preset', 'veryfast'],
+}
+
+def run_fill_mode(ffmpeg_path, graph, duration, size, phase='encode'):
+    """Chạy một lần, trả về thời gian (giây)"""
+    _, filter_complex, _ = graph.compile()
+    cmd = [
+        ffmpeg_path, '-v', 'error',
+        *_source_args(duration, size),
+        '-filter_complex', filter_complex,
+        *PHASES[phase],
+        '-f', 'null', '-'
+    ]
+    start = time.perf_counter()
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise Exception(f"Lỗi chạy benchmark: {result.stderr}")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fill mode pad/blur")
+    parser.add_argument("--ffmpeg", default="ffmpeg", help="Đường dẫn FFmpeg")
+    parser.add_argument("--duration", type=float, default=20, help="Độ dài video tổng hợp (giây)")
+    parser.add_argument("--size", default="1920x1080", help="Kích thước video nguồn")
+    parser.add_argument("--runs", type=int, default=3, help="Số lần chạy mỗi mode (lấy trung vị)")
+    args = parser.parse_args()
+
+    width, height = aspect_output_size('9:16')
+    timings = {}
+    for phase in PHASES:
+        timings[phase] = {}
+        for mode, build in FILL_MODES.items():
+            runs = sorted(run_fill_mode(args.ffmpeg, build(width, height), args.duration, args.size, phase)
+                          for _ in range(args.runs))
+            timings[phase][mode] = runs[len(runs) // 2]
+            print(f"⏱️ {phase:>6} {mode:>14}: {timings[phase][mode]:.2f}s")
+        pad = timings[phase]['pad']
+        print(f"📊 {phase}: blur {timings[phase]['blur'] / pad - 1:+.1%}, "
+              f"blur_full_res {timings[phase]['blur_full_res'] / pad - 1:+.1%} so với pad")
+
+    for phase in PHASES:
+        speedup = 1 - timings[phase]['blur'] / timings[phase]['blur_full_res']
+        print(f"📊 {phase}: blur nhanh hơn blur_full_res {speedup:.1%}")
+
+    speedup = 1 - timings['filter']['blur'] / timings['filter']['blur_full_res']
+    if speedup < BLUR_MIN_SPEEDUP:
+        print(f"❌ Blur độ phân giải thấp chỉ nhanh hơn {speedup:.1%} (cần {BLUR_MIN_SPEEDUP:.0%})")
+        return 1
+    print(f"✅ Blur độ phân giải thấp nhanh hơn blur_full_res {speedup:.1%} (cần {BLUR_MIN_SPEEDUP:.0%})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
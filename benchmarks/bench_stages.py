@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark từng stage và toàn pipeline trên media tổng hợp
+
+Stage: probe, extract_audio, stt (Whisper tiny), translate (dịch vụ giả lập
+cục bộ), aspect_pad / aspect_blur / aspect_smart_crop (9:16, smart crop báo
+thêm thời gian phân tích và tỉ lệ so với toàn stage; mục tiêu dưới
+SMART_CROP_ANALYSIS_TARGET), overlay_chroma, subtitle_burn.
+Pipeline: process_video (9:16 + overlay + burn phụ đề có sẵn) cho nhiều video
+cùng lúc ở các số worker khác nhau.
+
+Kết quả ghi ra JSON (kèm commit, phiên bản FFmpeg) để so sánh giữa các
+commit bằng benchmarks/compare_results.py.
+
+    python benchmarks/bench_stages.py --sizes 1280x720,1920x1080 --durations 10,30 --workers 1,2,4
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from synthetic_media import make_test_video, make_overlay_clip, make_speech_audio, make_subtitle
+
+STAGES = ('probe', 'extract_audio', 'stt', 'translate', 'aspect_pad', 'aspect_blur',
+          'aspect_smart_crop', 'overlay_chroma', 'subtitle_burn')
+
+SMART_CROP_ANALYSIS_TARGET = 0.05   # Phân tích smart crop < 5% thời gian stage aspect
+
+class StandInTranslationService:
+    """Dịch vụ dịch cục bộ thay Google Translate: độ trễ cố định, trả về chuỗi đảo ngược"""
+
+    def __init__(self, latency=0.02):
+        self.latency = latency
+
+    def translate(self, text, src=None, dest=None):
+        time.sleep(self.latency)
+        return SimpleNamespace(text=text[::-1])
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def time_runs(run, runs):
+    """Chạy run() nhiều lần, trả về {'runs': [...], 'median': ...} (giây)"""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run()
+        timings.append(round(time.perf_counter() - start, 4))
+    return {'runs': timings, 'median': _median(timings)}
+
+def environment_info(ffmpeg_path):
+    """Thông tin để so sánh kết quả giữa các commit / máy"""
+    def first_line(cmd):
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, cwd=os.path.dirname(BENCH_DIR))
+            return result.stdout.splitlines()[0].strip() if result.returncode == 0 and result.stdout else None
+        except OSError:
+            return None
+
+    return {
+        'commit': first_line(['git', 'rev-parse', '--short', 'HEAD']),
+        'ffmpeg': first_line([ffmpeg_path, '-version']),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': datetime.now().isoformat(timespec='seconds')
+    }
+
+def bench_stages(args, media_dir, work_dir):
+    """Đo từng stage, trả về {tên_case: {'runs', 'median', ...}}"""
+    from stage_planner import probe_video
+    from video_processor import VideoProcessor
+    from aspect_ratio_converter import AspectRatioConverter
+    from video_overlay import add_video_overlay_with_chroma
+
+    processor = VideoProcessor()
+    converter = AspectRatioConverter()
+    overlay = make_overlay_clip(media_dir, 'green', ffmpeg_path=args.ffmpeg)
+    results = {}
+
+    def output(name):
+        return os.path.join(work_dir, name)
+
+    for duration in args.durations:
+        subtitle = make_subtitle(media_dir, duration)
+
+        # Stage không phụ thuộc độ phân giải: chỉ theo độ dài
+        if 'extract_audio' in args.stages:
+            video = make_test_video(media_dir, args.sizes[0], duration, speech=True, ffmpeg_path=args.ffmpeg)
+            results[f"extract_audio/{duration}s"] = time_runs(
+                lambda: processor.extract_audio(video, output('audio.wav')), args.runs)
+
+        if 'stt' in args.stages:
+            results[f"stt/{duration}s"] = bench_stt(args, media_dir, duration, output('stt.srt'))
+
+        if 'translate' in args.stages:
+            results[f"translate/{duration}s"] = bench_translate(args, subtitle)
+
+        for size in args.sizes:
+            video = make_test_video(media_dir, size, duration, ffmpeg_path=args.ffmpeg)
+            case = f"{size}/{duration}s"
+
+            if 'probe' in args.stages:
+                results[f"probe/{case}"] = time_runs(lambda: probe_video(video), args.runs)
+
+            for fill_mode in ('pad', 'blur'):
+                if f"aspect_{fill_mode}" in args.stages:
+                    results[f"aspect_{fill_mode}/{case}"] = time_runs(
+                        lambda: converter.convert_to_9_16(video, output('aspect.mp4'), fill_mode=fill_mode,
+                                                          encoder_profile=args.profile),
+                        args.runs)
+
+            if 'aspect_smart_crop' in args.stages:
+                results[f"aspect_smart_crop/{case}"] = bench_smart_crop(args, converter, video, output('aspect.mp4'))
+
+            if 'overlay_chroma' in args.stages:
+                results[f"overlay_chroma/{case}"] = time_runs(
+                    lambda: add_video_overlay_with_chroma(
+                        video, overlay, output('overlay.mp4'), start_time=1, duration=3,
+                        chroma_color='0x00ff00', chroma_similarity=0.2, chroma_blend=0.1,
+                        encoder_profile=args.profile),
+                    args.runs)
+
+            if 'subtitle_burn' in args.stages:
+                results[f"subtitle_burn/{case}"] = time_runs(
+                    lambda: processor.add_subtitle_to_video(video, subtitle, output('subtitle.mp4'),
+                                                            encoder_profile=args.profile),
+                    args.runs)
+
+        for name, result in results.items():
+            if 'median' in result and name.endswith(f"{duration}s"):
+                print(f"⏱️ {name:>36}: {result['median']:.2f}s")
+
+    return results
+
+def bench_smart_crop(args, converter, video, output_path):
+    """Smart crop 9:16: thời gian cả stage và riêng phần phân tích (decode mẫu + tâm + cắt cảnh)"""
+    from smart_crop import plan_smart_crop, HAS_NUMPY
+
+    if not HAS_NUMPY:
+        print("⚠️ Chưa cài NumPy, bỏ qua stage aspect_smart_crop")
+        return {'skipped': 'numpy not installed'}
+
+    info = converter._get_video_info(video)
+    result = time_runs(
+        lambda: converter.convert_to_9_16(video, output_path, fill_mode='smart_crop',
+                                          encoder_profile=args.profile),
+        args.runs)
+    analysis = time_runs(
+        lambda: plan_smart_crop(converter.ffmpeg_path, video, (info['width'], info['height']), 9 / 16),
+        args.runs)
+    result['analysis'] = analysis
+    result['analysis_share'] = round(analysis['median'] / result['median'], 4)
+    status = '✅' if result['analysis_share'] < SMART_CROP_ANALYSIS_TARGET else '❌'
+    print(f"{status} Smart crop: phân tích {analysis['median']:.2f}s / stage {result['median']:.2f}s "
+          f"= {result['analysis_share']:.1%} (mục tiêu < {SMART_CROP_ANALYSIS_TARGET:.0%})")
+    return result
+
+def bench_stt(args, media_dir, duration, subtitle_output):
+    """STT bằng Whisper tiny trên audio giả giọng nói"""
+    from subtitle_generator import SubtitleGenerator, HAS_WHISPER
+
+    if not HAS_WHISPER:
+        print("⚠️ Chưa cài Whisper, bỏ qua stage stt")
+        return {'skipped': 'whisper not installed'}
+
+    generator = SubtitleGenerator(model_name=args.whisper_model)
+    audio = make_speech_audio(media_dir, duration, ffmpeg_path=args.ffmpeg)
+    result = time_runs(lambda: generator.generate_subtitle(audio, subtitle_output, language='en'), args.runs)
+    result['seconds_per_audio_second'] = round(result['median'] / duration, 4)
+    return result
+
+def bench_translate(args, subtitle_path):
+    """Dịch SRT qua dịch vụ giả lập cục bộ (gồm cả nhịp nghỉ chống rate limit của Translator)"""
+    import translator as translator_module
+
+    translator = translator_module.Translator()
+    translator.google_translator = StandInTranslationService(args.translate_latency)
+    with open(subtitle_path, 'r', encoding='utf-8') as f:
+        srt_content = f.read()
+
+    def run():
+        translator_module._translation_cache.clear()  # Mỗi lần chạy đo từ cache rỗng
+        translator._translate_srt_content(srt_content, 'vi', 'en')
+
+    return time_runs(run, args.runs)
+
+def bench_pipeline(args, media_dir, work_dir):
+    """process_video cho nhiều video song song ở từng số worker"""
+    from main import AutoVideoEditor
+
+    duration = args.durations[0]
+    size = args.sizes[-1]
+    video = make_test_video(media_dir, size, duration, ffmpeg_path=args.ffmpeg)
+    subtitle = make_subtitle(media_dir, duration)
+    overlay_settings = {
+        'enabled': True,
+        'video_path': make_overlay_clip(media_dir, 'green', ffmpeg_path=args.ffmpeg),
+        'start_time': 1,
+        'duration': 3,
+        'position': 'center',
+        'size_percent': 30,
+        'chroma_key': True,
+        'chroma_color': 'green'
+    }
+    editor = AutoVideoEditor()
+
+    def render(index):
+        editor.process_video(
+            video, os.path.join(work_dir, f"pipeline_{index}.mp4"),
+            subtitle_path=subtitle, video_overlay_settings=overlay_settings,
+            encoder_profile=args.profile
+        )
+
+    results = {}
+    for workers in args.workers:
+        def run():
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(render, range(args.pipeline_videos)))
+
+        result = time_runs(run, args.runs)
+        result['videos'] = args.pipeline_videos
+        result['videos_per_minute'] = round(args.pipeline_videos / result['median'] * 60, 2)
+        results[f"pipeline/{size}/{duration}s/{workers}w"] = result
+        print(f"⏱️ pipeline {workers} worker: {result['median']:.2f}s ({result['videos_per_minute']} video/phút)")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark các stage xử lý video")
+    parser.add_argument("--ffmpeg", default="ffmpeg", help="Đường dẫn FFmpeg")
+    parser.add_argument("--sizes", default="1280x720,1920x1080", help="Độ phân giải nguồn, cách nhau bởi dấu phẩy")
+    parser.add_argument("--durations", default="10", help="Độ dài video (giây), cách nhau bởi dấu phẩy")
+    parser.add_argument("--runs", type=int, default=3, help="Số lần chạy mỗi case (lấy trung vị)")
+    parser.add_argument("--stages", default=','.join(STAGES), help="Các stage cần đo")
+    parser.add_argument("--workers", default="1,2,4", help="Số worker cho benchmark pipeline")
+    parser.add_argument("--pipeline-videos", type=int, default=4, help="Số video mỗi lần chạy pipeline")
+    parser.add_argument("--no-pipeline", action="store_true", help="Bỏ qua benchmark pipeline")
+    parser.add_argument("--profile", default="draft", help="Profile encode cuối")
+    parser.add_argument("--whisper-model", default="tiny", help="Model Whisper cho stage stt")
+    parser.add_argument("--translate-latency", type=float, default=0.02, help="Độ trễ mỗi request dịch giả lập (giây)")
+    parser.add_argument("--media-dir", default=os.path.join(BENCH_DIR, ".media"), help="Thư mục cache media tổng hợp")
+    parser.add_argument("--output", help="File JSON kết quả (mặc định benchmarks/results/<commit>_<thời gian>.json)")
+    args = parser.parse_args()
+
+    args.sizes = args.sizes.split(',')
+    args.durations = [int(d) for d in args.durations.split(',')]
+    args.stages = set(args.stages.split(','))
+    args.workers = [int(w) for w in args.workers.split(',')]
+
+    env = environment_info(args.ffmpeg)
+    work_dir = tempfile.mkdtemp(prefix="editvideo_bench_")
+    try:
+        results = bench_stages(args, args.media_dir, work_dir)
+        if not args.no_pipeline:
+            results.update(bench_pipeline(args, args.media_dir, work_dir))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    output_path = args.output or os.path.join(
+        BENCH_DIR, 'results', f"{env['commit'] or 'nocommit'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    report = {
+        'environment': env,
+        'params': {
+            'sizes': args.sizes, 'durations': args.durations, 'runs': args.runs,
+            'workers': args.workers, 'pipeline_videos': args.pipeline_videos,
+            'profile': args.profile, 'whisper_model': args.whisper_model,
+            'translate_latency': args.translate_latency
+        },
+        'results': results
+    }
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"📄 Kết quả benchmark: {output_path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
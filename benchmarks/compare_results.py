@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+So sánh hai file kết quả của bench_stages.py (trước / sau một thay đổi)
+
+    python benchmarks/compare_results.py benchmarks/results/old.json benchmarks/results/new.json --threshold 10
+
+Trả về mã thoát 1 nếu có case chậm hơn ngưỡng (%), dùng được trong CI.
+"""
+
+import sys
+import json
+import argparse
+
+def load(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh kết quả benchmark")
+    parser.add_argument("baseline", help="JSON kết quả cũ")
+    parser.add_argument("candidate", help="JSON kết quả mới")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Ngưỡng chậm đi (%%) bị coi là regression")
+    args = parser.parse_args()
+
+    baseline = load(args.baseline)
+    candidate = load(args.candidate)
+    print(f"📊 {baseline['environment'].get('commit')} → {candidate['environment'].get('commit')}")
+    if baseline['environment'].get('ffmpeg') != candidate['environment'].get('ffmpeg'):
+        print("⚠️ Khác phiên bản FFmpeg giữa hai lần chạy")
+
+    regressions = []
+    for name in sorted(set(baseline['results']) | set(candidate['results'])):
+        old = baseline['results'].get(name, {}).get('median')
+        new = candidate['results'].get(name, {}).get('median')
+        if old is None or new is None:
+            print(f"   {name:>36}: {old if old is not None else '-'} → {new if new is not None else '-'}")
+            continue
+
+        change = (new - old) / old * 100 if old else 0.0
+        marker = '🔴' if change > args.threshold else ('🟢' if change < -args.threshold else '  ')
+        print(f"{marker} {name:>36}: {old:8.2f}s → {new:8.2f}s ({change:+.1f}%)")
+        if change > args.threshold:
+            regressions.append(name)
+
+    if regressions:
+        print(f"❌ {len(regressions)} case chậm hơn {args.threshold}%")
+        return 1
+    print("✅ Không có regression")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
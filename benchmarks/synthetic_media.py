@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tạo media tổng hợp cố định (deterministic) cho benchmark, không cần file mẫu
+
+- Video testsrc2 + audio sine ở nhiều độ phân giải / độ dài
+- Clip overlay nền xanh lá / đen (color + drawbox) để thử chroma key
+- Audio "giả giọng nói" (không TTS): chuỗi âm tiết sine điều biên có
+  khoảng lặng, để đo chi phí STT trên mỗi giây audio
+- File SRT cố định cho stage burn phụ đề / pipeline
+
+Mọi file được cache theo tham số trong thư mục media, tạo lại chỉ khi thiếu.
+Encode với cờ bitexact, một luồng, không metadata để byte giống nhau giữa các lần chạy.
+"""
+
+import os
+import subprocess
+
+BITEXACT_ARGS = [
+    '-fflags', '+bitexact',
+    '-flags:v', '+bitexact',
+    '-flags:a', '+bitexact',
+    '-map_metadata', '-1',
+    '-threads', '1'
+]
+
+VIDEO_CODEC_ARGS = ['-c:v', 'libx264', '-preset', 'ultrafast', '-g', '60', '-pix_fmt', 'yuv420p']
+
+# Âm tiết ~4 Hz, cao độ dao động quanh 180 Hz, nghỉ 0.6s sau mỗi 2.4s "nói"
+SPEECH_EXPR = (
+    "0.4*sin(2*PI*(180+40*sin(2*PI*0.7*t))*t)"
+    "*gt(sin(2*PI*4*t),0)"
+    "*lt(mod(t,3),2.4)"
+)
+
+def _run(cmd):
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"Lỗi tạo media benchmark: {result.stderr}")
+
+def _cached(media_dir, name):
+    os.makedirs(media_dir, exist_ok=True)
+    path = os.path.join(media_dir, name)
+    return path, os.path.exists(path)
+
+def make_test_video(media_dir, size='1920x1080', duration=10, rate=30, speech=False, ffmpeg_path='ffmpeg'):
+    """
+    Video testsrc2 kèm audio (sine 440 Hz, hoặc giả giọng nói nếu speech=True)
+
+    Returns:
+        str: Đường dẫn file .mp4
+    """
+    kind = 'speech' if speech else 'sine'
+    path, exists = _cached(media_dir, f"testsrc2_{size}_{duration}s_{rate}fps_{kind}.mp4")
+    if exists:
+        return path
+
+    audio_source = (f"aevalsrc='{SPEECH_EXPR}':s=16000:d={duration}" if speech
+                    else f"sine=frequency=440:sample_rate=44100:duration={duration}")
+    _run([
+        ffmpeg_path, '-v', 'error', '-y',
+        '-f', 'lavfi', '-i', f"testsrc2=size={size}:rate={rate}:duration={duration}",
+        '-f', 'lavfi', '-i', audio_source,
+        *VIDEO_CODEC_ARGS, '-c:a', 'aac', '-b:a', '128k',
+        '-shortest', *BITEXACT_ARGS,
+        path
+    ])
+    return path
+
+def make_overlay_clip(media_dir, background='green', size='640x640', duration=5, rate=30, ffmpeg_path='ffmpeg'):
+    """
+    Clip overlay nền đồng màu (green / black) với các khối màu ở giữa (drawbox)
+
+    Returns:
+        str: Đường dẫn file .mp4
+    """
+    path, exists = _cached(media_dir, f"overlay_{background}_{size}_{duration}s.mp4")
+    if exists:
+        return path
+
+    width, height = (int(v) for v in size.split('x'))
+    boxes = ','.join([
+        f"drawbox=x={width // 4}:y={height // 4}:w={width // 2}:h={height // 2}:color=white:t=fill",
+        f"drawbox=x={width // 3}:y={height // 3}:w={width // 3}:h={height // 3}:color=red:t=fill",
+        f"drawbox=x={width // 4}:y={height // 4}:w={width // 2}:h={height // 2}:color=blue:t=8",
+    ])
+    color = '0x00FF00' if background == 'green' else 'black'
+    _run([
+        ffmpeg_path, '-v', 'error', '-y',
+        '-f', 'lavfi', '-i', f"color=c={color}:s={size}:r={rate}:d={duration}",
+        '-vf', boxes,
+        *VIDEO_CODEC_ARGS, *BITEXACT_ARGS,
+        path
+    ])
+    return path
+
+def make_speech_audio(media_dir, duration=30, ffmpeg_path='ffmpeg'):
+    """
+    Audio WAV 16 kHz mono giả giọng nói (không TTS), cho stage STT
+
+    Returns:
+        str: Đường dẫn file .wav
+    """
+    path, exists = _cached(media_dir, f"speech_standin_{duration}s.wav")
+    if exists:
+        return path
+
+    _run([
+        ffmpeg_path, '-v', 'error', '-y',
+        '-f', 'lavfi', '-i', f"aevalsrc='{SPEECH_EXPR}':s=16000:d={duration}",
+        '-ac', '1', '-c:a', 'pcm_s16le', *BITEXACT_ARGS,
+        path
+    ])
+    return path
+
+def make_subtitle(media_dir, duration=10, line_seconds=2.0, words_per_line=6):
+    """
+    File SRT cố định: mỗi line_seconds một câu
+
+    Returns:
+        str: Đường dẫn file .srt
+    """
+    path, exists = _cached(media_dir, f"subtitle_{duration}s_{line_seconds}.srt")
+    if exists:
+        return path
+
+    def srt_time(seconds):
+        millis = int(round(seconds * 1000))
+        return f"{millis // 3600000:02d}:{millis // 60000 % 60:02d}:{millis // 1000 % 60:02d},{millis % 1000:03d}"
+
+    words = "xin chào đây là câu phụ đề thử nghiệm số".split()
+    entries = []
+    start = 0.0
+    index = 1
+    while start < duration:
+        end = min(start + line_seconds, duration)
+        text = ' '.join(words[(index + i) % len(words)] for i in range(words_per_line))
+        entries.append(f"{index}\n{srt_time(start)} --> {srt_time(end)}\n{text} {index}\n")
+        start = end
+        index += 1
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(entries))
+    return path
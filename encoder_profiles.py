@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Module profile encoder: tách encode trung gian (nhanh) và encode cuối (chất lượng)
+
+- intermediate: file trung gian (video_9_16.mp4, temp_overlay_*.mp4, ...) sẽ bị
+  encode lại ở stage sau, nên chỉ cần nhanh và đủ tốt
+- intermediate_lossless: lossless (x264 qp 0) cho ổ đĩa nhanh, không mất chất
+  lượng qua nhiều stage nhưng file lớn
+- draft / balanced / archive: encode cuối cho QA, phát hành, lưu trữ
+"""
+
+ENCODER_PROFILES = {
+    "intermediate": {
+        "description": "Trung gian nhanh (ultrafast, CRF thấp để không mất chất lượng)",
+        "codec": "libx264",
+        "preset": "ultrafast",
+        "crf": 16,
+        "pix_fmt": "yuv420p"
+    },
+    "intermediate_lossless": {
+        "description": "Trung gian lossless (file lớn, dùng khi ổ đĩa nhanh)",
+        "codec": "libx264",
+        "preset": "ultrafast",
+        "qp": 0,
+        "pix_fmt": "yuv420p"
+    },
+    "draft": {
+        "description": "Bản nháp QA, encode nhanh nhiều lần",
+        "codec": "libx264",
+        "preset": "veryfast",
+        "crf": 28,
+        "pix_fmt": "yuv420p"
+    },
+    "balanced": {
+        "description": "Mặc định, tương đương mặc định libx264 (medium, CRF 23)",
+        "codec": "libx264",
+        "preset": "medium",
+        "crf": 23,
+        "pix_fmt": "yuv420p",
+        "faststart": True
+    },
+    "archive": {
+        "description": "Lưu trữ chất lượng cao",
+        "codec": "libx264",
+        "preset": "slow",
+        "crf": 18,
+        "pix_fmt": "yuv420p",
+        "faststart": True
+    }
+}
+
+DEFAULT_PROFILE = "balanced"
+INTERMEDIATE_PROFILE = "intermediate"
+FINAL_PROFILES = ("draft", "balanced", "archive")
+
+def get_encoder_profile(profile=None):
+    """
+    Lấy cấu hình profile theo tên (hoặc dict tùy chỉnh)
+
+    Args:
+        profile (str | dict | None): Tên profile, dict cấu hình, None = DEFAULT_PROFILE
+
+    Returns:
+        dict: Cấu hình profile
+    """
+    if profile is None:
+        profile = DEFAULT_PROFILE
+    if isinstance(profile, dict):
+        return profile
+    if profile not in ENCODER_PROFILES:
+        raise Exception(f"Profile encoder không hợp lệ: {profile} (có: {', '.join(ENCODER_PROFILES)})")
+    return ENCODER_PROFILES[profile]
+
+def encoder_args(profile=None):
+    """
+    Tham số FFmpeg cho video stream theo profile
+
+    Returns:
+        list: ['-c:v', ..., '-preset', ..., '-crf', ..., '-pix_fmt', ...]
+    """
+    config = get_encoder_profile(profile)
+
+    args = ['-c:v', config.get('codec', 'libx264')]
+    if 'preset' in config:
+        args.extend(['-preset', config['preset']])
+    if 'qp' in config:
+        args.extend(['-qp', str(config['qp'])])
+    elif 'crf' in config:
+        args.extend(['-crf', str(config['crf'])])
+    if 'pix_fmt' in config:
+        args.extend(['-pix_fmt', config['pix_fmt']])
+    if config.get('threads'):
+        args.extend(['-threads', str(config['threads'])])
+    if config.get('faststart'):
+        args.extend(['-movflags', '+faststart'])
+    return args
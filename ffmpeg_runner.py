@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Module chạy FFmpeg dùng chung, có tiến độ trực tiếp
+
+run_ffmpeg thêm `-progress pipe:1 -nostats` vào lệnh, đọc out_time / fps /
+speed ngay khi FFmpeg ghi ra và phát sự kiện tiến độ tới các listener
+(GUI, batch monitor). Ngữ cảnh (video nào, stage nào) gắn theo thread bằng
+progress_context nên các hàm encode không cần biết ai đang theo dõi.
+
+Sự kiện:
+    {'stage': 'aspect', 'fraction': 0.42, 'out_time': 12.6, 'fps': 87.0,
+     'speed': 3.1, 'eta': 17.4, 'done': False, ...các field ngữ cảnh}
+
+Bộ nhớ dùng cho mỗi lệnh có giới hạn: mặc định chạy với `-loglevel error`,
+stderr được đọc dạng bytes vào ring buffer và chỉ giữ STDERR_TAIL_BYTES cuối
+(đủ cho thông báo lỗi), chỉ decode phần đó khi lệnh kết thúc.
+
+run_streaming dùng cho lệnh ghi dữ liệu ra stdout (frame raw để phân tích,
+danh sách packet của ffprobe): đọc dần từng bản ghi thay vì giữ cả output,
+vẫn đăng ký với job (hủy / tạm dừng) và được ghi vào instrumentation.
+
+Độ dài để tính % lấy từ cache theo file (path, size, mtime): input đã probe
+được ghi bằng remember_duration, output của mỗi lệnh thành công được ghi từ
+out_time cuối, nên stage sau không phải chạy ffprobe lại. Chỉ khi cache không
+có mới probe, bằng ffprobe cạnh binary ffmpeg của lệnh, qua run_streaming.
+"""
+
+import io
+import os
+import time
+import threading
+import subprocess
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from job_control import popen, release, current_token, terminate_process, JobCancelled
+
+DEFAULT_LOGLEVEL = 'error'
+STDERR_TAIL_BYTES = 64 * 1024
+DURATION_CACHE_SIZE = 256
+
+_listeners = []
+_listeners_lock = threading.Lock()
+_context = threading.local()
+_durations = OrderedDict()  # (realpath, size, mtime_ns) -> giây
+_durations_lock = threading.Lock()
+
+def add_progress_listener(callback):
+    """Đăng ký hàm nhận sự kiện tiến độ (gọi từ thread đang chạy FFmpeg)"""
+    with _listeners_lock:
+        if callback not in _listeners:
+            _listeners.append(callback)
+
+def remove_progress_listener(callback):
+    """Hủy đăng ký listener"""
+    with _listeners_lock:
+        if callback in _listeners:
+            _listeners.remove(callback)
+
+def current_context():
+    """Ngữ cảnh tiến độ của thread hiện tại (copy)"""
+    return dict(getattr(_context, 'fields', {}))
+
+@contextmanager
+def progress_context(**fields):
+    """
+    Gắn thêm field vào mọi sự kiện tiến độ phát ra trong khối with (cùng thread)
+
+        with progress_context(task_id=task.task_id):
+            with progress_context(stage='aspect', stage_index=0, stage_count=3):
+                converter.convert_to_9_16(...)
+    """
+    previous = getattr(_context, 'fields', {})
+    _context.fields = {**previous, **fields}
+    try:
+        yield
+    finally:
+        _context.fields = previous
+
+def publish_progress(event):
+    """Phát sự kiện tới các listener, kèm ngữ cảnh của thread hiện tại"""
+    event = {**current_context(), **event}
+    with _listeners_lock:
+        listeners = list(_listeners)
+    for callback in listeners:
+        try:
+            callback(event)
+        except Exception as e:
+            print(f"⚠️ Progress listener lỗi: {e}")
+
+def ffprobe_for(ffmpeg_path):
+    """ffprobe cùng thư mục với binary ffmpeg (vd C:\\ffmpeg\\bin), không có thì lấy trên PATH"""
+    directory, name = os.path.split(ffmpeg_path)
+    if directory:
+        candidate = os.path.join(directory, 'ffprobe' + os.path.splitext(name)[1])
+        if os.path.exists(candidate):
+            return candidate
+    return 'ffprobe'
+
+def _duration_key(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return os.path.realpath(path), stat.st_size, stat.st_mtime_ns
+
+def remember_duration(path, seconds):
+    """Ghi độ dài đã biết của file (vd từ probe_video) để run_ffmpeg không probe lại"""
+    key = _duration_key(path)
+    if key is None or not seconds:
+        return
+    with _durations_lock:
+        _durations[key] = float(seconds)
+        _durations.move_to_end(key)
+        while len(_durations) > DURATION_CACHE_SIZE:
+            _durations.popitem(last=False)
+
+def _cached_duration(path):
+    key = _duration_key(path)
+    with _durations_lock:
+        return _durations.get(key) if key else None
+
+def probe_duration(video_path, ffprobe_path='ffprobe'):
+    """Độ dài media (giây), None nếu không đọc được (file đã biết độ dài thì không chạy ffprobe)"""
+    duration = _cached_duration(video_path)
+    if duration:
+        return duration
+
+    lines = []
+    cmd = [ffprobe_path, '-v', 'quiet', '-show_entries', 'format=duration', '-of', 'csv=p=0', video_path]
+    try:
+        result = run_streaming(cmd, lines.append, stage='probe')
+        if result.returncode == 0 and ''.join(lines).strip():
+            duration = float(''.join(lines).strip())
+    except (OSError, ValueError):
+        return None
+    remember_duration(video_path, duration)
+    return duration
+
+def _expected_duration(cmd):
+    """Ước lượng độ dài output từ lệnh: độ dài input đầu tiên, giới hạn bởi -t output"""
+    if '-i' not in cmd:
+        return None
+    first_input = cmd.index('-i')
+    input_path = cmd[first_input + 1]
+    # Nguồn lavfi, pipe... không probe được
+    duration = probe_duration(input_path, ffprobe_for(cmd[0])) if os.path.isfile(input_path) else None
+
+    # -t sau input cuối cùng là option của output
+    last_input = len(cmd) - 1 - cmd[::-1].index('-i')
+    for i in range(last_input + 2, len(cmd) - 1):
+        if cmd[i] == '-t':
+            try:
+                limit = float(cmd[i + 1])
+            except ValueError:
+                break
+            duration = min(duration, limit) if duration else limit
+            break
+    return duration
+
+def _parse_speed(value):
+    try:
+        return float(value.rstrip('x'))
+    except ValueError:
+        return None
+
+class _TailBuffer:
+    """Ring buffer giữ `limit` byte cuối cùng của một stream"""
+
+    def __init__(self, limit=STDERR_TAIL_BYTES):
+        self.limit = limit
+        self.chunks = deque()
+        self.size = 0
+        self.truncated = False
+
+    def feed(self, data):
+        self.chunks.append(data)
+        self.size += len(data)
+        while self.size - len(self.chunks[0]) >= self.limit:
+            self.size -= len(self.chunks.popleft())
+            self.truncated = True
+
+    def text(self):
+        data = b''.join(self.chunks)
+        if len(data) > self.limit:
+            data = data[-self.limit:]
+            self.truncated = True
+        if self.truncated:
+            # Bỏ dòng đầu bị cắt dở
+            data = data[data.find(b'\n') + 1:]
+        return data.decode('utf-8', errors='replace')
+
+@dataclass
+class FFmpegResult:
+    """Kết quả run_ffmpeg (cùng tên field returncode/stderr với CompletedProcess)"""
+    args: list
+    returncode: int
+    stderr: str            # Phần cuối stderr (tối đa STDERR_TAIL_BYTES)
+    elapsed: float         # Thời gian chạy (giây)
+    stderr_truncated: bool = False
+    stdout: str = ''       # stdout dùng cho tiến độ, không giữ lại
+
+def _wait_with_usage(process):
+    """
+    Chờ tiến trình kết thúc, lấy kèm rusage (CPU, peak RSS, I/O) bằng os.wait4
+
+    Returns:
+        tuple: (returncode, rusage | None)
+    """
+    if not hasattr(os, 'wait4'):
+        return process.wait(), None
+    try:
+        _, status, usage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        # Đã được reap ở nơi khác (vd poll() lúc hủy job)
+        return process.wait(), None
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, usage
+
+def _has_loglevel(cmd):
+    return any(arg in ('-loglevel', '-v') for arg in cmd)
+
+def run_ffmpeg(cmd, duration=None, stage=None, loglevel=DEFAULT_LOGLEVEL, tail_bytes=STDERR_TAIL_BYTES):
+    """
+    Chạy lệnh FFmpeg và phát tiến độ trực tiếp
+
+    Args:
+        cmd (list): Lệnh FFmpeg đầy đủ (phần tử đầu là đường dẫn ffmpeg)
+        duration (float, optional): Độ dài output (giây) để tính %, None = độ dài input đầu
+            (từ cache hoặc ffprobe)
+        stage (str, optional): Tên stage, None = lấy từ progress_context
+        loglevel (str, optional): Mức log FFmpeg, None = giữ mặc định của FFmpeg
+            (bỏ qua nếu lệnh đã có -loglevel / -v)
+        tail_bytes (int): Số byte stderr cuối cùng được giữ lại
+
+    Returns:
+        FFmpegResult: returncode, stderr (phần cuối), elapsed
+
+    Raises:
+        JobCancelled: Job hiện tại bị hủy (tiến trình đã bị dừng)
+    """
+    if duration is None:
+        duration = _expected_duration(cmd)
+    stage = stage or current_context().get('stage', 'ffmpeg')
+
+    global_args = ['-progress', 'pipe:1', '-nostats']
+    if loglevel and not _has_loglevel(cmd):
+        global_args = ['-loglevel', loglevel, *global_args]
+    full_cmd = [cmd[0], *global_args, *cmd[1:]]
+
+    start = time.perf_counter()
+    process = popen(
+        full_cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+
+    # Đọc stderr song song (bytes, giới hạn dung lượng) để FFmpeg không bị chặn khi pipe đầy
+    stderr_tail = _TailBuffer(tail_bytes)
+
+    def drain_stderr():
+        for chunk in iter(lambda: process.stderr.read1(8192), b''):
+            stderr_tail.feed(chunk)
+
+    stderr_thread = threading.Thread(target=drain_stderr, daemon=True)
+    stderr_thread.start()
+
+    values = {}
+    out_time = None
+    for line in io.TextIOWrapper(process.stdout, encoding='utf-8', errors='replace'):
+        key, _, value = line.strip().partition('=')
+        if not key:
+            continue
+        if key != 'progress':
+            values[key] = value
+            continue
+
+        # Hết một block tiến độ
+        out_time_us = values.get('out_time_us', values.get('out_time_ms'))
+        if out_time_us not in (None, '', 'N/A'):
+            out_time = max(int(out_time_us) / 1_000_000, 0)
+        speed = _parse_speed(values.get('speed', ''))
+        try:
+            fps = float(values.get('fps', 0))
+        except ValueError:
+            fps = None
+
+        fraction = None
+        eta = None
+        if duration and out_time is not None:
+            fraction = min(out_time / duration, 1.0)
+            if speed:
+                eta = max(duration - out_time, 0) / speed
+
+        publish_progress({
+            'stage': stage,
+            'fraction': 1.0 if value == 'end' else fraction,
+            'out_time': out_time,
+            'fps': fps,
+            'speed': speed,
+            'eta': 0 if value == 'end' else eta,
+            'done': value == 'end'
+        })
+        values = {}
+
+    returncode, usage = _wait_with_usage(process)
+    end = time.perf_counter()
+    stderr_thread.join()
+    release(process)
+
+    from instrumentation import record_subprocess
+    record_subprocess(
+        'ffmpeg', start, end, usage,
+        stage=stage,
+        output=cmd[-1],
+        returncode=returncode,
+        media_seconds=out_time,
+        # Tốc độ encode trung bình: giây media / giây thực
+        avg_speed=round(out_time / (end - start), 3) if out_time and end > start else None
+    )
+
+    # FFmpeg bị dừng do job bị hủy: không coi là lỗi encode
+    token = current_token()
+    if token and token.cancelled:
+        raise JobCancelled(f"Đã hủy: {stage}")
+
+    # Stage sau đọc file này: độ dài đã biết từ tiến độ, không cần probe lại
+    if returncode == 0 and out_time and os.path.isfile(cmd[-1]):
+        remember_duration(cmd[-1], out_time)
+
+    stderr = stderr_tail.text()
+    return FFmpegResult(
+        args=full_cmd,
+        returncode=returncode,
+        stderr=stderr,
+        elapsed=end - start,
+        stderr_truncated=stderr_tail.truncated
+    )
+
+def run_streaming(cmd, on_record, record_size=None, stage=None, tail_bytes=STDERR_TAIL_BYTES):
+    """
+    Chạy lệnh (FFmpeg / ffprobe) và xử lý stdout theo từng bản ghi khi đọc được
+
+    Args:
+        cmd (list): Lệnh đầy đủ, output ghi ra stdout
+        on_record (callable): Gọi với mỗi bản ghi
+        record_size (int, optional): Bản ghi bytes cố định (vd một frame raw),
+            None = từng dòng text
+        stage (str, optional): Tên stage, None = lấy từ progress_context
+
+    Returns:
+        FFmpegResult: returncode, stderr (phần cuối), elapsed (stdout không giữ lại)
+
+    Raises:
+        JobCancelled: Job hiện tại bị hủy (tiến trình đã bị dừng)
+    """
+    stage = stage or current_context().get('stage', 'ffmpeg')
+    token = current_token()
+
+    start = time.perf_counter()
+    process = popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    stderr_tail = _TailBuffer(tail_bytes)
+
+    def drain_stderr():
+        for chunk in iter(lambda: process.stderr.read1(8192), b''):
+            stderr_tail.feed(chunk)
+
+    stderr_thread = threading.Thread(target=drain_stderr, daemon=True)
+    stderr_thread.start()
+
+    try:
+        if record_size:
+            records = iter(lambda: process.stdout.read(record_size), b'')
+        else:
+            records = io.TextIOWrapper(process.stdout, encoding='utf-8', errors='replace')
+        for record in records:
+            if token:
+                token.check()
+            if record_size and len(record) < record_size:
+                break  # Bản ghi cuối bị cắt dở
+            on_record(record)
+    except BaseException:
+        terminate_process(process)
+        raise
+    finally:
+        returncode, usage = _wait_with_usage(process)
+        end = time.perf_counter()
+        stderr_thread.join()
+        release(process)
+
+        from instrumentation import record_subprocess
+        record_subprocess(
+            os.path.splitext(os.path.basename(cmd[0]))[0], start, end, usage,
+            stage=stage,
+            output='pipe:1',
+            returncode=returncode
+        )
+
+    if token and token.cancelled:
+        raise JobCancelled(f"Đã hủy: {stage}")
+
+    return FFmpegResult(
+        args=list(cmd),
+        returncode=returncode,
+        stderr=stderr_tail.text(),
+        elapsed=end - start,
+        stderr_truncated=stderr_tail.truncated
+    )
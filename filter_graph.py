@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Module filter graph cho FFmpeg
+
+Thay vì nối chuỗi filter_complex bằng f-string và tự quản lý label
+(tmp{i}, scaled{i}, sub...), các module dựng graph qua FilterGraph:
+input -> node filter -> stream. Label, split và chuỗi filter được sinh
+tự động khi serialize, sau khi chạy các pass tối ưu:
+
+- drop_noop_filters: bỏ filter không tác dụng (scale 100%, fade 0s, null)
+- merge_scales: gộp các scale liên tiếp thành một lần scale
+- dedupe_inputs: cùng một file input chỉ mở một lần (-i), dùng split
+- order_overlays: sắp các overlay không chồng thời gian theo thứ tự xuất hiện
+
+compile()/compile_simple() chạy pass trên bản sao: graph gốc không đổi,
+compile nhiều lần luôn cho cùng kết quả.
+"""
+
+import copy
+
+
+class Stream:
+    """Tham chiếu tới một pad: stream của input file hoặc output của một node"""
+
+    __slots__ = ('node', 'index', 'input_index', 'kind')
+
+    def __init__(self, node=None, index=0, input_index=None, kind='v'):
+        self.node = node
+        self.index = index
+        self.input_index = input_index
+        self.kind = kind
+
+    @property
+    def key(self):
+        if self.node is None:
+            return ('input', self.input_index, self.kind)
+        return ('node', id(self.node), self.index)
+
+    def __repr__(self):
+        if self.node is None:
+            return f"Stream({self.input_index}:{self.kind})"
+        return f"Stream({self.node.name}#{self.index})"
+
+
+class InputFile:
+    """Một file input kèm các tham số đặt trước -i (-ss, -t, -loop...)"""
+
+    def __init__(self, path, options=None):
+        self.path = path
+        self.options = list(options or [])
+
+    @property
+    def key(self):
+        return (self.path, tuple(self.options))
+
+    def args(self):
+        return [*self.options, '-i', self.path]
+
+
+class FilterNode:
+    """Một filter trong graph"""
+
+    def __init__(self, name, inputs, args=(), kwargs=None, num_outputs=1, instance=None, meta=None):
+        self.name = name
+        self.inputs = list(inputs)
+        self.args = list(args)
+        self.kwargs = dict(kwargs or {})
+        self.num_outputs = num_outputs
+        self.instance = instance  # Tên instance (overlay@name) để sendcmd/zmq gửi lệnh
+        self.meta = dict(meta or {})  # Thông tin kiểu cho các pass tối ưu
+
+    def output(self, index=0):
+        return Stream(node=self, index=index, kind=self.meta.get('kind', 'v'))
+
+    def render(self):
+        """Chuỗi filter dạng name@instance=a:b:key=value"""
+        name = f"{self.name}@{self.instance}" if self.instance else self.name
+        parts = [str(arg) for arg in self.args] + [f"{key}={value}" for key, value in self.kwargs.items()]
+        return f"{name}={':'.join(parts)}" if parts else name
+
+
+def escape_filter_path(path):
+    """Escape đường dẫn file dùng trong tham số filter (subtitles, sendcmd...)"""
+    return path.replace('\\', '/').replace(':', '\\:')
+
+
+class FilterGraph:
+    """Filter graph FFmpeg dựng theo node"""
+
+    def __init__(self):
+        self.inputs = []
+        self.nodes = []
+        self.outputs = []  # [(stream, label)]
+
+    # ===== Dựng graph =====
+
+    def input(self, path, options=None, kind='v'):
+        """Thêm file input, trả về stream video (hoặc audio nếu kind='a')"""
+        self.inputs.append(InputFile(path, options))
+        return Stream(input_index=len(self.inputs) - 1, kind=kind)
+
+    def filter(self, inputs, name, *args, outputs=1, instance=None, meta=None, **kwargs):
+        """
+        Thêm filter tổng quát
+
+        Args:
+            inputs (Stream | list): Stream đầu vào
+            name (str): Tên filter FFmpeg
+            *args: Tham số theo vị trí (nối bằng ':')
+            outputs (int): Số pad đầu ra
+            instance (str): Tên instance (name@instance)
+            meta (dict): Thông tin cho pass tối ưu
+            **kwargs: Tham số key=value
+
+        Returns:
+            Stream | list: Stream đầu ra
+        """
+        if isinstance(inputs, Stream):
+            inputs = [inputs]
+        meta = dict(meta or {})
+        meta.setdefault('kind', inputs[0].kind if inputs else 'v')
+
+        node = FilterNode(name, inputs, args, kwargs, outputs, instance, meta)
+        self.nodes.append(node)
+        if outputs == 1:
+            return node.output(0)
+        return [node.output(i) for i in range(outputs)]
+
+    def scale_by(self, stream, factor, **kwargs):
+        """Scale theo tỉ lệ so với kích thước hiện tại"""
+        meta = {'scale_factor': factor} if not kwargs else None
+        return self.filter(stream, 'scale', f"iw*{factor}", f"ih*{factor}", meta=meta, **kwargs)
+
+    def scale(self, stream, width, height, **kwargs):
+        """Scale về kích thước cụ thể (width/height có thể là biểu thức)"""
+        meta = {'scale_size': (width, height)} if not kwargs else None
+        return self.filter(stream, 'scale', width, height, meta=meta, **kwargs)
+
+    def shift_pts(self, stream, start_time):
+        """Dời timeline của stream để bắt đầu tại start_time (giây)"""
+        return self.filter(stream, 'setpts', f"PTS-STARTPTS+{start_time}/TB")
+
+    def fade(self, stream, direction, start_time, duration, alpha=True):
+        """Fade in/out (alpha=True: fade kênh alpha cho overlay)"""
+        kwargs = {'t': direction, 'st': start_time, 'd': duration}
+        if alpha:
+            kwargs['alpha'] = 1
+        return self.filter(stream, 'fade', meta={'fade_duration': duration}, **kwargs)
+
+    def overlay(self, base, top, x, y, start=None, end=None, instance=None, eof_action='pass', **kwargs):
+        """
+        Overlay top lên base
+
+        Args:
+            start, end (float): Cửa sổ hiển thị (None = luôn hiển thị, end None = đến hết video)
+            instance (str): Tên instance để sendcmd điều khiển x/y
+        """
+        meta = {}
+        if eof_action:
+            kwargs['eof_action'] = eof_action
+        if start is not None and end is not None:
+            kwargs['enable'] = f"'between(t,{start},{end})'"
+            meta['window'] = (start, end)
+        elif start is not None:
+            kwargs['enable'] = f"'gte(t,{start})'"
+            meta['window'] = (start, float('inf'))
+        return self.filter([base, top], 'overlay', x, y, instance=instance, meta=meta, **kwargs)
+
+    def subtitles(self, stream, subtitle_path, force_style=None, fonts_dir=None):
+        """Burn phụ đề vào stream (fonts_dir: thư mục font tùy chỉnh)"""
+        kwargs = {}
+        if fonts_dir:
+            kwargs['fontsdir'] = f"'{fonts_dir}'"
+        if force_style:
+            kwargs['force_style'] = f"'{force_style}'"
+        return self.filter(stream, 'subtitles', f"'{escape_filter_path(subtitle_path)}'", **kwargs)
+
+    def output(self, stream, label=None):
+        """Đánh dấu stream là đầu ra của graph (label dùng cho -map)"""
+        self.outputs.append((stream, label))
+        return stream
+
+    # ===== Tối ưu =====
+
+    def optimize(self, passes=None):
+        """Chạy các pass tối ưu (mặc định: OPTIMIZATION_PASSES)"""
+        for optimization_pass in (passes if passes is not None else OPTIMIZATION_PASSES):
+            optimization_pass(self)
+        return self
+
+    def consumers(self, stream):
+        """Các node dùng stream làm đầu vào"""
+        key = stream.key
+        return [node for node in self.nodes if any(s.key == key for s in node.inputs)]
+
+    def use_count(self, stream):
+        """Số lần stream được dùng (node đầu vào + đầu ra của graph)"""
+        key = stream.key
+        count = sum(1 for node in self.nodes for s in node.inputs if s.key == key)
+        return count + sum(1 for s, _ in self.outputs if s.key == key)
+
+    def replace_stream(self, old, new):
+        """Nối lại mọi chỗ đang dùng stream old sang stream new"""
+        key = old.key
+        for node in self.nodes:
+            node.inputs = [new if s.key == key else s for s in node.inputs]
+        self.outputs = [(new if s.key == key else s, label) for s, label in self.outputs]
+
+    def remove_node(self, node):
+        self.nodes = [n for n in self.nodes if n is not node]
+
+    # ===== Serialize =====
+
+    def compile(self, optimize=True):
+        """
+        Serialize graph
+
+        Returns:
+            tuple: (input_args, filter_complex, output_labels)
+                   output_labels rỗng khi graph chỉ có một đầu ra không đặt label
+                   (FFmpeg tự map như khi dùng filter_complex thủ công)
+        """
+        graph = self._working_copy(optimize)
+
+        # Đầu ra trỏ thẳng vào input (mọi filter bị tối ưu bỏ) vẫn cần một filter
+        graph.outputs = [
+            (graph.filter(stream, 'null' if stream.kind == 'v' else 'anull') if stream.node is None else stream, label)
+            for stream, label in graph.outputs
+        ]
+
+        graph._insert_splits()
+        ordered = graph._topological_order()
+
+        single_unlabeled = len(graph.outputs) == 1 and graph.outputs[0][1] is None
+        labels = {}
+        output_labels = []
+        for i, (stream, label) in enumerate(graph.outputs):
+            if single_unlabeled:
+                labels[stream.key] = None
+            else:
+                labels[stream.key] = label or f"out{i}"
+                output_labels.append(f"[{labels[stream.key]}]")
+
+        # Gộp các node nối tiếp 1-1 thành một chuỗi "a,b,c"
+        chains = []
+        chain_of = {}
+        for node in ordered:
+            previous = node.inputs[0].node if len(node.inputs) == 1 else None
+            if (previous is not None and previous.num_outputs == 1 and id(previous) in chain_of
+                    and chain_of[id(previous)][-1] is previous
+                    and graph.use_count(node.inputs[0]) == 1
+                    and node.inputs[0].key not in labels):
+                chain = chain_of[id(previous)]
+            else:
+                chain = []
+                chains.append(chain)
+            chain.append(node)
+            chain_of[id(node)] = chain
+
+        counter = 0
+        segments = []
+        for chain in chains:
+            head, tail = chain[0], chain[-1]
+            in_labels = []
+            for stream in head.inputs:
+                if stream.node is None:
+                    in_labels.append(f"[{stream.input_index}:{stream.kind}]")
+                else:
+                    if stream.key not in labels:
+                        labels[stream.key] = f"s{counter}"
+                        counter += 1
+                    in_labels.append(f"[{labels[stream.key]}]")
+
+            out_labels = []
+            for index in range(tail.num_outputs):
+                key = tail.output(index).key
+                if key not in labels:
+                    labels[key] = f"s{counter}"
+                    counter += 1
+                if labels[key] is not None:
+                    out_labels.append(f"[{labels[key]}]")
+
+            body = ",".join(node.render() for node in chain)
+            segments.append(f"{''.join(in_labels)}{body}{''.join(out_labels)}")
+
+        input_args = []
+        for input_file in graph.inputs:
+            input_args.extend(input_file.args())
+
+        return input_args, ";".join(segments), output_labels
+
+    def compile_simple(self, optimize=True):
+        """
+        Serialize graph tuyến tính 1 input -> 1 output thành chuỗi cho -vf
+
+        Returns:
+            str: Chuỗi filter (rỗng nếu không còn filter nào)
+        """
+        ordered = self._working_copy(optimize)._topological_order()
+        for node in ordered:
+            if len(node.inputs) != 1 or node.num_outputs != 1:
+                raise Exception(f"Graph không tuyến tính, không thể dùng -vf: {node.name}")
+        return ",".join(node.render() for node in ordered)
+
+    def _working_copy(self, optimize):
+        """Bản sao để compile (pass tối ưu, null, split sửa bản sao, không sửa graph gốc)"""
+        graph = copy.deepcopy(self)
+        if optimize:
+            graph.optimize()
+        return graph
+
+    def _insert_splits(self):
+        """Stream dùng nhiều lần phải qua split/asplit"""
+        for stream in self._all_streams():
+            uses = self.use_count(stream)
+            if uses < 2:
+                continue
+
+            split_name = 'split' if stream.kind == 'v' else 'asplit'
+            split_node = FilterNode(split_name, [stream], [uses], num_outputs=uses, meta={'kind': stream.kind})
+            branches = iter(split_node.output(i) for i in range(uses))
+
+            key = stream.key
+            for node in self.nodes:
+                node.inputs = [next(branches) if s.key == key else s for s in node.inputs]
+            self.outputs = [(next(branches) if s.key == key else s, label) for s, label in self.outputs]
+            self.nodes.append(split_node)
+
+    def _all_streams(self):
+        seen = {}
+        for node in self.nodes:
+            for stream in node.inputs:
+                seen.setdefault(stream.key, stream)
+        for stream, _ in self.outputs:
+            seen.setdefault(stream.key, stream)
+        return list(seen.values())
+
+    def _topological_order(self):
+        """Sắp node theo thứ tự phụ thuộc (giữ thứ tự thêm vào khi có thể)"""
+        ordered = []
+        done = set()
+        pending = list(self.nodes)
+        while pending:
+            progressed = False
+            for node in list(pending):
+                if all(s.node is None or id(s.node) in done for s in node.inputs):
+                    ordered.append(node)
+                    done.add(id(node))
+                    pending.remove(node)
+                    progressed = True
+            if not progressed:
+                raise Exception("Filter graph có vòng lặp hoặc stream không tồn tại")
+        return ordered
+
+
+# ===== Các pass tối ưu =====
+
+def drop_noop_filters(graph):
+    """Bỏ filter không làm gì: null, scale 100%, fade 0 giây"""
+    for node in list(graph.nodes):
+        if len(node.inputs) != 1 or node.num_outputs != 1:
+            continue
+        noop = (
+            node.name in ('null', 'anull') or
+            node.meta.get('scale_factor') in (1, 1.0) or
+            ('fade_duration' in node.meta and float(node.meta['fade_duration']) <= 0)
+        )
+        if noop:
+            graph.replace_stream(node.output(0), node.inputs[0])
+            graph.remove_node(node)
+
+def _is_absolute_size(size):
+    """Kích thước scale không phụ thuộc kích thước đầu vào"""
+    try:
+        return all(int(str(value)) > 0 for value in size)
+    except ValueError:
+        return False
+
+def merge_scales(graph):
+    """Gộp scale liên tiếp: iw*a -> iw*b thành iw*(a*b); scale về kích thước cố định bỏ scale trước đó"""
+    changed = True
+    while changed:
+        changed = False
+        for node in list(graph.nodes):
+            if node.name != 'scale' or len(node.inputs) != 1:
+                continue
+            previous = node.inputs[0].node
+            if (previous is None or previous.name != 'scale' or
+                    graph.use_count(node.inputs[0]) != 1 or
+                    not ({'scale_factor', 'scale_size'} & set(previous.meta))):
+                continue
+
+            if 'scale_factor' in node.meta and 'scale_factor' in previous.meta:
+                factor = round(float(previous.meta['scale_factor']) * float(node.meta['scale_factor']), 6)
+                node.args = [f"iw*{factor}", f"ih*{factor}"]
+                node.meta['scale_factor'] = factor
+            elif not ('scale_size' in node.meta and _is_absolute_size(node.meta['scale_size'])):
+                continue
+
+            node.inputs = list(previous.inputs)
+            graph.remove_node(previous)
+            changed = True
+
+def dedupe_inputs(graph):
+    """Cùng file + cùng tham số input chỉ mở một lần; các nơi dùng sẽ qua split"""
+    first_index = {}
+    remap = {}
+    kept = []
+    for index, input_file in enumerate(graph.inputs):
+        if input_file.key in first_index:
+            remap[index] = first_index[input_file.key]
+        else:
+            first_index[input_file.key] = len(kept)
+            remap[index] = len(kept)
+            kept.append(input_file)
+
+    if len(kept) == len(graph.inputs):
+        return
+
+    def remap_stream(stream):
+        if stream.node is None:
+            return Stream(input_index=remap[stream.input_index], kind=stream.kind)
+        return stream
+
+    for node in graph.nodes:
+        node.inputs = [remap_stream(s) for s in node.inputs]
+    graph.outputs = [(remap_stream(s), label) for s, label in graph.outputs]
+    graph.inputs = kept
+
+def order_overlays(graph):
+    """
+    Sắp chuỗi overlay có cửa sổ thời gian không chồng nhau theo thời điểm bắt đầu.
+    Thứ tự lớp không đổi kết quả (không có hai overlay hiện cùng lúc), graph
+    trở nên chuẩn tắc: cùng một timeline luôn sinh cùng một chuỗi filter.
+    """
+    def is_windowed_overlay(node):
+        return node.name == 'overlay' and 'window' in node.meta
+
+    visited = set()
+    for node in list(graph.nodes):
+        if id(node) in visited or not is_windowed_overlay(node):
+            continue
+        # Chỉ bắt đầu từ đầu chuỗi
+        base_node = node.inputs[0].node
+        if base_node is not None and is_windowed_overlay(base_node) and graph.use_count(node.inputs[0]) == 1:
+            continue
+
+        chain = [node]
+        while True:
+            out = chain[-1].output(0)
+            consumers = graph.consumers(out)
+            if (graph.use_count(out) == 1 and len(consumers) == 1 and
+                    is_windowed_overlay(consumers[0]) and consumers[0].inputs[0].key == out.key):
+                chain.append(consumers[0])
+            else:
+                break
+        visited.update(id(n) for n in chain)
+        if len(chain) < 2:
+            continue
+
+        windows = sorted(n.meta['window'] for n in chain)
+        # between(t,a,b) gồm cả hai đầu: cửa sổ chạm nhau (end == start sau) vẫn hiện cùng lúc tại t đó
+        if any(windows[i][1] >= windows[i + 1][0] for i in range(len(windows) - 1)):
+            continue
+
+        sorted_chain = sorted(chain, key=lambda n: n.meta['window'][0])
+        if sorted_chain == chain:
+            continue
+
+        base = chain[0].inputs[0]
+        last_output = chain[-1].output(0)
+        new_last = sorted_chain[-1].output(0)
+        # Đổi tạm đầu ra cuối để replace_stream không nối vào chính chuỗi
+        for n in chain:
+            n.inputs[0] = None
+        graph.outputs = [(new_last if s.key == last_output.key else s, label) for s, label in graph.outputs]
+        for other in graph.nodes:
+            if other not in chain:
+                other.inputs = [new_last if s.key == last_output.key else s for s in other.inputs]
+
+        previous = base
+        for n in sorted_chain:
+            n.inputs[0] = previous
+            previous = n.output(0)
+
+OPTIMIZATION_PASSES = (drop_noop_filters, merge_scales, dedupe_inputs, order_overlays)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Module cache ảnh overlay đã thu nhỏ sẵn (prescaled) cho FFmpeg
+"""
+
+import os
+import hashlib
+import tempfile
+import threading
+
+try:
+    from PIL import Image
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+
+class ImageAssetCache:
+    """
+    Cache ảnh overlay đã resize về đúng kích thước pixel cuối cùng.
+    Mỗi ảnh chỉ decode + resize một lần bằng Pillow, các job sau dùng lại
+    file PNG nhỏ thay vì scale ảnh gốc trong filter graph của mỗi lần chạy.
+
+    Key cache: (hash nội dung file, kích thước đích)
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), "editvideo_image_cache")
+        self._hash_memo = {}  # (path, mtime, size) -> sha1
+        self._lock = threading.Lock()
+
+    def file_hash(self, image_path):
+        """Tính sha1 nội dung ảnh (có memo theo mtime để không đọc lại file)"""
+        stat = os.stat(image_path)
+        memo_key = (os.path.abspath(image_path), stat.st_mtime, stat.st_size)
+
+        with self._lock:
+            if memo_key in self._hash_memo:
+                return self._hash_memo[memo_key]
+
+        sha1 = hashlib.sha1()
+        with open(image_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha1.update(chunk)
+        digest = sha1.hexdigest()
+
+        with self._lock:
+            self._hash_memo[memo_key] = digest
+        return digest
+
+    def get_target_size(self, image_path, scale):
+        """
+        Tính kích thước pixel sau khi scale (giống scale=iw*s:ih*s của FFmpeg)
+
+        Returns:
+            tuple: (width, height)
+        """
+        with Image.open(image_path) as img:
+            width, height = img.size
+        return max(1, int(width * scale)), max(1, int(height * scale))
+
+    def get_scaled_image(self, image_path, scale):
+        """
+        Lấy đường dẫn ảnh đã được resize sẵn theo tỉ lệ scale
+
+        Args:
+            image_path (str): Đường dẫn ảnh gốc
+            scale (float): Tỉ lệ thu nhỏ so với ảnh gốc (0.2 = 20%)
+
+        Returns:
+            str | None: Đường dẫn ảnh trong cache, None nếu không có Pillow
+        """
+        if not HAS_PIL or not os.path.exists(image_path):
+            return None
+
+        try:
+            target_size = self.get_target_size(image_path, scale)
+            cache_name = f"{self.file_hash(image_path)}_{target_size[0]}x{target_size[1]}.png"
+            cache_path = os.path.join(self.cache_dir, cache_name)
+
+            if os.path.exists(cache_path):
+                return cache_path
+
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with Image.open(image_path) as img:
+                resized = img.convert("RGBA").resize(target_size, Image.LANCZOS)
+
+            # Ghi ra file tạm rồi rename để các worker song song không đọc file dở
+            tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            resized.save(tmp_path, format="PNG")
+            os.replace(tmp_path, cache_path)
+
+            print(f"🗂️ Cache ảnh: {os.path.basename(image_path)} -> {target_size[0]}x{target_size[1]}")
+            return cache_path
+
+        except Exception as e:
+            print(f"⚠️ Không thể cache ảnh {image_path}: {e}")
+            return None
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_image_cache():
+    """Lấy instance cache dùng chung cho toàn bộ process"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ImageAssetCache()
+        return _default_cache
+
+def image_overlay_input(graph, image_path, scale, start_time, duration):
+    """
+    Thêm một ảnh overlay vào filter graph, ưu tiên dùng ảnh đã cache.
+    Ảnh được lặp bằng -loop 1 -t duration (chỉ sinh frame trong cửa sổ hiển thị)
+    rồi dời timeline về thời điểm start_time.
+
+    Args:
+        graph (FilterGraph): Graph cần thêm input
+        image_path (str): Đường dẫn ảnh gốc
+        scale (float): Tỉ lệ thu nhỏ so với ảnh gốc
+        start_time (float): Thời điểm bắt đầu hiển thị (giây)
+        duration (float): Thời lượng hiển thị (giây)
+
+    Returns:
+        Stream: Stream ảnh đã dời thời gian (và scale nếu chưa cache)
+    """
+    cached_path = get_image_cache().get_scaled_image(image_path, scale)
+
+    stream = graph.input(cached_path or image_path, ['-loop', '1', '-t', f'{duration}'])
+    stream = graph.shift_pts(stream, start_time)
+    if not cached_path:
+        # Fallback khi không có Pillow: scale trong filter graph như trước
+        stream = graph.scale_by(stream, scale)
+
+    return stream
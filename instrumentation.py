@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Module đo thời gian và tài nguyên theo stage, xuất Chrome/Perfetto trace
+
+- span(): đo một stage trong process (wall time, CPU của thread, peak RSS)
+- record_subprocess(): ghi một tiến trình con (FFmpeg) với CPU user/sys,
+  peak RSS, I/O đĩa lấy từ os.wait4 và tốc độ encode
+- recorder.export_chrome_trace(path): mở bằng chrome://tracing hoặc
+  https://ui.perfetto.dev, mỗi video là một "process", mỗi worker một "thread"
+
+Sự kiện được gắn các field của progress_context (task_id, video, segment...)
+nên trace của batch chạy song song vẫn tách được theo video. Mỗi sự kiện
+cũng được chuyển cho metrics (histogram stage, tốc độ FFmpeg, Whisper).
+"""
+
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+from ffmpeg_runner import current_context
+from metrics import observe_trace_event
+
+try:
+    import resource
+    HAS_RESOURCE = True
+except ImportError:
+    HAS_RESOURCE = False
+
+def peak_rss_mb():
+    """Peak RSS của process Python hiện tại (MB), None nếu không đo được"""
+    if not HAS_RESOURCE:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux trả KB, macOS trả byte
+    return maxrss / (1024 * 1024) if sys.platform == 'darwin' else maxrss / 1024
+
+def rusage_metrics(usage):
+    """Chuyển rusage của tiến trình con (os.wait4) thành dict số liệu"""
+    maxrss = usage.ru_maxrss / (1024 * 1024) if sys.platform == 'darwin' else usage.ru_maxrss / 1024
+    return {
+        'cpu_user': usage.ru_utime,
+        'cpu_system': usage.ru_stime,
+        'peak_rss_mb': maxrss,
+        # Block I/O thực sự xuống đĩa (đơn vị 512 byte), không tính phần đọc từ page cache
+        'read_bytes': usage.ru_inblock * 512,
+        'write_bytes': usage.ru_oublock * 512
+    }
+
+class TraceRecorder:
+    """Thu thập sự kiện đo đạc (thread-safe)"""
+
+    def __init__(self):
+        self.events = []
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+
+    def add_listener(self, callback):
+        """Gọi callback(event) với mỗi sự kiện mới (vd cập nhật metrics)"""
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def clear(self):
+        with self.lock:
+            self.events = []
+            self.origin = time.perf_counter()
+
+    def record(self, name, category, start, end, **args):
+        """
+        Ghi một sự kiện
+
+        Args:
+            start, end (float): Mốc time.perf_counter()
+            args: Số liệu kèm theo (cpu, rss, speed...)
+        """
+        event = {
+            'name': name,
+            'category': category,
+            'start': start,
+            'end': end,
+            'thread': threading.current_thread().name,
+            'context': current_context(),
+            'args': args
+        }
+        with self.lock:
+            self.events.append(event)
+        for callback in self.listeners:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"⚠️ Trace listener lỗi: {e}")
+
+    def summary(self):
+        """
+        Tổng hợp theo (category, name)
+
+        Returns:
+            dict: {'stage/aspect': {'count', 'wall_seconds', 'cpu_seconds', 'max_peak_rss_mb'}, ...}
+        """
+        with self.lock:
+            events = list(self.events)
+
+        summary = {}
+        for event in events:
+            key = f"{event['category']}/{event['name']}"
+            item = summary.setdefault(key, {
+                'count': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'max_peak_rss_mb': 0.0
+            })
+            args = event['args']
+            item['count'] += 1
+            item['wall_seconds'] += event['end'] - event['start']
+            item['cpu_seconds'] += (args.get('cpu_user') or 0) + (args.get('cpu_system') or 0) + (args.get('cpu_thread') or 0)
+            item['max_peak_rss_mb'] = max(item['max_peak_rss_mb'], args.get('peak_rss_mb') or 0)
+
+        for item in summary.values():
+            item['wall_seconds'] = round(item['wall_seconds'], 3)
+            item['cpu_seconds'] = round(item['cpu_seconds'], 3)
+        return dict(sorted(summary.items(), key=lambda kv: kv[1]['wall_seconds'], reverse=True))
+
+    def to_chrome_trace(self):
+        """Trace dạng Chrome Trace Event Format (complete events 'X', đơn vị micro giây)"""
+        with self.lock:
+            events = list(self.events)
+
+        trace_events = []
+        lanes = {}    # video/task -> pid
+        threads = {}  # (pid, thread, segment) -> tid
+
+        for event in events:
+            context = event['context']
+            lane = context.get('task_id') or context.get('video') or 'main'
+            if lane not in lanes:
+                lanes[lane] = len(lanes) + 1
+                trace_events.append({
+                    'name': 'process_name', 'ph': 'M', 'pid': lanes[lane], 'tid': 0,
+                    'args': {'name': context.get('video') or lane}
+                })
+            pid = lanes[lane]
+
+            thread_key = (pid, event['thread'], context.get('segment'))
+            if thread_key not in threads:
+                threads[thread_key] = len(threads) + 1
+                label = event['thread'] if context.get('segment') is None else f"segment {context['segment']}"
+                trace_events.append({
+                    'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': threads[thread_key],
+                    'args': {'name': label}
+                })
+
+            trace_events.append({
+                'name': event['name'],
+                'cat': event['category'],
+                'ph': 'X',
+                'ts': round((event['start'] - self.origin) * 1_000_000),
+                'dur': round((event['end'] - event['start']) * 1_000_000),
+                'pid': pid,
+                'tid': threads[thread_key],
+                'args': {**context, **event['args']}
+            })
+
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    def export_chrome_trace(self, output_path):
+        """Ghi trace JSON (mở bằng chrome://tracing hoặc ui.perfetto.dev)"""
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_chrome_trace(), f, ensure_ascii=False, default=str)
+        print(f"⏱️ Đã xuất trace: {output_path}")
+
+# Recorder dùng chung cho cả ứng dụng
+recorder = TraceRecorder()
+recorder.add_listener(observe_trace_event)
+
+@contextmanager
+def span(name, category='stage', **args):
+    """
+    Đo một đoạn xử lý trong process (stage, STT, dịch...)
+
+    CPU là CPU của thread hiện tại (time.thread_time), không gồm tiến trình
+    con; FFmpeg được ghi riêng bằng record_subprocess. Có thể thêm số liệu
+    vào dict được yield.
+
+        with span('stt', model='base') as metrics:
+            ...
+            metrics['segments'] = len(result)
+    """
+    metrics = dict(args)
+    start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield metrics
+    finally:
+        metrics['cpu_thread'] = time.thread_time() - cpu_start
+        metrics['peak_rss_mb'] = peak_rss_mb()
+        recorder.record(name, category, start, time.perf_counter(), **metrics)
+
+def record_subprocess(name, start, end, usage=None, **args):
+    """
+    Ghi một tiến trình con đã kết thúc
+
+    Args:
+        start, end (float): Mốc time.perf_counter()
+        usage: rusage từ os.wait4 (None nếu không có, vd Windows)
+    """
+    metrics = rusage_metrics(usage) if usage is not None else {}
+    recorder.record(name, 'subprocess', start, end, **metrics, **args)
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Module hủy / tạm dừng job: token hủy + registry tiến trình con
+
+Mỗi job (một video trong batch) có một CancelToken gắn vào thread đang xử lý
+bằng cancel_scope. Các tiến trình FFmpeg được tạo qua popen() sẽ chạy trong
+process group riêng và đăng ký với token của thread hiện tại, nên khi
+token.cancel() được gọi:
+- Mọi tiến trình con đang chạy của job bị dừng ngay (cả process group)
+- Pipeline kiểm tra token giữa các stage (check_cancelled) và dừng bằng
+  JobCancelled thay vì chạy tiếp stage sau
+
+token.pause() tạm dừng (SIGSTOP) các process group đang chạy và giữ tiến
+trình mới chưa được tạo cho tới khi token.resume() (SIGCONT), nên không mất
+phần đã encode.
+
+    token = CancelToken()
+    with cancel_scope(token):
+        editor.process_video(...)      # thread khác: token.cancel()
+"""
+
+import os
+import signal
+import threading
+import subprocess
+from contextlib import contextmanager
+
+KILL_GRACE_SECONDS = 3  # Sau SIGTERM bao lâu thì SIGKILL
+
+class JobCancelled(Exception):
+    """Job bị hủy (người dùng bấm Dừng)"""
+
+class CancelToken:
+    """Cờ hủy dùng chung giữa các thread của một job, kèm danh sách tiến trình con"""
+
+    def __init__(self, name=None):
+        self.name = name
+        self._event = threading.Event()
+        self._resumed = threading.Event()
+        self._resumed.set()
+        self._processes = set()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    @property
+    def paused(self):
+        return not self._resumed.is_set()
+
+    def cancel(self):
+        """Đánh dấu hủy và dừng ngay mọi tiến trình con đã đăng ký"""
+        self._event.set()
+        self._resumed.set()  # Giải phóng thread đang chờ resume để nó thấy lệnh hủy
+        with self._lock:
+            processes = list(self._processes)
+        for process in processes:
+            terminate_process(process)
+
+    def pause(self):
+        """Tạm dừng mọi tiến trình con đang chạy, chặn tạo tiến trình mới"""
+        if self.cancelled:
+            return
+        with self._lock:
+            self._resumed.clear()
+            processes = list(self._processes)
+        for process in processes:
+            suspend_process(process)
+
+    def resume(self):
+        """Chạy tiếp các tiến trình con đã tạm dừng"""
+        with self._lock:
+            self._resumed.set()
+            processes = list(self._processes)
+        for process in processes:
+            resume_process(process)
+
+    def wait_resumed(self):
+        """Chờ tới khi không còn tạm dừng (hoặc bị hủy)"""
+        self._resumed.wait()
+
+    def check(self):
+        """Raise JobCancelled nếu job đã bị hủy"""
+        if self.cancelled:
+            raise JobCancelled(f"Job {self.name} đã bị hủy" if self.name else "Job đã bị hủy")
+
+    def wait(self, timeout=None):
+        """Chờ tới khi bị hủy (hoặc hết timeout), trả về True nếu đã hủy"""
+        return self._event.wait(timeout)
+
+    def register(self, process):
+        with self._lock:
+            self._processes.add(process)
+            paused = self.paused
+        # Hủy / tạm dừng xảy ra đúng lúc đang tạo tiến trình
+        if self.cancelled:
+            terminate_process(process)
+        elif paused:
+            suspend_process(process)
+
+    def unregister(self, process):
+        with self._lock:
+            self._processes.discard(process)
+
+def terminate_process(process, grace=KILL_GRACE_SECONDS):
+    """
+    Dừng tiến trình (cả process group nếu có), SIGKILL nếu không thoát sau grace giây
+
+    Không chờ tiến trình thoát: việc SIGKILL chạy trên timer riêng
+    """
+    if process.poll() is not None:
+        return
+    try:
+        if os.name == 'nt':
+            process.terminate()
+            return
+        os.killpg(process.pid, signal.SIGTERM)
+        # Tiến trình đang bị SIGSTOP chỉ nhận SIGTERM khi được chạy tiếp
+        os.killpg(process.pid, signal.SIGCONT)
+    except (ProcessLookupError, PermissionError):
+        return
+
+    def force_kill():
+        if process.poll() is None:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+
+    timer = threading.Timer(grace, force_kill)
+    timer.daemon = True
+    timer.start()
+
+def _signal_group(process, sig, windows_method):
+    if process.poll() is not None:
+        return
+    try:
+        if os.name == 'nt':
+            # Windows không có SIGSTOP/SIGCONT: dùng psutil (suspend/resume từng tiến trình)
+            import psutil
+            parent = psutil.Process(process.pid)
+            for proc in [parent, *parent.children(recursive=True)]:
+                getattr(proc, windows_method)()
+            return
+        os.killpg(process.pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+    except Exception as e:
+        print(f"⚠️ Không thể {windows_method} tiến trình {process.pid}: {e}")
+
+def suspend_process(process):
+    """Tạm dừng cả process group (SIGSTOP)"""
+    _signal_group(process, getattr(signal, 'SIGSTOP', None), 'suspend')
+
+def resume_process(process):
+    """Chạy tiếp process group đã tạm dừng (SIGCONT)"""
+    _signal_group(process, getattr(signal, 'SIGCONT', None), 'resume')
+
+_local = threading.local()
+
+def current_token():
+    """CancelToken của thread hiện tại (None nếu không chạy trong job)"""
+    return getattr(_local, 'token', None)
+
+@contextmanager
+def cancel_scope(token):
+    """Gắn token vào thread hiện tại trong khối with"""
+    previous = current_token()
+    _local.token = token
+    try:
+        yield token
+    finally:
+        _local.token = previous
+
+def check_cancelled():
+    """Điểm kiểm tra giữa các stage: chờ nếu job đang tạm dừng, raise JobCancelled nếu đã bị hủy"""
+    token = current_token()
+    if token:
+        token.wait_resumed()
+        token.check()
+
+def popen(cmd, **kwargs):
+    """
+    subprocess.Popen đăng ký với token của thread hiện tại
+
+    Trong job, tiến trình chạy ở process group riêng để hủy được cả tiến
+    trình con của nó. Ngoài job (CLI) giữ nguyên hành vi Popen để Ctrl+C
+    vẫn tới được FFmpeg.
+    """
+    token = current_token()
+    if token is None:
+        return subprocess.Popen(cmd, **kwargs)
+
+    # Job đang tạm dừng: chưa tạo tiến trình mới cho tới khi resume
+    token.wait_resumed()
+    token.check()
+    if os.name == 'nt':
+        kwargs.setdefault('creationflags', subprocess.CREATE_NEW_PROCESS_GROUP)
+    else:
+        kwargs.setdefault('start_new_session', True)
+    process = subprocess.Popen(cmd, **kwargs)
+    token.register(process)
+    return process
+
+def release(process):
+    """Bỏ đăng ký tiến trình đã kết thúc khỏi token hiện tại"""
+    token = current_token()
+    if token:
+        token.unregister(process)
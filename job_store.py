@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Module lưu lịch sử các lần xử lý video (SQLite, thư viện chuẩn)
+
+Mỗi job hoàn thành ghi lại đặc trưng đầu vào (độ dài, độ phân giải, số
+overlay, có audio...) cùng thời gian xử lý thực tế, làm dữ liệu cho mô
+hình dự đoán chi phí (throughput_model) dùng để xếp lịch và tính ETA.
+"""
+
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+DEFAULT_DB = "batch_jobs.db"
+
+class JobStore:
+    """Kho lịch sử job, an toàn khi gọi từ nhiều worker thread"""
+
+    def __init__(self, db_path=DEFAULT_DB):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    task_id TEXT,
+                    input_path TEXT,
+                    status TEXT,
+                    features TEXT,
+                    wall_seconds REAL,
+                    workers INTEGER,
+                    finished_at TEXT
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        """Kết nối ngắn cho mỗi thao tác (commit khi xong, luôn đóng)"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def record_run(self, task_id, input_path, status, features, wall_seconds, workers=1):
+        """
+        Ghi một lần xử lý
+
+        Args:
+            features (dict): Đặc trưng đầu vào (ThroughputModel.features)
+            wall_seconds (float): Thời gian xử lý thực tế
+            workers (int): Số worker chạy song song lúc đó (job chạy chung máy thì chậm hơn)
+        """
+        with self.lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO job_runs (task_id, input_path, status, features, wall_seconds, workers, finished_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (task_id, input_path, status, json.dumps(features), wall_seconds, workers,
+                 datetime.now().isoformat())
+            )
+
+    def recent_runs(self, limit=500, status='success'):
+        """
+        Các lần xử lý gần nhất
+
+        Returns:
+            list: [{'features': dict, 'wall_seconds': float, 'workers': int}, ...]
+        """
+        with self.lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT features, wall_seconds, workers FROM job_runs WHERE status = ? "
+                "ORDER BY id DESC LIMIT ?",
+                (status, limit)
+            ).fetchall()
+        return [
+            {'features': json.loads(features), 'wall_seconds': wall_seconds, 'workers': workers}
+            for features, wall_seconds, workers in rows
+        ]
@@ -8,14 +8,22 @@ Mô tả: Tự động tạo phụ đề, dịch sang tiếng Anh và chuyển 
 
 import os
 import sys
+import shutil
 import tempfile
 import subprocess
 from pathlib import Path
+from contextlib import contextmanager
 import argparse
 from video_processor import VideoProcessor
 from subtitle_generator import SubtitleGenerator
 from translator import Translator
 from aspect_ratio_converter import AspectRatioConverter
+from stage_planner import probe_video, plan_stages, last_stage, materialize, encode_final, STAGE_ORDER
+from ffmpeg_runner import progress_context, probe_duration, ffprobe_for
+from job_control import check_cancelled, JobCancelled
+from instrumentation import span
+from stage_cache import StageCache, job_fingerprint
+from encoder_profiles import ENCODER_PROFILES, FINAL_PROFILES, INTERMEDIATE_PROFILE
 
 class AutoVideoEditor:
     def __init__(self):
@@ -37,9 +45,72 @@ class AutoVideoEditor:
         }
         return colors.get(color_name.lower(), "0x00ff00")    
     
+    def prepare_subtitle(self, input_video_path, temp_dir, source_language='vi', target_language='en',
+                         words_per_line=7, stage_cache=None):
+        """
+        Bước 1-3: trích audio, tạo phụ đề và dịch sang ngôn ngữ đích
+        
+        Args:
+            stage_cache (StageCache, optional): Bỏ qua bước đã xong ở lần chạy trước
+        
+        Returns:
+            str: Đường dẫn file phụ đề đã dịch
+        """
+        def reuse(stage, path):
+            if stage_cache and stage_cache.done(stage, path):
+                print(f"♻️ Dùng lại kết quả stage {stage}: {os.path.basename(path)}")
+                return True
+            return False
+        
+        # Bước 1: Trích xuất audio từ video
+        audio_path = os.path.join(temp_dir, "extracted_audio.wav")
+        original_subtitle_path = os.path.join(temp_dir, "original_subtitle.srt")
+        translated_subtitle_path = os.path.join(temp_dir, f"{target_language}_subtitle.srt")
+        if reuse('translate', translated_subtitle_path):
+            return translated_subtitle_path
+        
+        stt_done = reuse('stt', original_subtitle_path)
+        if not stt_done and not reuse('extract_audio', audio_path):
+            print("🎵 Bước 1: Trích xuất audio từ video...")
+            with span('extract_audio'):
+                self.video_processor.extract_audio(input_video_path, audio_path)
+            if stage_cache:
+                stage_cache.mark('extract_audio', audio_path)
+        check_cancelled()
+        
+        # Bước 2: Tạo phụ đề từ audio
+        if not stt_done:
+            print("📝 Bước 2: Tạo phụ đề từ audio...")
+            with span('stt', language=source_language, audio_seconds=probe_duration(audio_path)):
+                self.subtitle_generator.generate_subtitle(
+                    audio_path, 
+                    original_subtitle_path, 
+                    language=source_language,
+                    words_per_line=words_per_line
+                )
+            if stage_cache:
+                stage_cache.mark('stt', original_subtitle_path)
+        check_cancelled()
+        
+        # Bước 3: Dịch phụ đề sang ngôn ngữ đích
+        print(f"🌐 Bước 3: Dịch phụ đề từ {source_language} sang {target_language}...")
+        with span('translate', source=source_language, target=target_language):
+            self.translator.translate_subtitle(
+                original_subtitle_path,
+                translated_subtitle_path,
+                source_lang=source_language,
+                target_lang=target_language
+            )
+        if stage_cache:
+            stage_cache.mark('translate', translated_subtitle_path)
+        return translated_subtitle_path
+    
     def process_video(self, input_video_path, output_video_path, source_language='vi', target_language='en', 
                  img_folder=None, overlay_times=None, video_overlay_settings=None, 
-                 custom_timeline=False, words_per_line=7, enable_subtitle=True, subtitle_style=None):
+                 custom_timeline=False, words_per_line=7, enable_subtitle=True, subtitle_style=None,
+                 timeline=None, fill_mode='pad', encoder_profile=None,
+                 intermediate_profile=INTERMEDIATE_PROFILE, segments=1, subtitle_path=None,
+                 force_encode=False, work_dir=None):
         """
         Xử lý video chính theo các bước - FIXED ORDER: Convert 9:16 TRƯỚC overlay
         
@@ -63,7 +134,33 @@ class AutoVideoEditor:
                     "font_size": 24,              # Cỡ chữ
                     "preset": "default"           # Hoặc dùng preset có sẵn
                 }
+            timeline (str | dict, optional): Timeline overlay khai báo (JSON/YAML) cho custom timeline;
+                                             None = timelines/custom_timeline.json
+            fill_mode (str): Cách lấp khung 9:16 ('pad', 'blur' hoặc 'smart_crop')
+            encoder_profile (str, optional): Profile encode cuối ('draft', 'balanced', 'archive');
+                                             None = 'balanced'
+            intermediate_profile (str): Profile cho file trung gian giữa các stage
+            segments (int | None): > 1 = split-encode: chia video tại keyframe thành N đoạn render
+                                   song song rồi ghép lossless; None = tự chọn theo số CPU
+            subtitle_path (str, optional): Phụ đề đã dịch sẵn (bỏ qua bước 1-3)
+            force_encode (bool): Luôn encode lại kể cả khi video đã đúng khung 9:16
+                                 (các segment của split-encode phải cùng codec để ghép)
+            work_dir (str, optional): Thư mục làm việc cố định thay cho thư mục tạm. Giữ lại
+                                      khi lỗi/hủy để lần chạy lại dùng lại các stage đã xong;
+                                      xóa khi hoàn thành
         """
+        if segments is None or segments > 1:
+            from segment_encoder import process_video_segmented
+            return process_video_segmented(
+                self, input_video_path, output_video_path, segments=segments,
+                source_language=source_language, target_language=target_language,
+                img_folder=img_folder, overlay_times=overlay_times,
+                video_overlay_settings=video_overlay_settings, custom_timeline=custom_timeline,
+                words_per_line=words_per_line, enable_subtitle=enable_subtitle,
+                subtitle_style=subtitle_style, timeline=timeline, fill_mode=fill_mode,
+                encoder_profile=encoder_profile, intermediate_profile=intermediate_profile
+            )
+        
         print("🎬 Bắt đầu xử lý video...")
         
         print("🎯 Cấu hình xử lý:")
@@ -90,52 +187,52 @@ class AutoVideoEditor:
         print("=" * 50)
         
         try:
-            # Tạo thư mục tạm
-            temp_dir = tempfile.mkdtemp()
+            # Tạo thư mục tạm (hoặc dùng thư mục làm việc cố định để retry tiếp tục từ stage đã xong)
+            stage_cache = None
+            if work_dir:
+                os.makedirs(work_dir, exist_ok=True)
+                temp_dir = work_dir
+                stage_cache = StageCache(work_dir, job_fingerprint(input_video_path, {
+                    'source_language': source_language, 'target_language': target_language,
+                    'img_folder': img_folder, 'overlay_times': overlay_times,
+                    'video_overlay_settings': video_overlay_settings, 'custom_timeline': custom_timeline,
+                    'words_per_line': words_per_line, 'enable_subtitle': enable_subtitle,
+                    'subtitle_style': subtitle_style, 'timeline': timeline, 'fill_mode': fill_mode,
+                    'encoder_profile': encoder_profile, 'intermediate_profile': intermediate_profile,
+                    'subtitle_path': subtitle_path, 'force_encode': force_encode
+                }))
+                if stage_cache.completed():
+                    print(f"♻️ Tiếp tục job, các stage đã xong: {', '.join(stage_cache.completed())}")
+            else:
+                temp_dir = tempfile.mkdtemp()
             print(f"📁 Thư mục tạm: {temp_dir}")
             
+            def reuse_stage(stage, path):
+                """Stage trung gian đã xong ở lần chạy trước"""
+                if stage_cache and path != output_video_path and stage_cache.done(stage, path):
+                    print(f"♻️ Dùng lại kết quả stage {stage}: {os.path.basename(path)}")
+                    return True
+                return False
+            
+            def mark_stage(stage, path):
+                if stage_cache and path != output_video_path:
+                    stage_cache.mark(stage, path)
+            
             translated_subtitle_path = None
             
             # BƯỚC 1-3: XỬ LÝ PHỤ ĐỀ (nếu enable)
-            if enable_subtitle:
-                # Bước 1: Trích xuất audio từ video
-                print("🎵 Bước 1: Trích xuất audio từ video...")
-                audio_path = os.path.join(temp_dir, "extracted_audio.wav")
-                self.video_processor.extract_audio(input_video_path, audio_path)
-                
-                # Bước 2: Tạo phụ đề từ audio
-                print("📝 Bước 2: Tạo phụ đề từ audio...")
-                original_subtitle_path = os.path.join(temp_dir, "original_subtitle.srt")
-                self.subtitle_generator.generate_subtitle(
-                    audio_path, 
-                    original_subtitle_path, 
-                    language=source_language,
-                    words_per_line=words_per_line
-                )
-                
-                # Bước 3: Dịch phụ đề sang ngôn ngữ đích
-                print(f"🌐 Bước 3: Dịch phụ đề từ {source_language} sang {target_language}...")
-                translated_subtitle_path = os.path.join(temp_dir, f"{target_language}_subtitle.srt")
-                self.translator.translate_subtitle(
-                    original_subtitle_path,
-                    translated_subtitle_path,
-                    source_lang=source_language,
-                    target_lang=target_language
+            if enable_subtitle and subtitle_path:
+                # Phụ đề đã tạo sẵn (vd split-encode: tạo một lần cho cả video rồi chia theo segment)
+                print(f"📝 Dùng phụ đề có sẵn: {subtitle_path}")
+                translated_subtitle_path = subtitle_path
+            elif enable_subtitle:
+                translated_subtitle_path = self.prepare_subtitle(
+                    input_video_path, temp_dir, source_language, target_language, words_per_line,
+                    stage_cache=stage_cache
                 )
             else:
                 print("📝 Bỏ qua tạo phụ đề (enable_subtitle=False)")
             
-            # ⭐ BƯỚC 4: CHUYỂN ĐỔI 9:16 TRƯỚC (KEY CHANGE!)
-            print("📱 Bước 4: Chuyển đổi tỉ lệ khung hình thành 9:16 TRƯỚC...")
-            video_9_16_path = os.path.join(temp_dir, "video_9_16.mp4")
-            self.aspect_converter.convert_to_9_16(
-                input_video_path,
-                video_9_16_path
-            )
-            
-            # BƯỚC 5: CHÈN VIDEO OVERLAY (trên video 9:16)
-            current_video = video_9_16_path  # Sử dụng video 9:16 làm base
-            
             # Kiểm tra video overlay có hợp lệ không
             should_add_overlay = False
             overlay_video_path = None
@@ -149,24 +246,87 @@ class AutoVideoEditor:
                 else:
                     print("⚠️ Không có video overlay path hoặc file không tồn tại, bỏ qua video overlay")
             
+            should_apply_timeline = bool((custom_timeline or timeline) and img_folder and os.path.exists(img_folder))
+            
+            # Lập kế hoạch stage từ metadata: bỏ qua bước không làm thay đổi video
+            try:
+                input_info = probe_video(input_video_path, ffprobe_for(self.aspect_converter.ffmpeg_path))
+            except Exception as e:
+                print(f"⚠️ Không thể probe video, chạy đầy đủ các stage: {e}")
+                input_info = None
+            plan = plan_stages(
+                input_info,
+                (1080, 1920),
+                force_encode=force_encode,
+                overlay=should_add_overlay,
+                timeline=should_apply_timeline,
+                subtitle=bool(enable_subtitle and translated_subtitle_path)
+            )
+            
+            # Stage cuối ghi thẳng ra output với profile encode cuối,
+            # các stage trước ghi file trung gian với profile trung gian
+            final_stage = last_stage(plan)
+            
+            def stage_output(stage, temp_name):
+                if stage == final_stage:
+                    return output_video_path, encoder_profile
+                return os.path.join(temp_dir, temp_name), intermediate_profile
+            
+            # Gắn stage vào sự kiện tiến độ FFmpeg (GUI/batch tính % và ETA theo stage)
+            planned_stages = [stage for stage in STAGE_ORDER if plan[stage] and plan[stage] != 'skip']
+            
+            @contextmanager
+            def stage_progress(stage):
+                check_cancelled()  # Dừng giữa các stage nếu job đã bị hủy
+                with progress_context(
+                    stage=stage,
+                    stage_index=planned_stages.index(stage),
+                    stage_count=len(planned_stages)
+                ), span(stage):
+                    yield
+            
+            # ⭐ BƯỚC 4: CHUYỂN ĐỔI 9:16 TRƯỚC (KEY CHANGE!)
+            if plan['aspect'] == 'skip':
+                print("⚡ Bước 4: Video đã là 1080x1920, bỏ qua chuyển đổi 9:16")
+                current_video = input_video_path
+            else:
+                print("📱 Bước 4: Chuyển đổi tỉ lệ khung hình thành 9:16 TRƯỚC...")
+                video_9_16_path, stage_profile = stage_output('aspect', "video_9_16.mp4")
+                if not reuse_stage('aspect', video_9_16_path):
+                    with stage_progress('aspect'):
+                        self.aspect_converter.convert_to_9_16(
+                            input_video_path,
+                            video_9_16_path,
+                            fill_mode=fill_mode,
+                            encoder_profile=stage_profile,
+                            force_encode=force_encode
+                        )
+                    mark_stage('aspect', video_9_16_path)
+                current_video = video_9_16_path  # Sử dụng video 9:16 làm base
+            
+            # BƯỚC 5: CHÈN VIDEO OVERLAY (trên video 9:16)
             # Xử lý video overlay nếu có
             if should_add_overlay:
                 print("🎞️ Bước 5: Chèn video overlay (trên video 9:16)...")
                 
                 try:
-                    video_with_overlay_path = os.path.join(temp_dir, "video_9_16_with_overlay.mp4")
+                    video_with_overlay_path, stage_profile = stage_output('overlay', "video_9_16_with_overlay.mp4")
                     
                     # Kiểm tra nếu có multiple overlays
-                    if 'multiple_overlays' in video_overlay_settings:
+                    if reuse_stage('overlay', video_with_overlay_path):
+                        pass
+                    elif 'multiple_overlays' in video_overlay_settings:
                         # Xử lý multiple overlays
                         overlays = video_overlay_settings['multiple_overlays']
                         print(f"🎬 Xử lý {len(overlays)} video overlay...")
-                        self._process_multiple_video_overlays(
-                            current_video,  # Sử dụng video 9:16
-                            video_with_overlay_path, 
-                            overlays, 
-                            temp_dir
-                        )
+                        with stage_progress('overlay'):
+                            self._process_multiple_video_overlays(
+                                current_video,  # Sử dụng video 9:16
+                                video_with_overlay_path, 
+                                overlays, 
+                                temp_dir,
+                                encoder_profile=stage_profile
+                            )
                     else:
                         # Xử lý single overlay
                         from video_overlay import add_video_overlay_with_chroma
@@ -192,52 +352,65 @@ class AutoVideoEditor:
                         print(f"🎨 Chroma key: {chroma_color} (similarity={chroma_similarity}, blend={chroma_blend})")
                         
                         # Gọi hàm overlay với video 9:16
-                        add_video_overlay_with_chroma(
-                            main_video_path=current_video,  # Video 9:16
-                            overlay_video_path=overlay_video_path,
-                            output_path=video_with_overlay_path,
-                            start_time=settings.get('start_time', 2),
-                            duration=settings.get('duration', 10),
-                            position=settings.get('position', 'center'),
-                            size_percent=settings.get('size_percent', 25),
-                            chroma_key=settings.get('chroma_key', True),
-                            chroma_color=chroma_color,
-                            chroma_similarity=chroma_similarity,
-                            chroma_blend=chroma_blend,
-                            auto_hide=settings.get('auto_hide', True),
-                            position_mode=position_mode,
-                            custom_x=custom_x,
-                            custom_y=custom_y,
-                            size_mode=size_mode,
-                            custom_width=custom_width,
-                            custom_height=custom_height
-                        )
+                        with stage_progress('overlay'):
+                            add_video_overlay_with_chroma(
+                                main_video_path=current_video,  # Video 9:16
+                                overlay_video_path=overlay_video_path,
+                                output_path=video_with_overlay_path,
+                                start_time=settings.get('start_time', 2),
+                                duration=settings.get('duration', 10),
+                                position=settings.get('position', 'center'),
+                                size_percent=settings.get('size_percent', 25),
+                                chroma_key=settings.get('chroma_key', True),
+                                chroma_color=chroma_color,
+                                chroma_similarity=chroma_similarity,
+                                chroma_blend=chroma_blend,
+                                auto_hide=settings.get('auto_hide', True),
+                                position_mode=position_mode,
+                                custom_x=custom_x,
+                                custom_y=custom_y,
+                                size_mode=size_mode,
+                                custom_width=custom_width,
+                                custom_height=custom_height,
+                                overlay_seek=settings.get('seek', 0),
+                                encoder_profile=stage_profile
+                            )
                     
+                    mark_stage('overlay', video_with_overlay_path)
                     current_video = video_with_overlay_path  # Update current video
                     
+                except JobCancelled:
+                    raise
                 except Exception as e:
                     print(f"⚠️ Lỗi video overlay: {e}")
                     print("🔄 Fallback: Tiếp tục với video 9:16 không có overlay...")
                     # current_video vẫn là video_9_16_path
             
             # Xử lý custom timeline nếu được bật
-            if custom_timeline and img_folder and os.path.exists(img_folder):
-                print("🎞️ Bước 5.5: Áp dụng custom timeline (3 ảnh)...")
+            if should_apply_timeline:
+                print("🎞️ Bước 5.5: Áp dụng custom timeline...")
                 try:
                     from video_overlay import add_images_with_custom_timeline
                     
-                    video_with_timeline_path = os.path.join(temp_dir, "video_with_timeline.mp4")
+                    video_with_timeline_path, stage_profile = stage_output('timeline', "video_with_timeline.mp4")
                     
                     # Nếu có subtitle, sử dụng nó cho custom timeline
                     subtitle_for_timeline = translated_subtitle_path if translated_subtitle_path else None
                     
-                    # Thêm 3 ảnh với timeline
-                    success = add_images_with_custom_timeline(
-                        current_video,
-                        subtitle_for_timeline,
-                        video_with_timeline_path,
-                        img_folder
-                    )
+                    # Thêm overlay theo timeline khai báo
+                    success = reuse_stage('timeline', video_with_timeline_path)
+                    if not success:
+                        with stage_progress('timeline'):
+                            success = add_images_with_custom_timeline(
+                                current_video,
+                                subtitle_for_timeline,
+                                video_with_timeline_path,
+                                img_folder,
+                                timeline=timeline,
+                                encoder_profile=stage_profile
+                            )
+                        if success:
+                            mark_stage('timeline', video_with_timeline_path)
                     
                     if success:
                         current_video = video_with_timeline_path
@@ -245,6 +418,8 @@ class AutoVideoEditor:
                     else:
                         print("⚠️ Không thể áp dụng custom timeline, tiếp tục với video hiện tại")
                     
+                except JobCancelled:
+                    raise
                 except Exception as e:
                     print(f"⚠️ Lỗi custom timeline: {e}")
                     print("🔄 Fallback: Tiếp tục với video hiện tại...")
@@ -252,98 +427,124 @@ class AutoVideoEditor:
             # BƯỚC 6: THÊM PHỤ ĐỀ (trên video 9:16 + overlay)
             if enable_subtitle and translated_subtitle_path:
                 print("📝 Bước 6: Thêm phụ đề (trên video 9:16 + overlay)...")
-                self.video_processor.add_subtitle_to_video(
-                    current_video,  # Video 9:16 (có thể có overlay)
-                    translated_subtitle_path,
-                    output_video_path,
-                    subtitle_style=subtitle_style
-                )
+                with stage_progress('subtitle'):
+                    self.video_processor.add_subtitle_to_video(
+                        current_video,  # Video 9:16 (có thể có overlay)
+                        translated_subtitle_path,
+                        output_video_path,
+                        subtitle_style=subtitle_style,
+                        encoder_profile=encoder_profile
+                    )
+            elif current_video not in (input_video_path, output_video_path):
+                # Stage cuối theo kế hoạch lỗi (fallback): file hiện tại là file trung gian
+                # encode với profile nhanh, phải encode lại với profile cuối
+                print("📝 Bước 6: Không có phụ đề, encode file trung gian với profile cuối...")
+                check_cancelled()
+                with progress_context(stage='final_encode', stage_index=len(planned_stages),
+                                      stage_count=len(planned_stages) + 1), span('final_encode'):
+                    encode_final(current_video, output_video_path, encoder_profile,
+                                 ffmpeg_path=self.aspect_converter.ffmpeg_path)
             else:
-                # Không có phụ đề, copy video hiện tại ra output
-                print("📝 Bước 6: Không có phụ đề, copy video ra output...")
-                import shutil
-                shutil.copy2(current_video, output_video_path)
+                # Không có phụ đề: copy/remux file gốc ra output (stage cuối đã ghi thẳng ra output thì bỏ qua)
+                check_cancelled()
+                with span('materialize') as metrics:
+                    method = materialize(current_video, output_video_path, ffmpeg_path=self.aspect_converter.ffmpeg_path)
+                    metrics['method'] = method
+                print(f"📝 Bước 6: Không có phụ đề, đưa video ra output ({method})...")
             
             print(f"✅ Hoàn thành! Video đã được lưu tại: {output_video_path}")
             
             # Dọn dẹp thư mục tạm
-            import shutil
             shutil.rmtree(temp_dir)
             print("🧹 Đã dọn dẹp thư mục tạm")
             
+        except JobCancelled:
+            # Dọn ngay file tạm và output dở dang để giải phóng ổ đĩa
+            # (thư mục làm việc cố định được giữ để chạy lại tiếp từ stage đã xong)
+            print(f"🛑 Đã hủy xử lý: {input_video_path}")
+            if not work_dir:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+            if os.path.exists(output_video_path) and os.path.abspath(output_video_path) != os.path.abspath(input_video_path):
+                os.remove(output_video_path)
+            raise
         except Exception as e:
             print(f"❌ Lỗi trong quá trình xử lý: {str(e)}")
             import traceback
             print(f"Chi tiết lỗi: {traceback.format_exc()}")
             raise
-def _process_multiple_video_overlays(self, input_video_path, output_path, settings_list, temp_dir):
-    """Xử lý nhiều video overlay với custom position và size - UPDATED for 9:16"""
-    current_video = input_video_path  # Đây giờ là video 9:16
-    
-    for i, settings in enumerate(settings_list):
-        temp_output = os.path.join(temp_dir, f"temp_overlay_{i}.mp4")
+
+    def _process_multiple_video_overlays(self, input_video_path, output_path, settings_list, temp_dir,
+                                         encoder_profile=None):
+        """Xử lý nhiều video overlay với custom position và size - UPDATED for 9:16"""
+        current_video = input_video_path  # Đây giờ là video 9:16
         
-        print(f"🎬 Áp dụng video overlay {i+1}/{len(settings_list)} (trên video 9:16)...")
+        for i, settings in enumerate(settings_list):
+            temp_output = os.path.join(temp_dir, f"temp_overlay_{i}.mp4")
         
-        from video_overlay import add_video_overlay_with_chroma
+            print(f"🎬 Áp dụng video overlay {i+1}/{len(settings_list)} (trên video 9:16)...")
         
-        # Xử lý chroma parameters từ GUI
-        chroma_color = settings.get('chroma_color', 'green')
-        chroma_similarity = settings.get('chroma_similarity', 0.2)
-        chroma_blend = settings.get('chroma_blend', 0.15)
+            from video_overlay import add_video_overlay_with_chroma
         
-        print(f"Processing chroma: color={chroma_color}, similarity={chroma_similarity}, blend={chroma_blend}")
+            # Xử lý chroma parameters từ GUI
+            chroma_color = settings.get('chroma_color', 'green')
+            chroma_similarity = settings.get('chroma_similarity', 0.2)
+            chroma_blend = settings.get('chroma_blend', 0.15)
         
-        # Convert color name to hex nếu cần
-        if not str(chroma_color).startswith('0x'):
-            chroma_color = self._get_chroma_color(chroma_color)
+            print(f"Processing chroma: color={chroma_color}, similarity={chroma_similarity}, blend={chroma_blend}")
         
-        # Đảm bảo similarity và blend là số
-        try:
-            if isinstance(chroma_similarity, str):
-                chroma_similarity = float(chroma_similarity)
-            if isinstance(chroma_blend, str):
-                chroma_blend = float(chroma_blend)
-        except (ValueError, TypeError):
-            print(f"Invalid chroma values, using defaults")
-            chroma_similarity = 0.2
-            chroma_blend = 0.15
+            # Convert color name to hex nếu cần
+            if not str(chroma_color).startswith('0x'):
+                chroma_color = self._get_chroma_color(chroma_color)
         
-        # Extract position and size parameters cho multiple overlays
-        position_mode = settings.get('position_mode', 'preset')
-        custom_x = settings.get('custom_x')
-        custom_y = settings.get('custom_y')
-        size_mode = settings.get('size_mode', 'percentage')
-        custom_width = settings.get('custom_width')
-        custom_height = settings.get('custom_height')
+            # Đảm bảo similarity và blend là số
+            try:
+                if isinstance(chroma_similarity, str):
+                    chroma_similarity = float(chroma_similarity)
+                if isinstance(chroma_blend, str):
+                    chroma_blend = float(chroma_blend)
+            except (ValueError, TypeError):
+                print(f"Invalid chroma values, using defaults")
+                chroma_similarity = 0.2
+                chroma_blend = 0.15
         
-        add_video_overlay_with_chroma(
-            main_video_path=current_video,  # Video 9:16
-            overlay_video_path=settings['video_path'],
-            output_path=temp_output,
-            start_time=settings.get('start_time', 0),
-            duration=settings.get('duration'),
-            position=settings.get('position', 'top-right'),
-            size_percent=settings.get('size_percent', 25),
-            chroma_key=settings.get('chroma_key', True),
-            color=chroma_color,  # Sử dụng alias từ test_chroma_key.py
-            similarity=chroma_similarity,  # Sử dụng alias từ test_chroma_key.py
-            auto_hide=settings.get('auto_hide', True),
-            # Pass custom parameters for multiple overlays
-            position_mode=position_mode,
-            custom_x=custom_x,
-            custom_y=custom_y,
-            size_mode=size_mode,
-            custom_width=custom_width,
-            custom_height=custom_height
-        )
+            # Extract position and size parameters cho multiple overlays
+            position_mode = settings.get('position_mode', 'preset')
+            custom_x = settings.get('custom_x')
+            custom_y = settings.get('custom_y')
+            size_mode = settings.get('size_mode', 'percentage')
+            custom_width = settings.get('custom_width')
+            custom_height = settings.get('custom_height')
         
-        current_video = temp_output
-    
-    # Copy kết quả cuối cùng
-    import shutil
-    shutil.copy2(current_video, output_path)
-    return True
+            add_video_overlay_with_chroma(
+                main_video_path=current_video,  # Video 9:16
+                overlay_video_path=settings['video_path'],
+                output_path=temp_output,
+                start_time=settings.get('start_time', 0),
+                duration=settings.get('duration'),
+                position=settings.get('position', 'top-right'),
+                size_percent=settings.get('size_percent', 25),
+                chroma_key=settings.get('chroma_key', True),
+                color=chroma_color,  # Sử dụng alias từ test_chroma_key.py
+                similarity=chroma_similarity,  # Sử dụng alias từ test_chroma_key.py
+                auto_hide=settings.get('auto_hide', True),
+                # Pass custom parameters for multiple overlays
+                position_mode=position_mode,
+                custom_x=custom_x,
+                custom_y=custom_y,
+                size_mode=size_mode,
+                custom_width=custom_width,
+                custom_height=custom_height,
+                overlay_seek=settings.get('seek', 0),
+                encoder_profile=encoder_profile
+            )
+        
+            current_video = temp_output
+        
+        # Copy kết quả cuối cùng
+        import shutil
+        shutil.copy2(current_video, output_path)
+        return True
+
 
 def _get_chroma_color(self, color_name):
     """Chuyển đổi tên màu thành mã hex"""
@@ -394,6 +595,30 @@ def main():
         default="en", 
         help="Ngôn ngữ đích cho phụ đề (mặc định: en - English)"
     )
+    parser.add_argument(
+        "--fill-mode",
+        default="pad",
+        choices=["pad", "blur", "smart_crop"],
+        help="Cách lấp khung 9:16: pad (viền màu), blur (nền mờ) hoặc smart_crop (cắt theo chủ thể)"
+    )
+    parser.add_argument(
+        "--encoder-profile",
+        default="balanced",
+        choices=list(FINAL_PROFILES),
+        help="Profile encode cuối: draft (QA nhanh), balanced (mặc định) hoặc archive (chất lượng cao)"
+    )
+    parser.add_argument(
+        "--intermediate-profile",
+        default=INTERMEDIATE_PROFILE,
+        choices=[name for name in ENCODER_PROFILES if name.startswith("intermediate")],
+        help="Profile cho file trung gian giữa các stage"
+    )
+    parser.add_argument(
+        "--segments",
+        type=int,
+        default=1,
+        help="Split-encode video dài thành N segment render song song (0 = tự chọn theo số CPU)"
+    )
     
     args = parser.parse_args()
     
@@ -413,7 +638,11 @@ def main():
         input_video_path=args.input_video_path, 
         output_video_path=args.output_video_path, 
         source_language=args.source_lang,
-        target_language=args.target_lang
+        target_language=args.target_lang,
+        fill_mode=args.fill_mode,
+        encoder_profile=args.encoder_profile,
+        intermediate_profile=args.intermediate_profile,
+        segments=args.segments or None
     )
 
 if __name__ == "__main__":
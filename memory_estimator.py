@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Module ước lượng bộ nhớ đỉnh (peak RSS) của một job xử lý video
+
+Một job gồm:
+- Model Whisper nạp trong process Python (AutoVideoEditor tạo mới mỗi job)
+- Các tiến trình FFmpeg chạy tuần tự, bộ nhớ chủ yếu là frame buffer của
+  decoder / encoder (lookahead, frame threads của libx264) và của overlay,
+  tỉ lệ với độ phân giải
+
+Phần FFmpeg được hiệu chỉnh theo lịch sử đo thực tế (peak RSS từ os.wait4)
+bằng hệ số trung bình trượt theo từng loại job, lưu ra file JSON.
+"""
+
+import os
+import json
+import threading
+
+# RSS xấp xỉ của một model Whisper đã nạp (MB, fp32 trên CPU)
+WHISPER_MODEL_MB = {
+    'tiny': 400,
+    'base': 550,
+    'small': 1100,
+    'medium': 2700,
+    'large': 5000
+}
+
+JOB_OVERHEAD_MB = 150       # AutoVideoEditor, audio, buffer Python của một job
+FFMPEG_BASE_MB = 80         # Codec context, filter graph, I/O buffer
+DECODER_BUFFER_FRAMES = 16  # Frame đang giữ ở decoder / filter đầu vào
+ENCODER_BUFFER_FRAMES = 40  # rc-lookahead + B-frame của libx264 (chưa tính frame threads)
+OUTPUT_SIZE = (1080, 1920)  # Khung 9:16 mặc định
+
+HISTORY_ALPHA = 0.3  # Trọng số của lần đo mới nhất khi cập nhật hệ số hiệu chỉnh
+
+def frame_mb(width, height):
+    """Một frame yuv420p (MB)"""
+    return width * height * 1.5 / 1024**2
+
+def count_overlays(config):
+    """Số lớp overlay của job (video overlay + ảnh trong timeline)"""
+    overlays = 0
+    video_overlay = config.get('video_overlay_settings') or {}
+    if video_overlay.get('enabled'):
+        overlays += 1
+    timeline = config.get('timeline')
+    if isinstance(timeline, dict):
+        overlays += len(timeline.get('items') or [])
+    elif config.get('overlay_times'):
+        overlays += len(config['overlay_times'])
+    return overlays
+
+class MemoryEstimator:
+    """Ước lượng peak RSS theo cấu hình + metadata, hiệu chỉnh từ lịch sử đo"""
+
+    def __init__(self, history_file="memory_history.json"):
+        self.history_file = history_file
+        self.factors = {}  # loại job -> hệ số đo thực / ước lượng cho phần FFmpeg
+        self.lock = threading.Lock()
+        self._load_history()
+
+    @staticmethod
+    def job_kind(config, info):
+        """Khóa nhóm các job có hành vi bộ nhớ giống nhau"""
+        height = min(info.get('width', 1920), info.get('height', 1080)) if info else 1080
+        resolution = '2160p' if height > 1440 else ('1080p' if height > 720 else '720p')
+        overlays = 'overlay' if count_overlays(config) else 'plain'
+        return f"{resolution}:{config.get('fill_mode', 'pad')}:{overlays}"
+
+    def estimate(self, config, info=None):
+        """
+        Ước lượng bộ nhớ đỉnh của một job
+
+        Args:
+            config (dict): Cấu hình task (fill_mode, overlay, timeline...)
+            info (dict, optional): Kết quả probe_video, None thì coi như 1080p
+
+        Returns:
+            dict: {'kind', 'whisper_mb', 'factor', 'ffmpeg_mb', 'total_mb'}
+        """
+        from subtitle_generator import WHISPER_MODEL
+
+        width, height = (info['width'], info['height']) if info else (1920, 1080)
+        source_frame = frame_mb(width, height)
+        output_frame = frame_mb(*OUTPUT_SIZE)
+        encoder_frames = ENCODER_BUFFER_FRAMES + (os.cpu_count() or 4)
+
+        ffmpeg_mb = (FFMPEG_BASE_MB
+                     + source_frame * DECODER_BUFFER_FRAMES
+                     + output_frame * encoder_frames
+                     + output_frame * DECODER_BUFFER_FRAMES * count_overlays(config))
+        if config.get('fill_mode') == 'blur':
+            ffmpeg_mb += output_frame * DECODER_BUFFER_FRAMES  # Nhánh nền mờ chạy song song
+
+        kind = self.job_kind(config, info)
+        with self.lock:
+            factor = self.factors.get(kind, 1.0)
+
+        # AutoVideoEditor luôn nạp model khi khởi tạo, kể cả khi không tạo phụ đề
+        whisper_mb = WHISPER_MODEL_MB.get(WHISPER_MODEL, WHISPER_MODEL_MB['large'])
+
+        return {
+            'kind': kind,
+            'whisper_mb': whisper_mb,
+            'factor': factor,
+            'ffmpeg_mb': round(ffmpeg_mb * factor, 1),
+            'total_mb': round(JOB_OVERHEAD_MB + whisper_mb + ffmpeg_mb * factor, 1)
+        }
+
+    def observe(self, estimate, measured_ffmpeg_mb):
+        """
+        Cập nhật hệ số hiệu chỉnh từ peak RSS FFmpeg đo được của một job
+
+        Args:
+            estimate (dict): Kết quả estimate() của job đó
+            measured_ffmpeg_mb (float): Peak RSS lớn nhất trong các tiến trình FFmpeg của job
+        """
+        if not measured_ffmpeg_mb or not estimate.get('ffmpeg_mb'):
+            return
+        kind = estimate['kind']
+        with self.lock:
+            old_factor = self.factors.get(kind, 1.0)
+            # estimate đã nhân hệ số lúc ước lượng: quy về ước lượng gốc trước khi so
+            ratio = measured_ffmpeg_mb / (estimate['ffmpeg_mb'] / estimate.get('factor', 1.0))
+            self.factors[kind] = round(old_factor * (1 - HISTORY_ALPHA) + ratio * HISTORY_ALPHA, 3)
+        self._save_history()
+
+    def _load_history(self):
+        if not self.history_file or not os.path.exists(self.history_file):
+            return
+        try:
+            with open(self.history_file, 'r', encoding='utf-8') as f:
+                self.factors = json.load(f).get('factors', {})
+        except Exception as e:
+            print(f"⚠️ Không thể đọc lịch sử bộ nhớ: {str(e)}")
+
+    def _save_history(self):
+        if not self.history_file:
+            return
+        with self.lock:
+            data = {'factors': dict(self.factors)}
+        try:
+            with open(self.history_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+        except Exception as e:
+            print(f"⚠️ Không thể lưu lịch sử bộ nhớ: {str(e)}")
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Module metrics dạng Prometheus text format (chỉ dùng thư viện chuẩn)
+
+- Counter / Histogram đơn giản, thread-safe, gom trong registry dùng chung
+- observe_trace_event(): nhận sự kiện từ instrumentation (stage, FFmpeg, STT)
+- MetricsServer: HTTP endpoint /metrics (http.server) cho máy render headless
+
+    server = MetricsServer(collect=processor.collect_metrics, port=9108).start()
+    # curl http://127.0.0.1:9108/metrics
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 9108
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Giây: từ stage remux rất ngắn tới encode dài cả giờ
+DURATION_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+# Tỉ lệ so với thời gian thực (1 = bằng thời gian thực)
+RATIO_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def format_metric(name, metric_type, help_text, samples):
+    """
+    Một metric dạng text
+
+    Args:
+        samples (list): [(labels_dict, value), ...]
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+    return '\n'.join(lines)
+
+class Counter:
+    """Bộ đếm tăng dần, có nhãn"""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(label, '') for label in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        with self.lock:
+            samples = [(dict(zip(self.labelnames, key)), value) for key, value in self.values.items()]
+        return format_metric(self.name, 'counter', self.help_text, samples)
+
+class Histogram:
+    """Histogram theo bucket cố định, có nhãn"""
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self.values = {}  # key -> [counts theo bucket, sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(label, '') for label in self.labelnames)
+        with self.lock:
+            counts, total, count = self.values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.values[key] = (counts, total + value, count + 1)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in self.values.items()]
+        for key, counts, total, count in items:
+            labels = list(zip(self.labelnames, key))
+            for bound, bucket_count in zip(self.buckets, counts):
+                bucket_labels = sorted(labels + [('le', _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {bucket_count}")
+            lines.append(f"{self.name}_sum{_format_labels(sorted(labels))} {_format_value(float(total))}")
+            lines.append(f"{self.name}_count{_format_labels(sorted(labels))} {count}")
+        return '\n'.join(lines)
+
+class Registry:
+    """Tập metric dùng chung cho cả ứng dụng"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help_text, labelnames=()):
+        metric = Counter(name, help_text, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DURATION_BUCKETS):
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        return '\n'.join(metric.render() for metric in self.metrics) + '\n'
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    'editvideo_stage_duration_seconds', 'Thời gian chạy từng stage (giây)', ('stage',))
+FFMPEG_REALTIME_FACTOR = registry.histogram(
+    'editvideo_ffmpeg_realtime_factor', 'Tốc độ encode FFmpeg (giây media / giây thực)', ('stage',), RATIO_BUCKETS)
+FFMPEG_CPU_SECONDS = registry.counter(
+    'editvideo_ffmpeg_cpu_seconds_total', 'CPU (user + sys) của các tiến trình FFmpeg', ('stage',))
+STT_SECONDS = registry.counter(
+    'editvideo_stt_seconds_total', 'Thời gian nhận dạng giọng nói (giây)')
+STT_AUDIO_SECONDS = registry.counter(
+    'editvideo_stt_audio_seconds_total', 'Độ dài audio đã nhận dạng (giây)')
+STT_SECONDS_PER_AUDIO_SECOND = registry.histogram(
+    'editvideo_stt_seconds_per_audio_second', 'Giây Whisper cho mỗi giây audio', (), RATIO_BUCKETS)
+TRANSLATION_REQUESTS = registry.counter(
+    'editvideo_translation_requests_total', 'Số request dịch gửi tới dịch vụ dịch', ('result',))
+TRANSLATION_CACHE_HITS = registry.counter(
+    'editvideo_translation_cache_hits_total', 'Số câu dịch lấy từ cache, không gọi dịch vụ')
+
+def observe_trace_event(event):
+    """Cập nhật metric từ một sự kiện của instrumentation.recorder"""
+    args = event['args']
+    wall = event['end'] - event['start']
+
+    if event['category'] == 'stage':
+        STAGE_SECONDS.observe(wall, stage=event['name'])
+        if event['name'] == 'stt':
+            STT_SECONDS.inc(wall)
+            audio_seconds = args.get('audio_seconds')
+            if audio_seconds:
+                STT_AUDIO_SECONDS.inc(audio_seconds)
+                STT_SECONDS_PER_AUDIO_SECOND.observe(wall / audio_seconds)
+
+    elif event['category'] == 'subprocess' and event['name'] == 'ffmpeg':
+        stage = args.get('stage', 'ffmpeg')
+        if args.get('avg_speed'):
+            FFMPEG_REALTIME_FACTOR.observe(args['avg_speed'], stage=stage)
+        cpu = (args.get('cpu_user') or 0) + (args.get('cpu_system') or 0)
+        if cpu:
+            FFMPEG_CPU_SECONDS.inc(cpu, stage=stage)
+
+class MetricsServer:
+    """HTTP server /metrics chạy trên daemon thread"""
+
+    def __init__(self, collect=None, host='127.0.0.1', port=DEFAULT_PORT):
+        """
+        Args:
+            collect (callable, optional): Trả về text metric bổ sung lúc scrape
+                (vd số task theo trạng thái của batch processor)
+            host (str): Mặc định chỉ nghe localhost, '0.0.0.0' để Prometheus ngoài máy scrape
+        """
+        self.collect = collect
+        self.host = host
+        self.port = port
+        self.httpd = None
+        self.thread = None
+
+    def render(self):
+        text = registry.render()
+        if self.collect:
+            text += self.collect().rstrip('\n') + '\n'
+        return text
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                try:
+                    body = server.render().encode('utf-8')
+                except Exception as e:
+                    self.send_error(500, str(e))
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Không in mỗi lần scrape
+
+        self.httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"📡 Metrics endpoint: http://{self.host}:{self.port}/metrics")
+        return self
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Module timeline overlay dạng khai báo (JSON/YAML)
+
+Một timeline mô tả danh sách ảnh/video overlay, thời gian hiển thị,
+vị trí (tương đối theo khung hình), animation và chroma key. Compiler
+chuyển timeline thành một filter graph FFmpeg duy nhất và cache kết quả
+theo (timeline, kích thước khung hình) để dùng lại cho cả batch.
+
+Ví dụ:
+    {
+        "name": "intro_logos",
+        "items": [
+            {"type": "image", "file": "1.png", "start": 5, "end": 6,
+             "position": {"x": "center", "y": 0.45}, "scale": 0.2,
+             "animation": {"type": "fade_in_out", "duration": 0.5}},
+            {"type": "video", "file": "greenscreen.mp4", "start": 2, "duration": 4,
+             "seek": 0, "position": "top-right", "scale": 0.3,
+             "chroma": {"color": "green", "similarity": 0.1, "blend": 0.1}}
+        ]
+    }
+"""
+
+import os
+import json
+import hashlib
+import subprocess
+import threading
+
+try:
+    import yaml
+    HAS_YAML = True
+except ImportError:
+    HAS_YAML = False
+
+# Thư mục chứa các timeline mặc định đi kèm ứng dụng
+TIMELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "timelines")
+
+ITEM_TYPES = ("image", "video")
+ANIMATION_TYPES = (
+    "none", "fade_in", "fade_out", "fade_in_out",
+    "slide_left", "slide_right", "slide_up", "slide_down",
+    "zoom_in", "zoom_out", "rotate_in", "bounce", "pulse"
+)
+
+# Vị trí preset: (x, y) theo biểu thức overlay của FFmpeg
+POSITION_PRESETS = {
+    "center": ("(main_w-overlay_w)/2", "(main_h-overlay_h)/2"),
+    "top-left": ("20", "20"),
+    "top-right": ("main_w-overlay_w-20", "20"),
+    "bottom-left": ("20", "main_h-overlay_h-20"),
+    "bottom-right": ("main_w-overlay_w-20", "main_h-overlay_h-20")
+}
+
+def get_default_timeline_path(name):
+    """Lấy đường dẫn timeline mặc định theo tên (vd: 'custom_timeline')"""
+    return os.path.join(TIMELINE_DIR, f"{name}.json")
+
+def load_timeline(source):
+    """
+    Đọc timeline từ file JSON/YAML hoặc dict và validate cấu trúc
+
+    Args:
+        source (str | dict): Đường dẫn file timeline hoặc dict đã load
+
+    Returns:
+        dict: Timeline đã chuẩn hóa
+    """
+    if isinstance(source, dict):
+        timeline = source
+    else:
+        if not os.path.exists(source):
+            raise FileNotFoundError(f"Timeline không tồn tại: {source}")
+
+        with open(source, 'r', encoding='utf-8') as f:
+            if source.lower().endswith(('.yaml', '.yml')):
+                if not HAS_YAML:
+                    raise ImportError("Cần cài đặt PyYAML để đọc timeline .yaml")
+                timeline = yaml.safe_load(f)
+            else:
+                timeline = json.load(f)
+
+    errors = validate_timeline(timeline)
+    if errors:
+        raise ValueError("Timeline không hợp lệ:\n  - " + "\n  - ".join(errors))
+
+    return _normalize_timeline(timeline)
+
+def validate_timeline(timeline, base_dir=None):
+    """
+    Kiểm tra timeline trước khi render
+
+    Args:
+        timeline (dict): Timeline cần kiểm tra
+        base_dir (str, optional): Nếu có, kiểm tra luôn file overlay có tồn tại
+
+    Returns:
+        list: Danh sách lỗi (rỗng nếu hợp lệ)
+    """
+    if not isinstance(timeline, dict):
+        return ["Timeline phải là object/dict"]
+
+    items = timeline.get("items")
+    if not isinstance(items, list) or not items:
+        return ["Timeline phải có danh sách 'items' không rỗng"]
+
+    errors = []
+    for i, item in enumerate(items):
+        prefix = f"items[{i}]"
+        if not isinstance(item, dict):
+            errors.append(f"{prefix}: phải là object")
+            continue
+
+        item_type = item.get("type", "image")
+        if item_type not in ITEM_TYPES:
+            errors.append(f"{prefix}: type '{item_type}' không hỗ trợ (chỉ {', '.join(ITEM_TYPES)})")
+
+        if not item.get("file"):
+            errors.append(f"{prefix}: thiếu 'file'")
+        elif base_dir and not os.path.exists(os.path.join(base_dir, item["file"])):
+            errors.append(f"{prefix}: không tìm thấy file {item['file']}")
+
+        start = item.get("start")
+        if not isinstance(start, (int, float)) or start < 0:
+            errors.append(f"{prefix}: 'start' phải là số >= 0")
+        else:
+            end = item.get("end")
+            duration = item.get("duration")
+            if end is None and duration is None:
+                errors.append(f"{prefix}: cần 'end' hoặc 'duration'")
+            elif end is not None and (not isinstance(end, (int, float)) or end <= start):
+                errors.append(f"{prefix}: 'end' phải lớn hơn 'start'")
+            elif duration is not None and (not isinstance(duration, (int, float)) or duration <= 0):
+                errors.append(f"{prefix}: 'duration' phải > 0")
+
+        seek = item.get("seek", 0)
+        if not isinstance(seek, (int, float)) or seek < 0:
+            errors.append(f"{prefix}: 'seek' phải là số >= 0")
+        elif seek and item_type != "video":
+            errors.append(f"{prefix}: 'seek' chỉ dùng cho video")
+
+        scale = item.get("scale", 0.2)
+        if not isinstance(scale, (int, float)) or not 0 < scale <= 4:
+            errors.append(f"{prefix}: 'scale' phải trong khoảng (0, 4]")
+
+        errors.extend(_validate_position(prefix, item.get("position", "center")))
+
+        animation = item.get("animation")
+        if animation is not None:
+            anim_type = animation.get("type") if isinstance(animation, dict) else animation
+            if anim_type not in ANIMATION_TYPES:
+                errors.append(f"{prefix}: animation '{anim_type}' không hỗ trợ")
+
+        chroma = item.get("chroma")
+        if chroma is not None:
+            if item_type != "video":
+                errors.append(f"{prefix}: 'chroma' chỉ dùng cho video")
+            elif not isinstance(chroma, dict):
+                errors.append(f"{prefix}: 'chroma' phải là object")
+            else:
+                for key in ("similarity", "blend"):
+                    value = chroma.get(key, 0.1)
+                    if not isinstance(value, (int, float)) or not 0 < value <= 0.5:
+                        errors.append(f"{prefix}: chroma.{key} phải trong khoảng (0, 0.5]")
+
+    return errors
+
+def _validate_position(prefix, position):
+    """Kiểm tra vị trí: tên preset hoặc {x, y} tương đối (0-1) / 'center'"""
+    if isinstance(position, str):
+        if position not in POSITION_PRESETS:
+            return [f"{prefix}: position '{position}' không hỗ trợ"]
+        return []
+
+    if not isinstance(position, dict):
+        return [f"{prefix}: position phải là tên preset hoặc {{x, y}}"]
+
+    errors = []
+    for axis in ("x", "y"):
+        value = position.get(axis, "center")
+        if value == "center":
+            continue
+        if not isinstance(value, (int, float)) or not 0 <= value <= 1:
+            errors.append(f"{prefix}: position.{axis} phải là 'center' hoặc số trong [0, 1]")
+    return errors
+
+def _normalize_timeline(timeline):
+    """Chuẩn hóa các giá trị mặc định để compiler không phải kiểm tra lại"""
+    items = []
+    for item in timeline["items"]:
+        start = float(item["start"])
+        end = float(item["end"]) if item.get("end") is not None else start + float(item["duration"])
+
+        animation = item.get("animation") or "none"
+        if isinstance(animation, str):
+            animation = {"type": animation, "duration": 0.5}
+
+        chroma = item.get("chroma")
+        if chroma is not None:
+            chroma = {
+                "color": chroma.get("color", "green"),
+                "similarity": float(chroma.get("similarity", 0.1)),
+                "blend": float(chroma.get("blend", 0.1))
+            }
+
+        items.append({
+            "type": item.get("type", "image"),
+            "file": item["file"],
+            "start": start,
+            "end": end,
+            "seek": float(item.get("seek", 0)),
+            "position": item.get("position", "center"),
+            "scale": float(item.get("scale", 0.2)),
+            "animation": {
+                "type": animation.get("type", "none"),
+                "duration": float(animation.get("duration", 0.5))
+            },
+            "chroma": chroma
+        })
+
+    # Sắp xếp theo thời gian bắt đầu để overlay chain ổn định
+    items.sort(key=lambda entry: entry["start"])
+    return {"name": timeline.get("name", "timeline"), "items": items}
+
+def timeline_hash(timeline):
+    """Hash nội dung timeline (dùng làm key cache)"""
+    payload = json.dumps(timeline, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def probe_canvas_size(video_path):
+    """
+    Lấy kích thước khung hình (width, height) của video bằng ffprobe
+
+    Returns:
+        tuple: (width, height), mặc định (1080, 1920) nếu không đọc được
+    """
+    try:
+        cmd = [
+            'ffprobe', '-v', 'error',
+            '-select_streams', 'v:0',
+            '-show_entries', 'stream=width,height',
+            '-of', 'csv=p=0:s=x',
+            video_path
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+        if result.returncode == 0 and result.stdout.strip():
+            width, height = result.stdout.strip().split('x')[:2]
+            return int(width), int(height)
+    except Exception as e:
+        print(f"⚠️ Không thể lấy kích thước video: {e}")
+
+    return 1080, 1920
+
+
+class CompiledTimeline:
+    """Timeline đã compile cho một kích thước khung hình, gắn được vào FilterGraph"""
+
+    def __init__(self, overlays, items):
+        self.overlays = overlays  # AnimatedOverlay theo thứ tự item
+        self.items = items        # Các item thực sự được render
+
+    def apply(self, graph, base):
+        """
+        Thêm toàn bộ overlay của timeline lên stream nền
+
+        Args:
+            graph (FilterGraph): Graph đang dựng
+            base (Stream): Video nền (vd input 0 hoặc stream đã ghép phụ đề)
+
+        Returns:
+            Stream: Stream sau khi overlay
+        """
+        current = base
+        for item, overlay in zip(self.items, self.overlays):
+            current = overlay.apply(graph, current, item["start"], item["end"])
+        return current
+
+
+_compiled_cache = {}
+_compiled_cache_lock = threading.Lock()
+
+def compile_timeline(timeline, canvas_size, base_dir=None):
+    """
+    Compile timeline thành filter graph, có cache theo (timeline, canvas size)
+
+    Args:
+        timeline (dict | str): Timeline hoặc đường dẫn file timeline
+        canvas_size (tuple): (width, height) của video nền
+        base_dir (str, optional): Thư mục chứa file overlay
+
+    Returns:
+        CompiledTimeline: Graph đã compile (items rỗng nếu không có file nào)
+    """
+    # load_timeline chuẩn hóa idempotent nên gọi lại với timeline đã load vẫn an toàn
+    timeline = load_timeline(timeline)
+
+    base_dir = os.path.abspath(base_dir or ".")
+    cache_key = (timeline_hash(timeline), tuple(canvas_size), base_dir)
+
+    with _compiled_cache_lock:
+        if cache_key in _compiled_cache:
+            return _compiled_cache[cache_key]
+
+    compiled = _compile(timeline, canvas_size, base_dir)
+
+    with _compiled_cache_lock:
+        _compiled_cache[cache_key] = compiled
+    return compiled
+
+def _compile(timeline, canvas_size, base_dir):
+    """
+    Dựng CompiledTimeline cho timeline đã chuẩn hóa: mỗi item là một AnimatedOverlay
+    (hàm dựng node input/filter vào FilterGraph), apply() nối chúng lên stream nền
+    """
+    from animation_engine import AnimatedOverlay, build_image_animation
+
+    canvas_width, canvas_height = canvas_size
+
+    # Bỏ qua item thiếu file (giống hành vi cũ), báo cảnh báo
+    items = []
+    for item in timeline["items"]:
+        path = os.path.join(base_dir, item["file"])
+        if os.path.exists(path):
+            items.append({**item, "path": path})
+        else:
+            print(f"⚠️ Timeline: không tìm thấy {path}, bỏ qua...")
+
+    overlays = []
+    for i, item in enumerate(items):
+        duration = item["end"] - item["start"]
+        animation = item["animation"]
+        x_pos, y_pos = _resolve_position(item["position"], canvas_width, canvas_height)
+
+        if item["type"] == "image":
+            # Ảnh: keyframe tính trước (sprite + sendcmd) qua animation engine
+            overlays.append(build_image_animation(
+                item["path"], item["scale"], animation["type"], item["start"], duration,
+                animation["duration"], x_pos, y_pos, f"timeline{i}"
+            ))
+        else:
+            overlays.append(AnimatedOverlay(_video_item_builder(item, duration, x_pos, y_pos)))
+
+    return CompiledTimeline(overlays, items)
+
+def _video_item_builder(item, duration, x_pos, y_pos):
+    """Tạo hàm dựng stream cho item video (cắt input, dời thời gian, scale, chroma key)"""
+    from animation_engine import expression_animation
+    from video_overlay import _trimmed_input_options, get_chroma_color
+
+    animation = item["animation"]
+
+    def build(graph):
+        stream = graph.input(item["path"], _trimmed_input_options(seek=item["seek"], duration=duration))
+        stream = graph.shift_pts(stream, item["start"])
+        stream = graph.scale_by(stream, item["scale"])
+        if item["chroma"]:
+            chroma = item["chroma"]
+            color = chroma["color"]
+            if not str(color).startswith("0x"):
+                color = get_chroma_color(color)
+            stream = graph.filter(stream, 'chromakey', color, chroma['similarity'], chroma['blend'])
+        if animation["type"] == "none":
+            return stream, x_pos, y_pos
+        # Video không render sprite được, dùng biểu thức FFmpeg
+        return expression_animation(graph, stream, animation["type"], item["start"], duration,
+                                    animation["duration"], x_pos, y_pos)
+
+    return build
+
+def _resolve_position(position, canvas_width, canvas_height):
+    """Đổi vị trí tương đối theo khung hình sang tọa độ pixel cho overlay"""
+    if isinstance(position, str):
+        return POSITION_PRESETS[position]
+
+    x = position.get("x", "center")
+    y = position.get("y", "center")
+    x_pos = POSITION_PRESETS["center"][0] if x == "center" else str(int(round(x * canvas_width)))
+    y_pos = POSITION_PRESETS["center"][1] if y == "center" else str(int(round(y * canvas_height)))
+    return x_pos, y_pos
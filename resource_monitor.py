@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Module theo dõi tài nguyên hệ thống bằng một thread lấy mẫu nền
+
+psutil.cpu_percent(interval=1) chặn cả giây mỗi lần gọi. Ở đây một daemon
+thread duy nhất lấy mẫu CPU, RAM, disk trống và tốc độ I/O đĩa mỗi
+`interval` giây, giữ cửa sổ các mẫu gần nhất; nơi cần kiểm tra (admission
+của batch, get_progress, GUI) chỉ đọc snapshot đã cache, không chặn.
+
+    sampler = get_sampler()
+    snapshot = sampler.snapshot()   # {'cpu_percent', 'cpu_percent_avg', 'memory_available_gb', ...}
+"""
+
+import time
+import threading
+from collections import deque
+
+import psutil
+
+SAMPLE_INTERVAL = 1.0  # giây giữa hai mẫu
+WINDOW_SIZE = 10       # số mẫu giữ lại (trung bình CPU / I/O trên cửa sổ này)
+
+class ResourceSampler:
+    """Lấy mẫu tài nguyên định kỳ trên daemon thread, đọc snapshot thread-safe"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL, window=WINDOW_SIZE, disk_path='.'):
+        self.interval = interval
+        self.disk_path = disk_path
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stop_event = threading.Event()
+        self._last_io = None
+
+    def start(self):
+        """Chạy thread lấy mẫu (gọi nhiều lần không tạo thêm thread)"""
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return self
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, name='resource-sampler', daemon=True)
+
+        # Mẫu đầu tiên đo trên khoảng ngắn để snapshot có số liệu ngay
+        self._sample(cpu_interval=0.1)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self._sample()
+            except Exception as e:
+                print(f"⚠️ Lỗi lấy mẫu tài nguyên: {e}")
+
+    def _read_io(self):
+        try:
+            counters = psutil.disk_io_counters()
+        except Exception:
+            counters = None
+        return (time.monotonic(), counters)
+
+    def _sample(self, cpu_interval=None):
+        # interval=None: % CPU kể từ lần gọi trước (tức là từ mẫu trước), không chặn
+        cpu_percent = psutil.cpu_percent(interval=cpu_interval)
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage(self.disk_path)
+
+        now, io = self._read_io()
+        read_rate = write_rate = 0.0
+        if io and self._last_io and self._last_io[1]:
+            elapsed = max(now - self._last_io[0], 1e-6)
+            read_rate = (io.read_bytes - self._last_io[1].read_bytes) / elapsed
+            write_rate = (io.write_bytes - self._last_io[1].write_bytes) / elapsed
+        self._last_io = (now, io)
+
+        sample = {
+            'time': time.time(),
+            'cpu_percent': cpu_percent,
+            'memory_total_gb': memory.total / 1024**3,
+            'memory_usage_gb': (memory.total - memory.available) / 1024**3,
+            'memory_available_gb': memory.available / 1024**3,
+            'memory_percent': memory.percent,
+            'disk_free_gb': disk.free / 1024**3,
+            'io_read_mb_s': read_rate / 1024**2,
+            'io_write_mb_s': write_rate / 1024**2
+        }
+        with self.lock:
+            self.samples.append(sample)
+
+    def snapshot(self):
+        """
+        Số liệu mới nhất kèm trung bình trên cửa sổ (không chặn)
+
+        Returns:
+            dict: Mẫu mới nhất + 'cpu_percent_avg', 'io_read_mb_s_avg',
+                'io_write_mb_s_avg', 'sample_age' (giây từ lúc lấy mẫu)
+        """
+        if not self.thread:
+            self.start()
+        with self.lock:
+            samples = list(self.samples)
+
+        latest = dict(samples[-1])
+        latest['cpu_percent_avg'] = sum(s['cpu_percent'] for s in samples) / len(samples)
+        latest['io_read_mb_s_avg'] = sum(s['io_read_mb_s'] for s in samples) / len(samples)
+        latest['io_write_mb_s_avg'] = sum(s['io_write_mb_s'] for s in samples) / len(samples)
+        latest['sample_age'] = time.time() - latest['time']
+        return latest
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+def get_sampler():
+    """Sampler dùng chung cho cả ứng dụng (khởi chạy ở lần gọi đầu)"""
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = ResourceSampler().start()
+        return _sampler
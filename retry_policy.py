@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Module phân loại lỗi để quyết định có chạy lại job hay không
+
+- permanent: input mất / hỏng, codec không hỗ trợ... chạy lại vẫn lỗi, không retry
+- transient: mạng, thiếu RAM/ổ đĩa, tiến trình bị kill... retry sau thời gian chờ tăng dần
+- unknown: lỗi khác, vẫn retry (như trước) nhưng cũng có thời gian chờ
+"""
+
+import os
+import re
+import errno
+
+PERMANENT = 'permanent'
+TRANSIENT = 'transient'
+UNKNOWN = 'unknown'
+
+# Thông điệp (FFmpeg / ffprobe / module trong repo) cho thấy input không dùng được.
+# Thắng cả dấu hiệu tạm thời: file hỏng thì chạy lại vẫn hỏng
+PERMANENT_MARKERS = (
+    'invalid data found when processing input',
+    'moov atom not found',
+    'unsupported codec',
+    'decoder not found',
+    'could not find codec parameters',
+    'không tìm thấy stream video',
+    'video không tồn tại',
+    'does not contain any stream',
+)
+
+# Chuỗi lỗi errno chung, chỉ vĩnh viễn khi không có dấu hiệu tạm thời
+# (stderr FFmpeg của lỗi I/O thường kèm "invalid argument")
+WEAK_PERMANENT_MARKERS = (
+    'no such file or directory',
+    'invalid argument',
+)
+
+# So khớp theo từ (sau khi đã bỏ đường dẫn khỏi thông điệp); mã HTTP phải đi kèm
+# HTTP / status / server returned, tránh khớp số trong tên file (clip_20240429.mp4)
+TRANSIENT_PATTERNS = tuple(re.compile(pattern) for pattern in (
+    r'\bconnection (?:reset|refused|timed out|closed|aborted)',
+    r'\btimed out\b',
+    r'\btimeout\b',
+    r'\btemporarily unavailable\b',
+    r'\bservice unavailable\b',
+    r'\btoo many requests\b',
+    r'\b(?:http|status|server returned)\D{0,16}\b(?:429|503)\b',
+    r'\bcannot allocate memory\b',
+    r'\bout of memory\b',
+    r'\bno space left on device\b',
+    r'\bkilled\b',
+    r'\bbroken pipe\b',
+))
+
+# Token chứa dấu phân cách thư mục hoặc là tên file có phần mở rộng
+PATH_TOKEN = re.compile(r"[^\s'\"]*[/\\][^\s'\"]*|[\w.\-]+\.[a-z0-9]{2,4}\b")
+
+TRANSIENT_ERRNOS = {errno.ENOMEM, errno.ENOSPC, errno.EAGAIN, errno.ETIMEDOUT,
+                    errno.ECONNRESET, errno.ECONNREFUSED, errno.EPIPE}
+
+RETRY_BASE_DELAY = 5.0   # giây trước lần retry đầu
+RETRY_MAX_DELAY = 300.0
+
+def _strip_paths(message, paths=()):
+    """Bỏ đường dẫn / tên file khỏi thông điệp lỗi (số trong tên file không phải mã lỗi)"""
+    for path in paths:
+        if path:
+            for variant in (os.path.abspath(path), path, os.path.basename(path)):
+                message = message.replace(variant.lower(), ' ')
+    return PATH_TOKEN.sub(' ', message)
+
+def classify_error(error, input_path=None, output_path=None):
+    """
+    Phân loại lỗi của một job
+
+    Args:
+        error (Exception): Lỗi bắt được
+        input_path (str, optional): Input của job, mất file thì là lỗi vĩnh viễn
+        output_path (str, optional): Output của job, bỏ khỏi thông điệp trước khi so khớp
+
+    Returns:
+        str: PERMANENT, TRANSIENT hoặc UNKNOWN
+    """
+    if input_path and not os.path.exists(input_path):
+        return PERMANENT
+    if isinstance(error, (MemoryError, ConnectionError, TimeoutError)):
+        return TRANSIENT
+    if isinstance(error, FileNotFoundError):
+        return PERMANENT
+    if isinstance(error, OSError) and error.errno in TRANSIENT_ERRNOS:
+        return TRANSIENT
+
+    message = _strip_paths(str(error).lower(), (input_path, output_path))
+    if any(marker in message for marker in PERMANENT_MARKERS):
+        return PERMANENT
+    if any(pattern.search(message) for pattern in TRANSIENT_PATTERNS):
+        return TRANSIENT
+    if any(marker in message for marker in WEAK_PERMANENT_MARKERS):
+        return PERMANENT
+    return UNKNOWN
+
+def retry_delay(attempt):
+    """Thời gian chờ trước lần retry thứ attempt (1, 2, ...): tăng gấp đôi, có trần"""
+    return min(RETRY_BASE_DELAY * 2 ** (attempt - 1), RETRY_MAX_DELAY)
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Module split-encode: render song song một video dài theo segment
+
+Video nguồn được cắt (stream copy) tại keyframe thành N đoạn, mỗi đoạn chạy
+pipeline đầy đủ (9:16 + overlay + phụ đề) trong tiến trình FFmpeg riêng với
+phụ đề/overlay đã dời mốc thời gian về đầu đoạn, rồi ghép lại bằng concat
+demuxer (không encode lại). Audio lấy thẳng từ nguồn khi ghép nên không bị
+hở/chồng tại điểm nối.
+
+Điểm cắt được chọn gần các mốc chia đều, tránh rơi vào giữa cửa sổ hiển thị
+overlay để animation không bị cắt đôi.
+"""
+
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from stage_planner import probe_video
+from encoder_profiles import get_encoder_profile, INTERMEDIATE_PROFILE
+from ffmpeg_runner import run_ffmpeg, run_streaming, progress_context, current_context
+from job_control import current_token, cancel_scope
+from instrumentation import span
+
+MIN_SEGMENT_SECONDS = 10     # Đoạn ngắn hơn thì chi phí khởi động FFmpeg không đáng
+THREADS_PER_SEGMENT = 4      # libx264 scale tốt tới khoảng 4 luồng mỗi encoder
+
+def find_keyframes(video_path, ffprobe_path='ffprobe'):
+    """
+    Lấy thời điểm các keyframe của stream video (đọc packet, không decode)
+
+    Danh sách packet được xử lý từng dòng khi ffprobe ghi ra (file dài có rất
+    nhiều packet), tiến trình đăng ký với job để hủy / tạm dừng được.
+
+    Returns:
+        list: Thời điểm (giây, tính từ đầu file) tăng dần
+    """
+    cmd = [
+        ffprobe_path,
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0',
+        video_path
+    ]
+    times = set()
+
+    def collect(line):
+        parts = line.strip().split(',')
+        if len(parts) >= 2 and 'K' in parts[1] and parts[0] not in ('', 'N/A'):
+            times.add(float(parts[0]))
+
+    result = run_streaming(cmd, collect, stage='keyframes')
+    if result.returncode != 0:
+        raise Exception(f"Lỗi đọc keyframe: {result.stderr}")
+    times = sorted(times)
+
+    # -ss của FFmpeg tính từ đầu file, không phải từ pts tuyệt đối
+    if times:
+        offset = times[0]
+        times = [t - offset for t in times]
+    return times
+
+def plan_segments(keyframes, duration, count, busy_windows=(), min_length=MIN_SEGMENT_SECONDS):
+    """
+    Chọn điểm cắt tại keyframe gần các mốc chia đều
+
+    Args:
+        keyframes (list): Thời điểm keyframe
+        duration (float): Độ dài video
+        count (int): Số segment mong muốn
+        busy_windows (list): [(start, end)] khoảng overlay đang hiện, tránh cắt vào giữa
+        min_length (float): Độ dài tối thiểu mỗi segment
+
+    Returns:
+        list: [(start, end)] các segment liên tiếp phủ toàn bộ video
+    """
+    count = max(1, min(int(count), int(duration // min_length)))
+    candidates = [t for t in keyframes if min_length <= t <= duration - min_length]
+    free = [t for t in candidates if not any(start < t < end for start, end in busy_windows)]
+    pool = free or candidates
+
+    cuts = []
+    for i in range(1, count):
+        ideal = duration * i / count
+        lower = (cuts[-1] if cuts else 0) + min_length
+        options = [t for t in pool if t >= lower]
+        if not options:
+            break
+        cuts.append(min(options, key=lambda t: abs(t - ideal)))
+
+    boundaries = [0.0] + sorted(set(cuts)) + [duration]
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+# ===== DỜI MỐC THỜI GIAN THEO SEGMENT =====
+
+def _parse_srt_time(value):
+    hours, minutes, rest = value.strip().replace('.', ',').split(':')
+    seconds, milliseconds = rest.split(',')
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds) + int(milliseconds) / 1000
+
+def _format_srt_time(seconds):
+    milliseconds = int(round(max(seconds, 0) * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d},{milliseconds:03d}"
+
+def shift_subtitle(subtitle_path, start, end, output_path):
+    """
+    Ghi phụ đề của đoạn [start, end) với mốc thời gian tính từ start
+
+    Cue vắt qua điểm cắt được chia cho cả hai segment.
+
+    Returns:
+        bool: Segment có ít nhất một cue
+    """
+    with open(subtitle_path, 'r', encoding='utf-8') as f:
+        content = f.read().replace('\r\n', '\n')
+
+    entries = []
+    for block in re.split(r'\n\s*\n', content.strip()):
+        lines = block.split('\n')
+        timing_index = next((i for i, line in enumerate(lines) if '-->' in line), None)
+        if timing_index is None:
+            continue
+        cue_start, cue_end = (_parse_srt_time(part.split()[0]) for part in lines[timing_index].split('-->'))
+        if cue_end <= start or cue_start >= end:
+            continue
+        text = '\n'.join(lines[timing_index + 1:]).strip()
+        entries.append(
+            f"{len(entries) + 1}\n"
+            f"{_format_srt_time(max(cue_start, start) - start)} --> {_format_srt_time(min(cue_end, end) - start)}\n"
+            f"{text}\n"
+        )
+
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(entries))
+    return bool(entries)
+
+def shift_timeline(timeline, start, end):
+    """
+    Timeline (đã chuẩn hóa) của đoạn [start, end) tính từ start
+
+    Item bị cắt ngang: video dời điểm bắt đầu clip (seek), ảnh bỏ animation
+    vào/ra để không phát lại hiệu ứng tại điểm nối.
+
+    Returns:
+        dict | None: Timeline của segment, None nếu không có item nào
+    """
+    items = []
+    for item in timeline["items"]:
+        item_start = max(item["start"], start)
+        item_end = min(item["end"], end)
+        if item_end <= item_start:
+            continue
+
+        shifted = {**item, "start": item_start - start, "end": item_end - start}
+        if item["start"] < start or item["end"] > end:
+            if item["type"] == "video":
+                shifted["seek"] = item.get("seek", 0) + (item_start - item["start"])
+            else:
+                shifted["animation"] = {"type": "none", "duration": item["animation"]["duration"]}
+            print(f"⚠️ Segment {start:.1f}s: overlay {item['file']} bị cắt tại điểm nối")
+        items.append(shifted)
+
+    if not items:
+        return None
+    return {"name": timeline.get("name", "timeline"), "items": items}
+
+def _overlay_window(settings, default_start, default_duration):
+    """Khoảng [start, end) một video overlay hiển thị"""
+    from video_overlay import get_video_duration
+
+    overlay_start = float(settings.get('start_time', default_start))
+    duration = settings.get('duration', default_duration)
+    if not duration:
+        duration = get_video_duration(settings.get('video_path', '')) or float('inf')
+    return overlay_start, overlay_start + float(duration)
+
+def _shift_overlay_entry(settings, start, end, default_start, default_duration):
+    overlay_start, overlay_end = _overlay_window(settings, default_start, default_duration)
+    visible_start = max(overlay_start, start)
+    visible_end = min(overlay_end, end)
+    if visible_end <= visible_start:
+        return None
+    return {
+        **settings,
+        'start_time': visible_start - start,
+        'duration': visible_end - visible_start,
+        'seek': settings.get('seek', 0) + (visible_start - overlay_start)
+    }
+
+def shift_overlay_settings(settings, start, end):
+    """
+    Cấu hình video overlay (định dạng của process_video) cho đoạn [start, end)
+
+    Returns:
+        dict | None: Cấu hình đã dời mốc, None nếu overlay không hiện trong segment
+    """
+    if not settings or not settings.get('enabled', False):
+        return None
+
+    if 'multiple_overlays' in settings:
+        overlays = [_shift_overlay_entry(entry, start, end, 0, None) for entry in settings['multiple_overlays']]
+        overlays = [entry for entry in overlays if entry]
+        return {**settings, 'multiple_overlays': overlays} if overlays else None
+
+    # Mặc định giống process_video: start_time=2, duration=10
+    return _shift_overlay_entry(settings, start, end, 2, 10)
+
+def overlay_busy_windows(video_overlay_settings=None, timeline=None):
+    """Các khoảng có overlay đang hiện (để planner tránh cắt vào giữa)"""
+    windows = []
+    if timeline:
+        windows.extend((item["start"], item["end"]) for item in timeline["items"])
+    if video_overlay_settings and video_overlay_settings.get('enabled', False):
+        if 'multiple_overlays' in video_overlay_settings:
+            windows.extend(_overlay_window(entry, 0, None) for entry in video_overlay_settings['multiple_overlays'])
+        else:
+            windows.append(_overlay_window(video_overlay_settings, 2, 10))
+    return windows
+
+# ===== CẮT / RENDER / GHÉP =====
+
+def split_source(ffmpeg_path, input_path, ranges, output_dir):
+    """Cắt nguồn thành các segment bằng stream copy (điểm cắt là keyframe nên chính xác)"""
+    paths = []
+    for i, (start, end) in enumerate(ranges):
+        segment_path = os.path.join(output_dir, f"source_{i:03d}.mkv")
+        cmd = [
+            ffmpeg_path,
+            '-ss', f'{start:.3f}',
+            '-i', input_path,
+            '-t', f'{end - start:.3f}',
+            '-map', '0:v:0',
+            '-map', '0:a?',
+            '-c', 'copy',
+            '-avoid_negative_ts', 'make_zero',
+            '-y',
+            segment_path
+        ]
+        result = run_ffmpeg(cmd)
+        if result.returncode != 0:
+            raise Exception(f"Lỗi cắt segment {i}: {result.stderr}")
+        paths.append(segment_path)
+    return paths
+
+def concat_segments(ffmpeg_path, segment_paths, audio_source, output_path, list_dir, duration=None):
+    """Ghép segment (video) bằng concat demuxer, lấy audio gốc từ audio_source"""
+    list_path = os.path.join(list_dir, "segments.txt")
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for path in segment_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    cmd = [
+        ffmpeg_path,
+        '-f', 'concat',
+        '-safe', '0',
+        '-i', list_path,
+        '-i', audio_source,
+        '-map', '0:v:0',
+        '-map', '1:a?',
+        '-c', 'copy',
+        '-movflags', '+faststart',
+        '-y',
+        output_path
+    ]
+    result = run_ffmpeg(cmd, duration=duration)
+    if result.returncode != 0:
+        raise Exception(f"Lỗi ghép segment: {result.stderr}")
+
+def process_video_segmented(editor, input_video_path, output_video_path, segments=None,
+                            enable_subtitle=True, source_language='vi', target_language='en',
+                            words_per_line=7, video_overlay_settings=None, custom_timeline=False,
+                            timeline=None, img_folder=None, encoder_profile=None,
+                            intermediate_profile=INTERMEDIATE_PROFILE, **process_kwargs):
+    """
+    Xử lý một video dài bằng split-encode
+
+    Args:
+        editor (AutoVideoEditor): Editor dùng để render từng segment
+        segments (int | None): Số segment, None = số CPU / THREADS_PER_SEGMENT
+        Các tham số còn lại giống AutoVideoEditor.process_video
+    """
+    from overlay_timeline import load_timeline, get_default_timeline_path
+
+    ffmpeg_path = editor.aspect_converter.ffmpeg_path
+    cpu_count = os.cpu_count() or 1
+    if segments is None:
+        segments = max(1, cpu_count // THREADS_PER_SEGMENT)
+
+    duration = probe_video(input_video_path)['duration']
+    temp_dir = tempfile.mkdtemp(prefix="editvideo_segments_")
+
+    try:
+        # Phụ đề tạo một lần cho cả video, sau đó chia theo segment
+        subtitle_path = None
+        if enable_subtitle:
+            subtitle_path = editor.prepare_subtitle(
+                input_video_path, temp_dir, source_language, target_language, words_per_line
+            )
+
+        full_timeline = None
+        if (custom_timeline or timeline) and img_folder and os.path.exists(img_folder):
+            full_timeline = load_timeline(timeline or get_default_timeline_path("custom_timeline"))
+
+        ranges = plan_segments(
+            find_keyframes(input_video_path), duration, segments,
+            overlay_busy_windows(video_overlay_settings, full_timeline)
+        )
+
+        if len(ranges) <= 1:
+            print("⚠️ Video quá ngắn hoặc ít keyframe để chia segment, xử lý một lần")
+            return editor.process_video(
+                input_video_path, output_video_path, segments=1,
+                enable_subtitle=enable_subtitle, subtitle_path=subtitle_path,
+                source_language=source_language, target_language=target_language,
+                words_per_line=words_per_line, video_overlay_settings=video_overlay_settings,
+                custom_timeline=custom_timeline, timeline=timeline, img_folder=img_folder,
+                encoder_profile=encoder_profile, intermediate_profile=intermediate_profile,
+                **process_kwargs
+            )
+
+        # Chia đều luồng encoder cho các segment chạy song song
+        threads = max(1, cpu_count // len(ranges))
+        final_profile = {**get_encoder_profile(encoder_profile), 'threads': threads}
+        temp_profile = {**get_encoder_profile(intermediate_profile), 'threads': threads}
+
+        print(f"✂️ Split-encode: {len(ranges)} segment, {threads} luồng encoder/segment")
+        for i, (start, end) in enumerate(ranges):
+            print(f"   🎞️ Segment {i}: {start:.2f}s - {end:.2f}s")
+
+        with progress_context(stage='split'), span('split', segments=len(ranges)):
+            source_paths = split_source(ffmpeg_path, input_video_path, ranges, temp_dir)
+
+        # Thread của executor không kế thừa ngữ cảnh tiến độ / token hủy, truyền tay vào
+        context = current_context()
+        token = current_token()
+
+        def render(index):
+            start, end = ranges[index]
+            segment_subtitle = None
+            if subtitle_path:
+                shifted_path = os.path.join(temp_dir, f"subtitle_{index:03d}.srt")
+                if shift_subtitle(subtitle_path, start, end, shifted_path):
+                    segment_subtitle = shifted_path
+
+            segment_timeline = shift_timeline(full_timeline, start, end) if full_timeline else None
+            segment_output = os.path.join(temp_dir, f"segment_{index:03d}.mp4")
+
+            with progress_context(**context, segment=index, segment_count=len(ranges)), cancel_scope(token):
+                editor.process_video(
+                    source_paths[index], segment_output, segments=1,
+                    enable_subtitle=bool(segment_subtitle), subtitle_path=segment_subtitle,
+                    source_language=source_language, target_language=target_language,
+                    words_per_line=words_per_line,
+                    video_overlay_settings=shift_overlay_settings(video_overlay_settings, start, end),
+                    custom_timeline=bool(segment_timeline), timeline=segment_timeline,
+                    img_folder=img_folder, encoder_profile=final_profile,
+                    intermediate_profile=temp_profile, force_encode=True,
+                    **process_kwargs
+                )
+            return segment_output
+
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            segment_outputs = list(executor.map(render, range(len(ranges))))
+
+        print("🔗 Ghép các segment (không encode lại)...")
+        with progress_context(stage='concat'), span('concat', segments=len(segment_outputs)):
+            concat_segments(ffmpeg_path, segment_outputs, input_video_path, output_video_path, temp_dir,
+                            duration=duration)
+        print(f"✅ Split-encode hoàn thành: {output_video_path}")
+
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
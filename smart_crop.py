@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Module smart crop: reframe video ngang thành 9:16 theo chủ thể
+
+Phân tích trên frame nhỏ (2 fps, rộng 320px, grayscale) đọc từ pipe FFmpeg,
+từng frame được xử lý ngay khi đọc (chỉ giữ tâm của mỗi mẫu):
+- Phát hiện cắt cảnh bằng chênh lệch histogram giữa hai mẫu liên tiếp
+- Tâm chủ thể mỗi mẫu: khuôn mặt lớn nhất (OpenCV) hoặc trọng tâm năng lượng gradient
+- Làm mượt tâm trong từng shot (không làm mượt qua điểm cắt cảnh)
+Đường crop được ghi thành file sendcmd điều khiển một filter crop duy nhất.
+"""
+
+import os
+import hashlib
+import tempfile
+
+from ffmpeg_runner import run_streaming
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+try:
+    import cv2
+    HAS_CV2 = True
+except ImportError:
+    HAS_CV2 = False
+
+ANALYSIS_FPS = 2              # Số frame phân tích mỗi giây
+ANALYSIS_WIDTH = 320          # Chiều rộng frame phân tích
+SCENE_CUT_THRESHOLD = 0.35    # Ngưỡng chênh lệch histogram (0-1) coi là cắt cảnh
+SMOOTHING_WINDOW = 2.0        # Cửa sổ làm mượt tâm crop (giây)
+CROP_INSTANCE = "smartcrop"   # Tên instance crop@smartcrop cho sendcmd
+
+
+def frame_histogram(frame):
+    """Histogram 16 bin đã chuẩn hóa của một frame grayscale"""
+    histogram = np.bincount(frame.ravel() >> 4, minlength=16).astype(float)
+    return histogram / histogram.sum()
+
+def analyze_frames(ffmpeg_path, video_path, source_size, fps=ANALYSIS_FPS, width=ANALYSIS_WIDTH,
+                   threshold=SCENE_CUT_THRESHOLD):
+    """
+    Decode video ở fps thấp + độ phân giải nhỏ, grayscale, và phân tích từng
+    frame ngay khi đọc từ pipe
+
+    Mỗi mẫu chỉ giữ lại tâm chủ thể (và histogram của mẫu trước để phát hiện
+    cắt cảnh), không giữ frame: bộ nhớ không tăng theo độ dài video. Tiến
+    trình đăng ký với job nên hủy / tạm dừng có tác dụng.
+
+    Args:
+        ffmpeg_path (str): Đường dẫn FFmpeg
+        video_path (str): Video nguồn
+        source_size (tuple): (width, height) của video nguồn
+        threshold (float): Khoảng cách histogram (0-1) giữa hai mẫu liên tiếp coi là cắt cảnh
+
+    Returns:
+        tuple: (tâm ngang 0-1 của từng mẫu, chỉ số mẫu bắt đầu mỗi shot (luôn có 0))
+    """
+    source_width, source_height = source_size
+    height = max(2, int(round(width * source_height / source_width / 2)) * 2)
+
+    cmd = [
+        ffmpeg_path,
+        '-v', 'error',
+        '-i', video_path,
+        '-an', '-sn',
+        '-vf', f'fps={fps},scale={width}:{height},format=gray',
+        '-f', 'rawvideo',
+        'pipe:1'
+    ]
+    centers = []
+    cuts = [0]
+    previous = None
+
+    def analyze(record):
+        nonlocal previous
+        frame = np.frombuffer(record, dtype=np.uint8).reshape(height, width)
+        histogram = frame_histogram(frame)
+        # Khoảng cách tổng biến thiên (0 = giống hệt, 1 = khác hoàn toàn)
+        if previous is not None and 0.5 * np.abs(histogram - previous).sum() > threshold:
+            cuts.append(len(centers))
+        previous = histogram
+        centers.append(subject_center(frame))
+
+    result = run_streaming(cmd, analyze, record_size=width * height, stage='smart_crop_analysis')
+    if result.returncode != 0:
+        raise Exception(f"Lỗi decode frame phân tích: {result.stderr}")
+    if not centers:
+        raise Exception("Không đọc được frame nào để phân tích")
+
+    return centers, cuts
+
+_face_detector = None
+
+def _get_face_detector():
+    """Haar cascade khuôn mặt có sẵn trong OpenCV (load một lần)"""
+    global _face_detector
+    if _face_detector is None:
+        cascade_path = os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml')
+        _face_detector = cv2.CascadeClassifier(cascade_path)
+    return _face_detector
+
+def subject_center(frame):
+    """
+    Tâm chủ thể theo chiều ngang (0-1) của một frame phân tích
+
+    Ưu tiên khuôn mặt lớn nhất; nếu không có OpenCV hoặc không thấy mặt,
+    dùng trọng tâm năng lượng gradient theo cột (vùng nhiều chi tiết).
+    """
+    width = frame.shape[1]
+
+    if HAS_CV2:
+        faces = _get_face_detector().detectMultiScale(frame, scaleFactor=1.1, minNeighbors=4, minSize=(16, 16))
+        if len(faces):
+            x, y, w, h = max(faces, key=lambda face: face[2] * face[3])
+            return (x + w / 2) / width
+
+    pixels = frame.astype(np.float32)
+    gradient = np.abs(np.diff(pixels, axis=1))[:-1, :] + np.abs(np.diff(pixels, axis=0))[:, :-1]
+    column_energy = gradient.sum(axis=0)
+    total = column_energy.sum()
+    if total <= 0:
+        return 0.5
+    return float((np.arange(len(column_energy)) + 0.5) @ column_energy / total / width)
+
+def compute_crop_path(centers, cuts, fps=ANALYSIS_FPS, smoothing_window=SMOOTHING_WINDOW):
+    """
+    Tính đường tâm crop đã làm mượt theo từng shot
+
+    Args:
+        centers (list): Tâm chủ thể của từng mẫu (từ analyze_frames)
+        cuts (list): Chỉ số mẫu bắt đầu mỗi shot (từ analyze_frames)
+
+    Returns:
+        list: [(thời điểm giây, tâm ngang 0-1)]
+    """
+    centers = np.asarray(centers, dtype=float)
+    cuts = list(cuts) + [len(centers)]
+
+    window = max(1, int(round(smoothing_window * fps)))
+    smoothed = np.empty_like(centers)
+    for shot_start, shot_end in zip(cuts[:-1], cuts[1:]):
+        shot = centers[shot_start:shot_end]
+        # Trung bình trượt có đệm biên để không kéo tâm về 0 ở đầu/cuối shot
+        pad = window // 2
+        padded = np.pad(shot, (pad, window - 1 - pad), mode='edge')
+        smoothed[shot_start:shot_end] = np.convolve(padded, np.ones(window) / window, mode='valid')
+
+    return [(i / fps, float(center)) for i, center in enumerate(smoothed)]
+
+def write_crop_commands(crop_path, source_width, crop_width, min_step=2):
+    """
+    Ghi file sendcmd cập nhật x của crop@smartcrop
+
+    Args:
+        crop_path (list): [(thời điểm, tâm 0-1)]
+        source_width (int): Chiều rộng video nguồn
+        crop_width (int): Chiều rộng vùng crop (pixel nguồn)
+        min_step (int): Chỉ gửi lệnh khi x đổi ít nhất min_step pixel
+
+    Returns:
+        tuple: (đường dẫn file lệnh, x ban đầu)
+    """
+    max_x = source_width - crop_width
+    lines = []
+    previous_x = None
+    for time, center in crop_path:
+        x = int(min(max(center * source_width - crop_width / 2, 0), max_x))
+        if previous_x is not None and abs(x - previous_x) < min_step:
+            continue
+        lines.append(f"{time:.3f} crop@{CROP_INSTANCE} x {x};")
+        previous_x = x
+
+    content = "\n".join(lines) + "\n"
+    command_dir = os.path.join(tempfile.gettempdir(), "editvideo_smart_crop")
+    os.makedirs(command_dir, exist_ok=True)
+    command_path = os.path.join(command_dir, f"{hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]}.txt")
+    with open(command_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+    initial_x = int(min(max(crop_path[0][1] * source_width - crop_width / 2, 0), max_x))
+    return command_path, initial_x
+
+def plan_smart_crop(ffmpeg_path, video_path, source_size, target_ratio):
+    """
+    Phân tích video và chuẩn bị đường crop
+
+    Args:
+        ffmpeg_path (str): Đường dẫn FFmpeg
+        video_path (str): Video nguồn
+        source_size (tuple): (width, height) video nguồn
+        target_ratio (float): Tỉ lệ width/height đích (9/16)
+
+    Returns:
+        dict: {'crop_width', 'command_path', 'initial_x', 'shots'}
+    """
+    if not HAS_NUMPY:
+        raise Exception("Smart crop cần NumPy (pip install numpy)")
+
+    source_width, source_height = source_size
+    crop_width = min(source_width, int(source_height * target_ratio) // 2 * 2)
+
+    centers, cuts = analyze_frames(ffmpeg_path, video_path, source_size)
+    crop_path = compute_crop_path(centers, cuts)
+    command_path, initial_x = write_crop_commands(crop_path, source_width, crop_width)
+
+    shots = len(cuts)
+    print(f"🎯 Smart crop: {len(centers)} mẫu phân tích, {shots} shot, "
+          f"{'khuôn mặt' if HAS_CV2 else 'gradient'} làm chủ thể")
+
+    return {
+        'crop_width': crop_width,
+        'command_path': command_path,
+        'initial_x': initial_x,
+        'shots': shots
+    }
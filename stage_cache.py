@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Module ghi nhận các stage đã hoàn thành trong thư mục làm việc của một job
+
+Khi job lỗi ở stage sau (vd burn phụ đề) và được chạy lại, các stage trước
+(trích audio, Whisper, dịch, 9:16, overlay) dùng lại file đã tạo thay vì
+chạy lại từ đầu. Manifest stages.json chỉ ghi một stage sau khi stage đó
+xong, kèm kích thước file: file dở dang do bị kill giữa chừng không được
+dùng lại. Manifest gắn với fingerprint của input + tham số, đổi cấu hình
+thì mọi artifact cũ bị bỏ qua.
+"""
+
+import os
+import json
+import hashlib
+
+MANIFEST_NAME = "stages.json"
+
+def job_fingerprint(input_path, params):
+    """Fingerprint của input (đường dẫn, kích thước, mtime) + tham số xử lý"""
+    stat = os.stat(input_path)
+    payload = json.dumps({
+        'input': os.path.abspath(input_path),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'params': params
+    }, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+class StageCache:
+    """Manifest các stage đã xong của một job"""
+
+    def __init__(self, work_dir, fingerprint):
+        self.work_dir = work_dir
+        self.fingerprint = fingerprint
+        self.manifest_path = os.path.join(work_dir, MANIFEST_NAME)
+        self.stages = {}
+
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                if manifest.get('fingerprint') == fingerprint:
+                    self.stages = manifest.get('stages', {})
+            except Exception as e:
+                print(f"⚠️ Manifest stage lỗi, chạy lại từ đầu: {e}")
+
+    def done(self, stage, path):
+        """Stage đã xong và file kết quả còn nguyên vẹn"""
+        entry = self.stages.get(stage)
+        return bool(
+            entry and entry['path'] == os.path.basename(path)
+            and os.path.exists(path) and os.path.getsize(path) == entry['size']
+        )
+
+    def mark(self, stage, path):
+        """Ghi nhận stage xong (ghi manifest qua file tạm + rename để không bị hỏng giữa chừng)"""
+        self.stages[stage] = {'path': os.path.basename(path), 'size': os.path.getsize(path)}
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'fingerprint': self.fingerprint, 'stages': self.stages}, f, indent=2)
+        os.replace(temp_path, self.manifest_path)
+
+    def completed(self):
+        return list(self.stages)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Module lập kế hoạch stage: bỏ qua / stream-copy khi một bước xử lý không
+làm thay đổi video
+
+Dựa trên metadata ffprobe và các thao tác được yêu cầu:
+- Video đã đúng kích thước đích (SAR 1:1) thì không cần scale
+- Không stage nào thay đổi video thì file gốc được copy / remux ra output
+  thay vì encode lại; file trung gian (profile nhanh) luôn qua encode_final
+"""
+
+import os
+import json
+import shutil
+import subprocess
+
+from ffmpeg_runner import run_ffmpeg, remember_duration
+from encoder_profiles import encoder_args
+
+def probe_video(video_path, ffprobe_path='ffprobe'):
+    """
+    Lấy metadata cần cho việc lập kế hoạch
+
+    Returns:
+        dict: {'width', 'height', 'sar', 'pix_fmt', 'codec', 'duration', 'has_audio'}
+    """
+    cmd = [
+        ffprobe_path,
+        '-v', 'quiet',
+        '-print_format', 'json',
+        '-show_streams',
+        '-show_format',
+        video_path
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"Lỗi lấy thông tin video: {result.stderr}")
+
+    info = json.loads(result.stdout)
+    streams = info.get('streams', [])
+    video_stream = next((s for s in streams if s.get('codec_type') == 'video'), None)
+    if not video_stream:
+        raise Exception("Không tìm thấy stream video")
+
+    duration = float(info.get('format', {}).get('duration', 0) or 0)
+    # Các lệnh FFmpeg đọc file này tính % theo độ dài đã biết, không probe lại
+    remember_duration(video_path, duration)
+
+    return {
+        'width': int(video_stream['width']),
+        'height': int(video_stream['height']),
+        'sar': video_stream.get('sample_aspect_ratio', '1:1'),
+        'pix_fmt': video_stream.get('pix_fmt'),
+        'codec': video_stream.get('codec_name'),
+        'duration': duration,
+        'has_audio': any(s.get('codec_type') == 'audio' for s in streams)
+    }
+
+def is_square_pixels(info):
+    """SAR 1:1 (hoặc không khai báo)"""
+    return info.get('sar') in (None, '', '0:1', '1:1', 'N/A')
+
+def matches_frame(info, width, height):
+    """Video đã đúng kích thước khung đích, không cần scale/pad"""
+    return info['width'] == width and info['height'] == height and is_square_pixels(info)
+
+def plan_stages(info, target_size, overlay=False, timeline=False, subtitle=False, force_encode=False):
+    """
+    Quyết định stage nào thực sự phải chạy
+
+    Args:
+        info (dict | None): Metadata từ probe_video (None = không probe được, chạy đầy đủ)
+        target_size (tuple): (width, height) khung đích
+        overlay, timeline, subtitle (bool): Các stage được yêu cầu (và khả dụng)
+        force_encode (bool): Không bỏ qua stage 9:16 (output phải do encoder của pipeline tạo ra)
+
+    Returns:
+        dict: {'aspect': 'skip' | 'encode', 'overlay', 'timeline', 'subtitle', 'encodes'}
+    """
+    aspect = 'skip' if info and not force_encode and matches_frame(info, *target_size) else 'encode'
+    plan = {
+        'aspect': aspect,
+        'overlay': bool(overlay),
+        'timeline': bool(timeline),
+        'subtitle': bool(subtitle)
+    }
+    plan['encodes'] = (aspect == 'encode') + plan['overlay'] + plan['timeline'] + plan['subtitle']
+    return plan
+
+STAGE_ORDER = ('aspect', 'overlay', 'timeline', 'subtitle')
+
+def last_stage(plan):
+    """Stage cuối cùng sẽ encode (ghi thẳng ra output, dùng profile encode cuối); None nếu không có"""
+    for stage in reversed(STAGE_ORDER):
+        if plan.get(stage) and plan[stage] != 'skip':
+            return stage
+    return None
+
+def _same_container(source_path, output_path):
+    return os.path.splitext(source_path)[1].lower() == os.path.splitext(output_path)[1].lower()
+
+def materialize(source_path, output_path, ffmpeg_path='ffmpeg'):
+    """
+    Đưa nội dung source_path (file người dùng, đã đúng khung đích) ra output_path
+    với chi phí thấp nhất
+
+    - Khác container: remux stream-copy (-c copy), không encode lại
+    - Cùng container: copy (không hardlink, để ghi đè output sau này không làm
+      hỏng file gốc)
+
+    File trung gian của pipeline (profile nhanh) không đi qua đây mà qua encode_final.
+
+    Returns:
+        str: Cách đã dùng ('skip', 'copy', 'remux')
+    """
+    if os.path.abspath(source_path) == os.path.abspath(output_path):
+        return 'skip'
+
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(output_dir, exist_ok=True)
+
+    if not _same_container(source_path, output_path):
+        cmd = [
+            ffmpeg_path,
+            '-i', source_path,
+            '-map', '0',
+            '-c', 'copy',
+            '-y',
+            output_path
+        ]
+        result = run_ffmpeg(cmd)
+        if result.returncode != 0:
+            raise Exception(f"Lỗi remux video: {result.stderr}")
+        return 'remux'
+
+    if os.path.exists(output_path):
+        os.remove(output_path)
+
+    shutil.copy2(source_path, output_path)
+    return 'copy'
+
+def encode_final(source_path, output_path, encoder_profile=None, ffmpeg_path='ffmpeg'):
+    """
+    Encode lại file trung gian ra output với profile encode cuối (audio stream-copy)
+
+    Dùng khi stage cuối theo kế hoạch lỗi và pipeline fallback về file trung gian
+    (profile nhanh): không được đưa thẳng file đó ra output bằng materialize()
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    cmd = [
+        ffmpeg_path,
+        '-i', source_path,
+        '-map', '0:v:0',
+        '-map', '0:a?',
+        *encoder_args(encoder_profile),
+        '-c:a', 'copy',
+        '-y',
+        output_path
+    ]
+    result = run_ffmpeg(cmd)
+    if result.returncode != 0:
+        raise Exception(f"Lỗi encode video cuối: {result.stderr}")
@@ -24,8 +24,10 @@ try:
 except ImportError:
     HAS_WHISPER = False
 
+WHISPER_MODEL = "base"  # Có thể đổi thành "small" hoặc "medium" (benchmark dùng "tiny")
+
 class SubtitleGenerator:
-    def __init__(self):
+    def __init__(self, model_name=WHISPER_MODEL):
         self.recognizer = None
         self.whisper_model = None
         
@@ -47,7 +49,7 @@ class SubtitleGenerator:
             print("🤖 Sử dụng OpenAI Whisper để tạo phụ đề")
             try:
                 # ✅ SỬA: Sử dụng model lớn hơn cho tiếng Trung
-                self.whisper_model = whisper.load_model("base")  # Có thể đổi thành "small" hoặc "medium"
+                self.whisper_model = whisper.load_model(model_name)
             except Exception as e:
                 print(f"⚠️ Không thể tải Whisper model: {e}")
                 self.whisper_model = None
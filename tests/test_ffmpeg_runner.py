@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test tìm ffprobe và cache độ dài dùng để tính tiến độ (không cần FFmpeg)"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from ffmpeg_runner import ffprobe_for, remember_duration, probe_duration, _expected_duration
+
+
+class FFprobeForTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_uses_ffprobe_next_to_ffmpeg(self):
+        for name in ('ffmpeg.exe', 'ffprobe.exe'):
+            open(os.path.join(self.temp_dir, name), 'w').close()
+        self.assertEqual(ffprobe_for(os.path.join(self.temp_dir, 'ffmpeg.exe')),
+                         os.path.join(self.temp_dir, 'ffprobe.exe'))
+
+    def test_falls_back_to_path(self):
+        self.assertEqual(ffprobe_for('ffmpeg'), 'ffprobe')
+        self.assertEqual(ffprobe_for(os.path.join(self.temp_dir, 'ffmpeg')), 'ffprobe')
+
+
+class DurationCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.video = os.path.join(self.temp_dir, 'input.mp4')
+        with open(self.video, 'wb') as f:
+            f.write(b'0' * 16)
+        # ffprobe không tồn tại: mọi giá trị trả về phải đến từ cache
+        self.missing_ffprobe = os.path.join(self.temp_dir, 'ffprobe')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_remembered_duration_skips_probe(self):
+        remember_duration(self.video, 42.5)
+        self.assertEqual(probe_duration(self.video, self.missing_ffprobe), 42.5)
+
+    def test_changed_file_is_not_served_from_cache(self):
+        remember_duration(self.video, 42.5)
+        with open(self.video, 'ab') as f:
+            f.write(b'1')
+        self.assertIsNone(probe_duration(self.video, self.missing_ffprobe))
+
+    def test_expected_duration_applies_output_limit(self):
+        remember_duration(self.video, 42.5)
+        cmd = [os.path.join(self.temp_dir, 'ffmpeg'), '-i', self.video, '-t', '10', 'out.mp4']
+        self.assertEqual(_expected_duration(cmd), 10.0)
+        cmd = [os.path.join(self.temp_dir, 'ffmpeg'), '-i', self.video, 'out.mp4']
+        self.assertEqual(_expected_duration(cmd), 42.5)
+
+    def test_non_file_input_is_not_probed(self):
+        cmd = ['ffmpeg', '-f', 'lavfi', '-i', 'anullsrc', '-t', '5', 'out.m4a']
+        self.assertEqual(_expected_duration(cmd), 5.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
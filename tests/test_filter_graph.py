@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test các pass tối ưu và serialize của filter_graph (thuần Python, không cần FFmpeg)"""
+
+import unittest
+
+from filter_graph import FilterGraph, merge_scales, order_overlays
+
+
+def _overlay_chain(windows):
+    """Video nền + một overlay ảnh cho mỗi cửa sổ (start, end), theo thứ tự truyền vào"""
+    graph = FilterGraph()
+    current = graph.input('main.mp4')
+    for i, (start, end) in enumerate(windows):
+        image = graph.input(f'img{i}.png', ['-loop', '1'])
+        current = graph.overlay(current, image, 0, 0, start=start, end=end)
+    graph.output(current)
+    return graph
+
+
+def _overlay_windows(graph):
+    """Cửa sổ của các overlay theo thứ tự từ nền lên trên"""
+    windows = []
+    stream = graph.outputs[0][0]
+    while stream.node is not None and stream.node.name == 'overlay':
+        windows.append(stream.node.meta['window'])
+        stream = stream.node.inputs[0]
+    return windows[::-1]
+
+
+class MergeScalesTest(unittest.TestCase):
+
+    def test_relative_scales_are_multiplied(self):
+        graph = FilterGraph()
+        stream = graph.scale_by(graph.input('a.mp4'), 0.5)
+        graph.output(graph.scale_by(stream, 0.5))
+        merge_scales(graph)
+        self.assertEqual(len(graph.nodes), 1)
+        self.assertEqual(graph.nodes[0].args, ['iw*0.25', 'ih*0.25'])
+
+    def test_absolute_scale_drops_previous_scale(self):
+        graph = FilterGraph()
+        stream = graph.scale_by(graph.input('a.mp4'), 0.5)
+        graph.output(graph.scale(stream, 1080, 1920))
+        self.assertEqual(graph.compile_simple(), 'scale=1080:1920')
+
+    def test_expression_scale_keeps_previous_scale(self):
+        graph = FilterGraph()
+        stream = graph.scale_by(graph.input('a.mp4'), 0.5)
+        graph.output(graph.scale(stream, 'iw/2', -2))
+        self.assertEqual(graph.compile_simple(), 'scale=iw*0.5:ih*0.5,scale=iw/2:-2')
+
+    def test_shared_scale_is_not_merged(self):
+        graph = FilterGraph()
+        shared = graph.scale_by(graph.input('a.mp4'), 0.5)
+        graph.output(graph.scale_by(shared, 0.5), 'small')
+        graph.output(shared, 'half')
+        merge_scales(graph)
+        self.assertEqual(len(graph.nodes), 2)
+
+
+class OrderOverlaysTest(unittest.TestCase):
+
+    def test_disjoint_windows_are_sorted(self):
+        graph = _overlay_chain([(5, 8), (1, 3)])
+        order_overlays(graph)
+        self.assertEqual(_overlay_windows(graph), [(1, 3), (5, 8)])
+
+    def test_touching_windows_keep_layer_order(self):
+        # between(t,a,b) gồm cả hai đầu: tại t=3 cả hai overlay cùng hiện
+        graph = _overlay_chain([(3, 5), (1, 3)])
+        order_overlays(graph)
+        self.assertEqual(_overlay_windows(graph), [(3, 5), (1, 3)])
+
+    def test_overlapping_windows_keep_layer_order(self):
+        graph = _overlay_chain([(2, 6), (1, 3)])
+        order_overlays(graph)
+        self.assertEqual(_overlay_windows(graph), [(2, 6), (1, 3)])
+
+
+class CompileTest(unittest.TestCase):
+
+    def test_compile_is_idempotent(self):
+        graph = _overlay_chain([(5, 8), (1, 3)])
+        first = graph.compile()
+        self.assertEqual(graph.compile(), first)
+
+    def test_compile_does_not_modify_graph(self):
+        graph = FilterGraph()
+        source = graph.input('a.mp4')
+        graph.output(graph.scale_by(source, 1.0), 'same')
+        graph.output(source, 'copy')
+        nodes = list(graph.nodes)
+        outputs = list(graph.outputs)
+
+        first = graph.compile()
+        self.assertEqual(graph.nodes, nodes)
+        self.assertEqual(graph.outputs, outputs)
+        self.assertEqual(graph.compile(), first)
+
+    def test_compile_simple_after_compile(self):
+        graph = FilterGraph()
+        stream = graph.scale_by(graph.input('a.mp4'), 0.5)
+        graph.output(graph.fade(stream, 'in', 0, 0))
+        expected = graph.compile_simple()
+        graph.compile()
+        self.assertEqual(graph.compile_simple(), expected)
+        self.assertEqual(expected, 'scale=iw*0.5:ih*0.5')
+
+    def test_shared_input_uses_split(self):
+        graph = FilterGraph()
+        source = graph.input('a.mp4')
+        graph.output(graph.scale(source, 100, 100), 'small')
+        graph.output(graph.scale(source, 200, 200), 'large')
+        _, filter_complex, labels = graph.compile()
+        self.assertEqual(labels, ['[small]', '[large]'])
+        self.assertIn('split=2', filter_complex)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test phân loại lỗi để quyết định retry"""
+
+import errno
+import os
+import tempfile
+import unittest
+
+from retry_policy import classify_error, retry_delay, PERMANENT, TRANSIENT, UNKNOWN, RETRY_MAX_DELAY
+
+
+class ClassifyErrorTest(unittest.TestCase):
+
+    def test_corrupt_input_with_digits_in_name_is_permanent(self):
+        error = Exception('/data/clip_20240429.mp4: Invalid data found when processing input')
+        self.assertEqual(classify_error(error), PERMANENT)
+        error = Exception('/data/vacation_1503.mp4: moov atom not found')
+        self.assertEqual(classify_error(error), PERMANENT)
+
+    def test_paths_of_the_job_are_ignored(self):
+        with tempfile.NamedTemporaryFile(suffix='.mp4') as source:
+            output_path = '/out/killed connection 429/result.mp4'
+            error = Exception(f"Lỗi FFmpeg: {output_path}: Invalid argument")
+            self.assertEqual(classify_error(error, source.name, output_path), PERMANENT)
+
+    def test_digits_in_other_paths_do_not_look_like_http_codes(self):
+        error = Exception('Lỗi FFmpeg: /tmp/job_503/video_9_16.mp4: Conversion failed!')
+        self.assertEqual(classify_error(error), UNKNOWN)
+
+    def test_http_status_codes_are_transient(self):
+        for message in ('https://cdn.example.com/a.mp4: HTTP error 503 Service Unavailable',
+                        'Server returned 429 Too Many Requests',
+                        'translate API status: 429'):
+            self.assertEqual(classify_error(Exception(message)), TRANSIENT, message)
+
+    def test_transient_messages(self):
+        for message in ('Connection reset by peer', 'Read timed out', 'Tiến trình bị Killed',
+                        'av_interleaved_write_frame(): No space left on device'):
+            self.assertEqual(classify_error(Exception(message)), TRANSIENT, message)
+
+    def test_io_error_with_invalid_argument_is_transient(self):
+        error = Exception('Error writing trailer: No space left on device\nInvalid argument')
+        self.assertEqual(classify_error(error), TRANSIENT)
+
+    def test_permanent_marker_wins_over_transient_marker(self):
+        error = Exception('a.mp4: Invalid data found when processing input (connection reset)')
+        self.assertEqual(classify_error(error), PERMANENT)
+
+    def test_transient_errno_wins(self):
+        error = OSError(errno.ENOSPC, 'Invalid data found when processing input')
+        self.assertEqual(classify_error(error), TRANSIENT)
+
+    def test_missing_input_is_permanent(self):
+        missing = os.path.join(tempfile.gettempdir(), 'does-not-exist-429.mp4')
+        self.assertEqual(classify_error(Exception('HTTP error 503'), missing), PERMANENT)
+
+    def test_exception_types(self):
+        self.assertEqual(classify_error(MemoryError()), TRANSIENT)
+        self.assertEqual(classify_error(FileNotFoundError('ffmpeg')), PERMANENT)
+        self.assertEqual(classify_error(Exception('lỗi lạ')), UNKNOWN)
+
+
+class RetryDelayTest(unittest.TestCase):
+
+    def test_doubles_up_to_cap(self):
+        self.assertEqual([retry_delay(attempt) for attempt in (1, 2, 3)], [5.0, 10.0, 20.0])
+        self.assertEqual(retry_delay(20), RETRY_MAX_DELAY)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test chọn điểm cắt và dời mốc thời gian theo segment (thuần Python, không cần FFmpeg)"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from segment_encoder import (plan_segments, shift_subtitle, shift_timeline, _shift_overlay_entry,
+                             shift_overlay_settings)
+
+KEYFRAMES = [float(t) for t in range(0, 61, 2)]  # Keyframe mỗi 2 giây
+
+
+class PlanSegmentsTest(unittest.TestCase):
+
+    def test_cuts_at_keyframes_near_even_split(self):
+        self.assertEqual(plan_segments(KEYFRAMES, 60, 3), [(0.0, 20.0), (20.0, 40.0), (40.0, 60)])
+
+    def test_segment_count_limited_by_min_length(self):
+        segments = plan_segments(KEYFRAMES, 25, 8)
+        self.assertEqual(len(segments), 2)
+        self.assertEqual(segments[0][0], 0.0)
+        self.assertEqual(segments[-1][1], 25)
+        self.assertTrue(all(end - start >= 10 for start, end in segments))
+
+    def test_avoids_cutting_inside_busy_window(self):
+        segments = plan_segments(KEYFRAMES, 40, 2, busy_windows=[(17, 23)])
+        self.assertEqual(segments, [(0.0, 16.0), (16.0, 40)])
+
+    def test_falls_back_to_any_keyframe_when_everything_is_busy(self):
+        segments = plan_segments(KEYFRAMES, 40, 2, busy_windows=[(0, 40)])
+        self.assertEqual(segments, [(0.0, 20.0), (20.0, 40)])
+
+    def test_no_keyframes_gives_single_segment(self):
+        self.assertEqual(plan_segments([], 60, 4), [(0.0, 60)])
+
+
+class ShiftSubtitleTest(unittest.TestCase):
+
+    SRT = (
+        "1\n00:00:01,000 --> 00:00:03,000\nmột\n\n"
+        "2\n00:00:09,500 --> 00:00:11,000\nhai\n\n"
+        "3\n00:00:12,000 --> 00:00:13,250\nba\ndòng hai\n"
+    )
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.temp_dir, 'source.srt')
+        self.output = os.path.join(self.temp_dir, 'segment.srt')
+        with open(self.source, 'w', encoding='utf-8') as f:
+            f.write(self.SRT)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _read_output(self):
+        with open(self.output, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def test_cues_are_shifted_and_renumbered(self):
+        self.assertTrue(shift_subtitle(self.source, 10, 20, self.output))
+        self.assertEqual(self._read_output(), (
+            "1\n00:00:00,000 --> 00:00:01,000\nhai\n\n"
+            "2\n00:00:02,000 --> 00:00:03,250\nba\ndòng hai\n"
+        ))
+
+    def test_cue_across_cut_is_clipped_to_segment(self):
+        shift_subtitle(self.source, 0, 10, self.output)
+        self.assertIn("00:00:09,500 --> 00:00:10,000\nhai", self._read_output())
+
+    def test_empty_segment(self):
+        self.assertFalse(shift_subtitle(self.source, 20, 30, self.output))
+        self.assertEqual(self._read_output(), "")
+
+
+class ShiftTimelineTest(unittest.TestCase):
+
+    def _timeline(self):
+        return {"name": "demo", "items": [
+            {"type": "video", "file": "clip.mp4", "start": 5, "end": 15, "seek": 1},
+            {"type": "image", "file": "logo.png", "start": 8, "end": 12,
+             "animation": {"type": "fade", "duration": 0.5}},
+            {"type": "image", "file": "intro.png", "start": 0, "end": 3,
+             "animation": {"type": "fade", "duration": 0.5}},
+        ]}
+
+    def test_items_are_clipped_and_shifted(self):
+        shifted = shift_timeline(self._timeline(), 10, 20)
+        self.assertEqual(shifted["name"], "demo")
+        video, image = shifted["items"]
+        self.assertEqual((video["start"], video["end"], video["seek"]), (0, 5, 6))
+        self.assertEqual((image["start"], image["end"]), (0, 2))
+        self.assertEqual(image["animation"], {"type": "none", "duration": 0.5})
+
+    def test_item_fully_inside_keeps_animation(self):
+        shifted = shift_timeline(self._timeline(), 0, 20)
+        self.assertEqual(shifted["items"][2]["animation"]["type"], "fade")
+        self.assertNotIn("seek", shifted["items"][1])
+
+    def test_segment_without_items(self):
+        self.assertIsNone(shift_timeline(self._timeline(), 20, 30))
+
+
+class ShiftOverlayTest(unittest.TestCase):
+
+    def test_overlay_across_cut_seeks_into_clip(self):
+        entry = {'video_path': 'a.mp4', 'start_time': 8, 'duration': 6, 'seek': 1}
+        shifted = _shift_overlay_entry(entry, 10, 20, 0, None)
+        self.assertEqual((shifted['start_time'], shifted['duration'], shifted['seek']), (0, 4, 3))
+        self.assertEqual(shifted['video_path'], 'a.mp4')
+
+    def test_overlay_inside_segment(self):
+        entry = {'start_time': 12, 'duration': 3}
+        shifted = _shift_overlay_entry(entry, 10, 20, 0, None)
+        self.assertEqual((shifted['start_time'], shifted['duration'], shifted['seek']), (2, 3, 0))
+
+    def test_overlay_outside_segment(self):
+        self.assertIsNone(_shift_overlay_entry({'start_time': 25, 'duration': 3}, 10, 20, 0, None))
+
+    def test_single_overlay_uses_process_video_defaults(self):
+        shifted = shift_overlay_settings({'enabled': True}, 0, 10)
+        self.assertEqual((shifted['start_time'], shifted['duration']), (2, 8))
+
+    def test_multiple_overlays_drop_hidden_entries(self):
+        settings = {'enabled': True, 'multiple_overlays': [
+            {'start_time': 0, 'duration': 5},
+            {'start_time': 12, 'duration': 5},
+        ]}
+        shifted = shift_overlay_settings(settings, 10, 20)
+        self.assertEqual(len(shifted['multiple_overlays']), 1)
+        self.assertEqual(shifted['multiple_overlays'][0]['start_time'], 2)
+        self.assertIsNone(shift_overlay_settings(settings, 30, 40))
+
+
+if __name__ == '__main__':
+    unittest.main()
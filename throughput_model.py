@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Module dự đoán thời gian xử lý một video từ metadata và cấu hình
+
+Chi phí chủ yếu tỉ lệ với độ dài video, nhân với độ phân giải (decode /
+scale), số overlay và việc chạy Whisper trên audio. Mô hình tuyến tính:
+
+    giây = a + b*duration + c*duration*megapixel + d*duration*overlay + e*duration*speech
+
+Hệ số fit bằng ridge regression trên lịch sử job (job_store), kéo về bộ hệ
+số mặc định khi còn ít dữ liệu, nên dùng được ngay từ batch đầu tiên.
+"""
+
+from memory_estimator import count_overlays
+
+FEATURES = ('intercept', 'duration', 'pixel_seconds', 'overlay_seconds', 'speech_seconds')
+
+# Hệ số mặc định (giây) cho máy chưa có lịch sử: ~80s cho video 1080p 60s có 1 overlay
+PRIOR_COEFFICIENTS = (8.0, 0.3, 0.15, 0.2, 0.4)
+
+# Độ mạnh của prior, tính bằng số lần chạy "ảo"
+PRIOR_WEIGHT = 3.0
+
+FALLBACK_BYTES_PER_SECOND = 1024 * 1024  # Ước độ dài khi không probe được (~8 Mbps)
+
+def _solve(matrix, vector):
+    """Giải hệ tuyến tính nhỏ bằng khử Gauss (pivot từng phần)"""
+    n = len(vector)
+    rows = [list(matrix[i]) + [vector[i]] for i in range(n)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(rows[r][col]))
+        if abs(rows[pivot][col]) < 1e-12:
+            raise ValueError("Ma trận suy biến")
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        for r in range(n):
+            if r != col:
+                factor = rows[r][col] / rows[col][col]
+                rows[r] = [a - factor * b for a, b in zip(rows[r], rows[col])]
+    return [rows[i][n] / rows[i][i] for i in range(n)]
+
+class ThroughputModel:
+    """Dự đoán giây xử lý của một job, fit lại từ lịch sử"""
+
+    def __init__(self):
+        # Tuple gán lại nguyên khối khi fit: thread khác gọi predict() không thấy hệ số dở dang
+        self.coefficients = tuple(PRIOR_COEFFICIENTS)
+        self.samples = 0
+
+    @staticmethod
+    def features(config, info=None, file_size=0):
+        """
+        Đặc trưng đầu vào của một job
+
+        Args:
+            config (dict): Cấu hình task
+            info (dict, optional): Kết quả probe_video (None nếu probe lỗi)
+            file_size (int): Dùng ước độ dài khi không có info
+
+        Returns:
+            dict: {'duration', 'megapixels', 'overlays', 'speech'}
+        """
+        if info and info.get('duration'):
+            duration = info['duration']
+        else:
+            duration = file_size / FALLBACK_BYTES_PER_SECOND
+        megapixels = info['width'] * info['height'] / 1e6 if info else 1920 * 1080 / 1e6
+        has_audio = info.get('has_audio', True) if info else True
+        return {
+            'duration': round(duration, 3),
+            'megapixels': round(megapixels, 3),
+            'overlays': count_overlays(config),
+            'speech': int(has_audio and config.get('enable_subtitle', True))
+        }
+
+    @staticmethod
+    def _row(features):
+        duration = features['duration']
+        return [
+            1.0,
+            duration,
+            duration * features['megapixels'],
+            duration * features['overlays'],
+            duration * features['speech']
+        ]
+
+    def fit(self, runs):
+        """
+        Fit ridge regression về phía PRIOR_COEFFICIENTS
+
+        Args:
+            runs (list): [{'features': dict, 'wall_seconds': float}, ...] (JobStore.recent_runs)
+        """
+        rows = [(self._row(run['features']), run['wall_seconds']) for run in runs if run.get('wall_seconds')]
+        if not rows:
+            return self
+
+        n = len(FEATURES)
+        # Prior tương đương PRIOR_WEIGHT lần chạy: chuẩn hóa theo bình phương trung bình mỗi đặc trưng
+        scale = [sum(x[j] ** 2 for x, _ in rows) / len(rows) or 1.0 for j in range(n)]
+        matrix = [[sum(x[i] * x[j] for x, _ in rows) for j in range(n)] for i in range(n)]
+        vector = [sum(x[i] * y for x, y in rows) for i in range(n)]
+        for i in range(n):
+            matrix[i][i] += PRIOR_WEIGHT * scale[i]
+            vector[i] += PRIOR_WEIGHT * scale[i] * PRIOR_COEFFICIENTS[i]
+
+        try:
+            self.coefficients = tuple(_solve(matrix, vector))
+            self.samples = len(rows)
+        except ValueError:
+            pass
+        return self
+
+    def predict(self, features):
+        """Giây xử lý dự đoán (tối thiểu 1s)"""
+        coefficients = self.coefficients
+        return max(1.0, sum(c * x for c, x in zip(coefficients, self._row(features))))
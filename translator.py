@@ -6,8 +6,11 @@ Module dịch phụ đề từ ngôn ngữ gốc sang tiếng Anh
 
 import re
 import time
+import threading
 from pathlib import Path
 
+from metrics import TRANSLATION_REQUESTS, TRANSLATION_CACHE_HITS
+
 try:
     from googletrans import Translator as GoogleTranslator
     HAS_GOOGLETRANS = True
@@ -20,6 +23,11 @@ try:
 except ImportError:
     HAS_REQUESTS = False
 
+# Cache câu đã dịch, dùng chung giữa các Translator (mỗi worker batch một editor)
+TRANSLATION_CACHE_SIZE = 10000
+_translation_cache = {}
+_translation_cache_lock = threading.Lock()
+
 class Translator:
     def __init__(self):
         self.google_translator = None
@@ -154,6 +162,14 @@ class Translator:
         
         print(f"🌐 Language mapping: {source_lang} → {google_source_lang}, {target_lang} → {google_target_lang}")
         
+        # Câu lặp lại (điệp khúc, câu chào...) không gọi dịch vụ lần nữa
+        cache_key = (text, google_source_lang, google_target_lang)
+        with _translation_cache_lock:
+            cached = _translation_cache.get(cache_key)
+        if cached is not None:
+            TRANSLATION_CACHE_HITS.inc()
+            return cached
+        
         # Thử dịch với Google Translate
         if self.google_translator:
             try:
@@ -165,13 +181,17 @@ class Translator:
                 
                 if result and hasattr(result, 'text') and result.text:
                     print(f"✅ Translated: '{text[:30]}...' → '{result.text[:30]}...'")
+                    TRANSLATION_REQUESTS.inc(result='ok')
+                    self._cache_translation(cache_key, result.text)
                     return result.text
                 else:
                     print(f"⚠️ Empty translation result for: '{text[:30]}...'")
+                    TRANSLATION_REQUESTS.inc(result='empty')
                     return text
                     
             except Exception as e:
                 print(f"⚠️ Google Translate error: {e}")
+                TRANSLATION_REQUESTS.inc(result='error')
                 
                 # ✅ THÊM: Thử fallback với auto detection
                 try:
@@ -184,15 +204,25 @@ class Translator:
                     
                     if result and hasattr(result, 'text') and result.text:
                         print(f"✅ Auto-translate success: '{text[:30]}...' → '{result.text[:30]}...'")
+                        TRANSLATION_REQUESTS.inc(result='ok')
+                        self._cache_translation(cache_key, result.text)
                         return result.text
                         
                 except Exception as e2:
                     print(f"⚠️ Auto-detection also failed: {e2}")
+                    TRANSLATION_REQUESTS.inc(result='error')
         
         # Fallback: Trả về text gốc
         print(f"⚠️ Translation failed, keeping original: '{text[:50]}...'")
         return text
     
+    def _cache_translation(self, cache_key, translated_text):
+        """Lưu câu đã dịch thành công (xóa cache khi đầy)"""
+        with _translation_cache_lock:
+            if len(_translation_cache) >= TRANSLATION_CACHE_SIZE:
+                _translation_cache.clear()
+            _translation_cache[cache_key] = translated_text
+    
     def test_translation(self):
         """Test Google Translate với tiếng Trung"""
         test_cases = [
@@ -8,6 +8,11 @@ import os
 import subprocess
 import glob
 
+from filter_graph import FilterGraph
+from image_cache import image_overlay_input
+from animation_engine import build_image_animation
+from encoder_profiles import encoder_args
+from ffmpeg_runner import run_ffmpeg
 
 
 # Màu chroma key phổ biến
@@ -132,6 +137,25 @@ def get_video_duration(video_path):
         print(f"Could not get video duration: {e}")
         return None
     
+def _trimmed_input_options(seek=0, duration=None):
+    """
+    Tạo tham số input -ss/-t để decoder overlay chỉ đọc các frame
+    nằm trong cửa sổ hiển thị thay vì decode đến hết clip
+
+    Args:
+        seek (float): Vị trí bắt đầu đọc trong clip (giây)
+        duration (float): Thời lượng cần đọc (None = đến hết clip)
+
+    Returns:
+        list: Các tham số FFmpeg đặt trước -i của input này
+    """
+    options = []
+    if seek:
+        options.extend(['-ss', f'{seek}'])
+    if duration:
+        options.extend(['-t', f'{duration}'])
+    return options
+
 def add_video_overlay_with_chroma(main_video_path, overlay_video_path, output_path, 
                                  start_time=0, duration=None, position="center", 
                                  size_percent=30, chroma_key=True, chroma_color="0x00ff00",
@@ -139,7 +163,8 @@ def add_video_overlay_with_chroma(main_video_path, overlay_video_path, output_pa
                                  color=None, similarity=None, auto_hide=True,
                                  # NEW: Custom position and size parameters
                                  position_mode="preset", custom_x=None, custom_y=None,
-                                 size_mode="percentage", custom_width=None, custom_height=None):
+                                 size_mode="percentage", custom_width=None, custom_height=None,
+                                 overlay_seek=0, encoder_profile=None):
     """
     Chèn video overlay vào video chính với tùy chọn chroma key và vị trí/kích thước tùy chỉnh
     
@@ -166,6 +191,10 @@ def add_video_overlay_with_chroma(main_video_path, overlay_video_path, output_pa
         size_mode (str): "percentage" hoặc "custom"
         custom_width (int): Chiều rộng tùy chỉnh (nếu size_mode="custom")
         custom_height (int): Chiều cao tùy chỉnh (nếu size_mode="custom")
+        
+        overlay_seek (float): Bắt đầu phát video overlay từ giây thứ overlay_seek
+                              (split-encode: segment cắt giữa lúc overlay đang hiện)
+        encoder_profile (str, optional): Profile encoder (encoder_profiles), None = mặc định
     """
     
     # Support for backward compatibility aliases
@@ -193,6 +222,7 @@ def add_video_overlay_with_chroma(main_video_path, overlay_video_path, output_pa
         if auto_hide:
             overlay_duration = get_video_duration(overlay_video_path)
             if overlay_duration:
+                overlay_duration = max(overlay_duration - overlay_seek, 0.01)
                 if duration:
                     actual_duration = min(duration, overlay_duration)
                 else:
@@ -232,52 +262,42 @@ def add_video_overlay_with_chroma(main_video_path, overlay_video_path, output_pa
                 y_pos = "(main_h-overlay_h)/2"
             print(f"📍 Using preset position: {position}")
         
-        # Create filter complex
-        filter_parts = []
+        # Create filter graph - overlay chỉ decode trong khoảng actual_duration
+        graph = FilterGraph()
+        main_stream = graph.input(main_video_path)
+        overlay_stream = graph.input(overlay_video_path,
+                                     _trimmed_input_options(seek=overlay_seek, duration=actual_duration))
         
         # Determine scaling method based on size mode
         if size_mode == "custom" and custom_width is not None and custom_height is not None:
-            scale_filter = f"[1:v]scale={custom_width}:{custom_height}[scaled]"
+            overlay_stream = graph.scale(overlay_stream, custom_width, custom_height)
             print(f"📏 Using custom size: W={custom_width}, H={custom_height}")
         else:
             # Use percentage scaling
             scale_factor = size_percent / 100.0
-            scale_filter = f"[1:v]scale=-1:ih*{scale_factor}[scaled]"
+            overlay_stream = graph.scale(overlay_stream, -1, f"ih*{scale_factor}")
             print(f"📏 Using percentage size: {size_percent}%")
         
-        filter_parts.append(scale_filter)
-        
         # ===== ĐIỂM THAY ĐỔI 1: THÊM FILTER SETPTS ĐỂ RESET TIMELINE =====
         # Reset timeline của overlay video bằng setpts để luôn bắt đầu từ frame đầu
-        setpts_filter = f"[scaled]setpts=PTS-STARTPTS+{start_time}/TB[timed_scaled]"
-        filter_parts.append(setpts_filter)
+        overlay_stream = graph.shift_pts(overlay_stream, start_time)
         
         # Apply chroma key if needed
         if chroma_key:
-            chromakey_filter = f"[timed_scaled]chromakey={chroma_color}:{chroma_similarity}:{chroma_blend}[keyed]"
-            filter_parts.append(chromakey_filter)
-            overlay_input = "keyed"
-        else:
-            overlay_input = "timed_scaled"
+            overlay_stream = graph.filter(overlay_stream, 'chromakey', chroma_color, chroma_similarity, chroma_blend)
         
         # Create overlay with timing
-        if actual_duration:
-            end_time = start_time + actual_duration
-            time_condition = f"enable='between(t,{start_time},{end_time})'"
-        else:
-            time_condition = f"enable='gte(t,{start_time})'"
-        
-        overlay_filter = f"[0:v][{overlay_input}]overlay={x_pos}:{y_pos}:{time_condition}"
-        filter_parts.append(overlay_filter)
+        # eof_action=pass: khi overlay hết frame thì trả lại video chính, không lặp frame cuối
+        end_time = start_time + actual_duration if actual_duration else None
+        graph.output(graph.overlay(main_stream, overlay_stream, x_pos, y_pos, start_time, end_time))
         
-        filter_complex = ";".join(filter_parts)
+        input_args, filter_complex, _ = graph.compile()
         
-        # Create FFmpeg command
         cmd = [
             ffmpeg_path,
-            '-i', main_video_path,
-            '-i', overlay_video_path,
+            *input_args,
             '-filter_complex', filter_complex,
+            *encoder_args(encoder_profile),
             '-c:a', 'copy',
             '-y',
             output_path
@@ -306,7 +326,7 @@ def add_video_overlay_with_chroma(main_video_path, overlay_video_path, output_pa
             print(f"🎨 Màu chroma: {chroma_color}")
             print(f"🔧 Độ nhạy: {chroma_similarity}/{chroma_blend}")
         
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = run_ffmpeg(cmd)
         
         if result.returncode != 0:
             raise Exception(f"Lỗi chèn video overlay: {result.stderr}")
@@ -317,7 +337,8 @@ def add_video_overlay_with_chroma(main_video_path, overlay_video_path, output_pa
         raise Exception(f"Không thể chèn video overlay: {str(e)}")
     
 def add_image_overlay(main_video_path, image_path, output_path, 
-                     start_time=0, duration=5, position="center", size_percent=20):
+                     start_time=0, duration=5, position="center", size_percent=20,
+                     encoder_profile=None):
     """
     Chèn ảnh overlay vào video
     """
@@ -344,21 +365,20 @@ def add_image_overlay(main_video_path, image_path, output_path,
             x_pos = "(main_w-overlay_w)/2"
             y_pos = "(main_h-overlay_h)/2"
         
-        # Scale ảnh
-        scale_factor = size_percent / 100.0
-        scale_filter = f"[1:v]scale=iw*{scale_factor}:ih*{scale_factor}[scaled]"
-        
-        # Overlay với thời gian
+        # Ảnh lặp trong cửa sổ hiển thị (đã scale sẵn từ cache)
         end_time = start_time + duration
-        overlay_filter = f"[0:v][scaled]overlay={x_pos}:{y_pos}:enable='between(t,{start_time},{end_time})'"
+        graph = FilterGraph()
+        main_stream = graph.input(main_video_path)
+        image_stream = image_overlay_input(graph, image_path, size_percent / 100.0, start_time, duration)
+        graph.output(graph.overlay(main_stream, image_stream, x_pos, y_pos, start_time, end_time))
         
-        filter_complex = f"{scale_filter};{overlay_filter}"
+        input_args, filter_complex, _ = graph.compile()
         
         cmd = [
             ffmpeg_path,
-            '-i', main_video_path,
-            '-i', image_path,
+            *input_args,
             '-filter_complex', filter_complex,
+            *encoder_args(encoder_profile),
             '-c:a', 'copy',
             '-y',
             output_path
@@ -370,7 +390,7 @@ def add_image_overlay(main_video_path, image_path, output_path,
         print(f"⏰ Thời gian: {start_time}s - {end_time}s")
         print(f"📍 Vị trí: {position}")
         
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = run_ffmpeg(cmd)
         
         if result.returncode != 0:
             raise Exception(f"Lỗi chèn ảnh overlay: {result.stderr}")
@@ -432,7 +452,7 @@ def get_chroma_preset(preset_name):
 def add_video_overlay_easy_chroma(main_video_path, overlay_video_path, output_path,
                                  start_time=0, duration=None, position="center", 
                                  size_percent=30, chroma_color_name="green", 
-                                 chroma_preset="normal"):
+                                 chroma_preset="normal", encoder_profile=None):
     """
     Chèn video overlay với chroma key đơn giản sử dụng tên màu và preset
     
@@ -446,6 +466,7 @@ def add_video_overlay_easy_chroma(main_video_path, overlay_video_path, output_pa
         size_percent (int): Kích thước %
         chroma_color_name (str): Tên màu ('green', 'blue', 'cyan', etc.)
         chroma_preset (str): Preset độ nhạy ('loose', 'normal', 'strict', 'very_strict')
+        encoder_profile (str, optional): Profile encoder
     """
     chroma_color = get_chroma_color(chroma_color_name)
     similarity, blend = get_chroma_preset(chroma_preset)
@@ -461,13 +482,14 @@ def add_video_overlay_easy_chroma(main_video_path, overlay_video_path, output_pa
         chroma_key=True,
         chroma_color=chroma_color,
         chroma_similarity=similarity,
-        chroma_blend=blend
+        chroma_blend=blend,
+        encoder_profile=encoder_profile
     )
 
 def add_image_overlay_with_animation(main_video_path, image_path, output_path,
                                    start_time=0, duration=5, position="center", 
                                    size_percent=20, animation="fade_in", 
-                                   animation_duration=1.0):
+                                   animation_duration=1.0, encoder_profile=None):
     """
     Chèn ảnh overlay với hiệu ứng animation
     
@@ -483,6 +505,7 @@ def add_image_overlay_with_animation(main_video_path, image_path, output_path,
                         'slide_right', 'slide_up', 'slide_down', 'zoom_in', 'zoom_out', 
                         'rotate_in', 'bounce', 'pulse')
         animation_duration (float): Thời lượng animation (giây)
+        encoder_profile (str, optional): Profile encoder
     """
     try:
         ffmpeg_path = find_ffmpeg()
@@ -497,24 +520,25 @@ def add_image_overlay_with_animation(main_video_path, image_path, output_path,
         }
         x_pos, y_pos = position_map.get(position, position_map["center"])
         
-        # Tạo animation filters
-        animation_filter = _create_animation_filter(animation, start_time, duration, animation_duration, size_percent)
-        
-        # Scale ảnh
-        scale_factor = size_percent / 100.0
-        scale_filter = f"[1:v]scale=iw*{scale_factor}:ih*{scale_factor}[scaled]"
+        # Animation: keyframe tính trước (sprite + sendcmd) qua animation engine
+        animated = build_image_animation(
+            image_path, size_percent / 100.0, animation, start_time, duration, animation_duration,
+            x_pos, y_pos, "animated"
+        )
         
         # Kết hợp filters
         end_time = start_time + duration
-        overlay_filter = f"[0:v][animated]overlay={x_pos}:{y_pos}:enable='between(t,{start_time},{end_time})'"
+        graph = FilterGraph()
+        main_stream = graph.input(main_video_path)
+        graph.output(animated.apply(graph, main_stream, start_time, end_time))
         
-        filter_complex = f"{scale_filter};{animation_filter};{overlay_filter}"
+        input_args, filter_complex, _ = graph.compile()
         
         cmd = [
             ffmpeg_path,
-            '-i', main_video_path,
-            '-i', image_path,
+            *input_args,
             '-filter_complex', filter_complex,
+            *encoder_args(encoder_profile),
             '-c:a', 'copy',
             '-y',
             output_path
@@ -527,7 +551,7 @@ def add_image_overlay_with_animation(main_video_path, image_path, output_path,
         print(f"📍 Vị trí: {position}")
         print(f"🎬 Animation: {animation} ({animation_duration}s)")
         
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = run_ffmpeg(cmd)
         
         if result.returncode != 0:
             raise Exception(f"Lỗi chèn ảnh với animation: {result.stderr}")
@@ -539,94 +563,8 @@ def add_image_overlay_with_animation(main_video_path, image_path, output_path,
         print(f"❌ Lỗi: {str(e)}")
         return False
 
-def _create_animation_filter(animation, start_time, duration, animation_duration, size_percent):
-    """Tạo filter animation cho ảnh"""
-    
-    # Animation timings
-    fade_start = start_time
-    fade_end = start_time + animation_duration
-    main_start = fade_end
-    main_end = start_time + duration - animation_duration
-    fade_out_start = main_end
-    fade_out_end = start_time + duration
-    
-    if animation == "fade_in":
-        return f"[scaled]fade=t=in:st={fade_start}:d={animation_duration}:alpha=1[animated]"
-    
-    elif animation == "fade_out":
-        return f"[scaled]fade=t=out:st={fade_out_start}:d={animation_duration}:alpha=1[animated]"
-    
-    elif animation == "fade_in_out":
-        return f"[scaled]fade=t=in:st={fade_start}:d={animation_duration}:alpha=1,fade=t=out:st={fade_out_start}:d={animation_duration}:alpha=1[animated]"
-    
-    elif animation == "slide_left":
-        return f"[scaled]overlay=x='if(lt(t,{fade_end}),w-(w*(t-{fade_start})/{animation_duration}),0)':y=0[animated]"
-    
-    elif animation == "slide_right":
-        return f"[scaled]overlay=x='if(lt(t,{fade_end}),-w+(w*(t-{fade_start})/{animation_duration}),0)':y=0[animated]"
-    
-    elif animation == "slide_up":
-        return f"[scaled]overlay=x=0:y='if(lt(t,{fade_end}),h-(h*(t-{fade_start})/{animation_duration}),0)'[animated]"
-    
-    elif animation == "slide_down":
-        return f"[scaled]overlay=x=0:y='if(lt(t,{fade_end}),-h+(h*(t-{fade_start})/{animation_duration}),0)'[animated]"
-    
-    elif animation == "zoom_in":
-        zoom_factor = f"if(lt(t,{fade_end}),0.1+0.9*(t-{fade_start})/{animation_duration},1)"
-        return f"[scaled]scale=iw*{zoom_factor}:ih*{zoom_factor}[animated]"
-    
-    elif animation == "zoom_out":
-        zoom_factor = f"if(gt(t,{fade_out_start}),1-0.9*(t-{fade_out_start})/{animation_duration},1)"
-        return f"[scaled]scale=iw*{zoom_factor}:ih*{zoom_factor}[animated]"
-    
-    elif animation == "rotate_in":
-        angle = f"if(lt(t,{fade_end}),2*PI*(t-{fade_start})/{animation_duration},0)"
-        return f"[scaled]rotate={angle}:fillcolor=none[animated]"
-    
-    elif animation == "bounce":
-        # Tạo hiệu ứng bounce đơn giản
-        y_offset = f"if(lt(t,{fade_end}),abs(sin(4*PI*(t-{fade_start})/{animation_duration}))*50,0)"
-        return f"[scaled]overlay=x=0:y={y_offset}[animated]"
-    
-    elif animation == "pulse":
-        # Hiệu ứng pulse (thay đổi kích thước)
-        pulse_scale = f"1+0.2*sin(4*PI*(t-{fade_start})/{animation_duration})"
-        return f"[scaled]scale=iw*{pulse_scale}:ih*{pulse_scale}[animated]"
-    
-    else:
-        # Mặc định: fade_in
-        return f"[scaled]fade=t=in:st={fade_start}:d={animation_duration}:alpha=1[animated]"
-
-def _create_animation_filter_for_multiple(animation, start_time, duration, animation_duration, input_label, output_label):
-    """Tạo animation filter cho multiple overlay"""
-    
-    fade_start = start_time
-    fade_end = start_time + animation_duration
-    fade_out_start = start_time + duration - animation_duration
-    
-    if animation == "fade_in":
-        return f"[{input_label}]fade=t=in:st={fade_start}:d={animation_duration}:alpha=1[{output_label}]"
-    
-    elif animation == "fade_out":
-        return f"[{input_label}]fade=t=out:st={fade_out_start}:d={animation_duration}:alpha=1[{output_label}]"
-    
-    elif animation == "fade_in_out":
-        return f"[{input_label}]fade=t=in:st={fade_start}:d={animation_duration}:alpha=1,fade=t=out:st={fade_out_start}:d={animation_duration}:alpha=1[{output_label}]"
-    
-    elif animation == "zoom_in":
-        zoom_factor = f"if(lt(t,{fade_end}),0.3+0.7*(t-{fade_start})/{animation_duration},1)"
-        return f"[{input_label}]scale=iw*{zoom_factor}:ih*{zoom_factor}[{output_label}]"
-    
-    elif animation == "pulse":
-        pulse_scale = f"1+0.3*sin(6*PI*(t-{fade_start})/2)"
-        return f"[{input_label}]scale=iw*{pulse_scale}:ih*{pulse_scale}[{output_label}]"
-    
-    else:
-        # Mặc định
-        return f"[{input_label}]fade=t=in:st={fade_start}:d={animation_duration}:alpha=1[{output_label}]"
-
-
-def add_multiple_overlays(main_video_path, subtitle_path, output_path, overlay_folder, overlay_times):
+def add_multiple_overlays(main_video_path, subtitle_path, output_path, overlay_folder, overlay_times,
+                          encoder_profile=None):
     """
     Chèn nhiều video/ảnh overlay cùng lúc - ĐÃ SỬA STYLES
     """
@@ -642,14 +580,11 @@ def add_multiple_overlays(main_video_path, subtitle_path, output_path, overlay_f
             print("⚠️ Không tìm thấy file overlay nào")
             return False
         
-        # Chuẩn bị inputs
-        inputs = ['-i', main_video_path]
         overlay_configs = []
         
         for media_file in media_files:
             filename = os.path.basename(media_file)
             if filename in overlay_times:
-                inputs.extend(['-i', media_file])
                 overlay_configs.append({
                     'file': media_file,
                     'filename': filename,
@@ -662,58 +597,43 @@ def add_multiple_overlays(main_video_path, subtitle_path, output_path, overlay_f
             print("⚠️ Không có file overlay nào được cấu hình thời gian")
             return False
         
-        # Tạo filter complex
-        filter_parts = []
+        graph = FilterGraph()
+        main_stream = graph.input(main_video_path)
         
         # Bước 1: Thêm subtitles - ĐÃ SỬA
-        subtitle_path_escaped = subtitle_path.replace('\\', '/').replace(':', '\\:')
-        
         # SỬA: Sử dụng style system thay vì hardcode
         from subtitle_styles import get_preset_style
         style_string = get_preset_style("default")
-        
-        # BEFORE: 
-        # subtitle_filter = f"[0:v]subtitles='{subtitle_path_escaped}':force_style='FontName=Arial,FontSize=8,PrimaryColour=&Hffffff,OutlineColour=&H000000,Outline=1,Shadow=1,MarginV=50'[sub]"
-        
-        # AFTER:
-        subtitle_filter = f"[0:v]subtitles='{subtitle_path_escaped}':force_style='{style_string}'[sub]"
-        filter_parts.append(subtitle_filter)
+        current = graph.subtitles(main_stream, subtitle_path, style_string)
         
         # Bước 2: Xử lý overlay
-        current_input = "sub"
-        for i, config in enumerate(overlay_configs):
-            input_index = i + 1
+        for config in overlay_configs:
+            end_time = config['start'] + config['duration']
             
             if config['is_video']:
-                # Video overlay với chroma key
-                scale_filter = f"[{input_index}:v]scale=-1:ih*0.3[scaled{i}]"
-                filter_parts.append(scale_filter)
-                
-                chromakey_filter = f"[scaled{i}]chromakey=0x00ff00:0.1:0.1[chroma{i}]"
-                filter_parts.append(chromakey_filter)
-                
-                end_time = config['start'] + config['duration']
-                overlay_filter = f"[{current_input}][chroma{i}]overlay=(main_w-overlay_w)/2:(main_h-overlay_h)/2:enable='between(t,{config['start']},{end_time})'"
+                # Video overlay với chroma key: chỉ decode đoạn [start, start + duration] của clip,
+                # input đã được cắt bằng -ss nên cần dời timeline về lại thời điểm start
+                overlay_stream = graph.input(
+                    config['file'], _trimmed_input_options(seek=config['start'], duration=config['duration'])
+                )
+                overlay_stream = graph.shift_pts(overlay_stream, config['start'])
+                overlay_stream = graph.scale(overlay_stream, -1, "ih*0.3")
+                overlay_stream = graph.filter(overlay_stream, 'chromakey', '0x00ff00', 0.1, 0.1)
             else:
                 # Ảnh overlay
-                scale_filter = f"[{input_index}]scale=iw*0.1:ih*0.1[img{i}]"
-                filter_parts.append(scale_filter)
-                
-                end_time = config['start'] + config['duration']
-                overlay_filter = f"[{current_input}][img{i}]overlay=(main_w-overlay_w)/2:(main_h-overlay_h)/2:enable='between(t,{config['start']},{end_time})'"
+                overlay_stream = image_overlay_input(graph, config['file'], 0.1, config['start'], config['duration'])
             
-            if i < len(overlay_configs) - 1:
-                overlay_filter += f"[tmp{i}]"
-                current_input = f"tmp{i}"
-            
-            filter_parts.append(overlay_filter)
+            current = graph.overlay(current, overlay_stream, "(main_w-overlay_w)/2", "(main_h-overlay_h)/2",
+                                    config['start'], end_time)
         
-        filter_complex = ";".join(filter_parts)
+        graph.output(current)
+        input_args, filter_complex, _ = graph.compile()
         
         cmd = [
             ffmpeg_path,
-            *inputs,
+            *input_args,
             '-filter_complex', filter_complex,
+            *encoder_args(encoder_profile),
             '-c:a', 'copy',
             '-y',
             output_path
@@ -724,7 +644,7 @@ def add_multiple_overlays(main_video_path, subtitle_path, output_path, overlay_f
             media_type = "Video" if config['is_video'] else "Ảnh"
             print(f"  {media_type}: {config['filename']} ({config['start']}s, {config['duration']}s)")
         
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = run_ffmpeg(cmd)
         
         if result.returncode != 0:
             raise Exception(f"Lỗi chèn multiple overlay: {result.stderr}")
@@ -737,12 +657,13 @@ def add_multiple_overlays(main_video_path, subtitle_path, output_path, overlay_f
         return False
 
 def add_multiple_images_with_animations(main_video_path, subtitle_path, output_path, 
-                                       img_folder, overlay_times, animations=None):
+                                       img_folder, overlay_times, animations=None, encoder_profile=None):
     """
     Chèn nhiều ảnh với animation khác nhau - ĐÃ SỬA STYLES
     
     Args:
         animations (dict): {filename: {'type': 'fade_in', 'duration': 1.0}}
+        encoder_profile (str, optional): Profile encoder
     """
     try:
         ffmpeg_path = find_ffmpeg()
@@ -763,8 +684,6 @@ def add_multiple_images_with_animations(main_video_path, subtitle_path, output_p
         for img_file in image_files:
             filename = os.path.basename(img_file)
             if filename in overlay_times:
-                inputs.extend(['-i', img_file])
-                
                 # Lấy animation config
                 anim_config = animations.get(filename, {'type': 'fade_in', 'duration': 1.0}) if animations else {'type': 'fade_in', 'duration': 1.0}
                 
@@ -783,12 +702,11 @@ def add_multiple_images_with_animations(main_video_path, subtitle_path, output_p
             print("⚠️ Không có ảnh nào được cấu hình")
             return False
         
-        # Tạo filter complex với animations
-        filter_parts = []
+        # Tạo filter graph với animations
+        graph = FilterGraph()
+        main_stream = graph.input(main_video_path)
         
         # Subtitle filter - ĐÃ SỬA
-        subtitle_path_escaped = subtitle_path.replace('\\', '/').replace(':', '\\:')
-        
         # SỬA: Sử dụng style system với font size lớn hơn cho animations
         from subtitle_styles import get_subtitle_style_string
         style_string = get_subtitle_style_string(
@@ -798,60 +716,38 @@ def add_multiple_images_with_animations(main_video_path, subtitle_path, output_p
             font_size=10,            # Font size lớn hơn một chút cho animation
             margin_v=50
         )
+        current = graph.subtitles(main_stream, subtitle_path, style_string)
         
-        # BEFORE:
-        # subtitle_filter = f"[0:v]subtitles='{subtitle_path_escaped}':force_style='FontName=Arial,FontSize=12,PrimaryColour=&Hffffff,OutlineColour=&H000000,Outline=2,Shadow=1,MarginV=50'[sub]"
-        
-        # AFTER:
-        subtitle_filter = f"[0:v]subtitles='{subtitle_path_escaped}':force_style='{style_string}'[sub]"
-        filter_parts.append(subtitle_filter)
+        # Position
+        position_map = {
+            "center": ("(main_w-overlay_w)/2", "(main_h-overlay_h)/2"),
+            "top-left": ("20", "20"),
+            "top-right": ("main_w-overlay_w-20", "20"),
+            "bottom-left": ("20", "main_h-overlay_h-20"),
+            "bottom-right": ("main_w-overlay_w-20", "main_h-overlay_h-20")
+        }
         
         # Xử lý từng ảnh
-        current_input = "sub"
         for i, config in enumerate(overlay_configs):
-            input_index = i + 1
-            
-            # Scale ảnh
-            scale_filter = f"[{input_index}]scale=iw*{config['scale']}:ih*{config['scale']}[scaled{i}]"
-            filter_parts.append(scale_filter)
-            
-            # Animation
-            anim_filter = _create_animation_filter_for_multiple(
-                config['animation'], 
-                config['start'], 
-                config['duration'], 
-                config['animation_duration'],
-                f"scaled{i}",
-                f"anim{i}"
-            )
-            filter_parts.append(anim_filter)
-            
-            # Position
-            position_map = {
-                "center": ("(main_w-overlay_w)/2", "(main_h-overlay_h)/2"),
-                "top-left": ("20", "20"),
-                "top-right": ("main_w-overlay_w-20", "20"),
-                "bottom-left": ("20", "main_h-overlay_h-20"),
-                "bottom-right": ("main_w-overlay_w-20", "main_h-overlay_h-20")
-            }
             x_pos, y_pos = position_map.get(config['position'], position_map["center"])
             
-            # Overlay
+            # Ảnh đã scale sẵn từ cache + animation tính trước theo keyframe
+            animated = build_image_animation(
+                config['file'], config['scale'], config['animation'],
+                config['start'], config['duration'], config['animation_duration'],
+                x_pos, y_pos, f"anim{i}"
+            )
             end_time = config['start'] + config['duration']
-            overlay_filter = f"[{current_input}][anim{i}]overlay={x_pos}:{y_pos}:enable='between(t,{config['start']},{end_time})'"
-            
-            if i < len(overlay_configs) - 1:
-                overlay_filter += f"[tmp{i}]"
-                current_input = f"tmp{i}"
-            
-            filter_parts.append(overlay_filter)
+            current = animated.apply(graph, current, config['start'], end_time)
         
-        filter_complex = ";".join(filter_parts)
+        graph.output(current)
+        input_args, filter_complex, _ = graph.compile()
         
         cmd = [
             ffmpeg_path,
-            *inputs,
+            *input_args,
             '-filter_complex', filter_complex,
+            *encoder_args(encoder_profile),
             '-c:a', 'copy',
             '-y',
             output_path
@@ -861,7 +757,7 @@ def add_multiple_images_with_animations(main_video_path, subtitle_path, output_p
         for config in overlay_configs:
             print(f"  🖼️ {config['filename']}: {config['animation']} ({config['start']}s, {config['duration']}s)")
         
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = run_ffmpeg(cmd)
         
         if result.returncode != 0:
             raise Exception(f"Lỗi: {result.stderr}")
@@ -873,46 +769,45 @@ def add_multiple_images_with_animations(main_video_path, subtitle_path, output_p
         print(f"❌ Lỗi: {str(e)}")
         return False
 
-def add_images_with_custom_timeline(main_video_path, subtitle_path, output_path, img_folder):
+def add_images_with_custom_timeline(main_video_path, subtitle_path, output_path, img_folder, timeline=None,
+                                    encoder_profile=None):
     """
-    Thêm 3 ảnh với timeline và vị trí tùy chỉnh theo yêu cầu của bạn - ĐÃ SỬA STYLES
+    Thêm ảnh/video overlay theo timeline khai báo (JSON/YAML) - ĐÃ SỬA STYLES
+    
+    Args:
+        main_video_path (str): Đường dẫn video chính
+        subtitle_path (str): Đường dẫn phụ đề (None = không ghép phụ đề)
+        output_path (str): Đường dẫn kết quả
+        img_folder (str): Thư mục chứa file overlay được timeline tham chiếu
+        timeline (str | dict, optional): File timeline hoặc dict đã load
+                                         (None = timelines/custom_timeline.json)
+        encoder_profile (str, optional): Profile encoder
     """
     try:
+        from overlay_timeline import (
+            compile_timeline, get_default_timeline_path, probe_canvas_size
+        )
+        
         ffmpeg_path = find_ffmpeg()
         
-        # Cấu hình ảnh theo yêu cầu mới
-        image_configs = [
-            {
-                "image": "1.png",  # Ảnh 1
-                "start_time": 5,   # Bắt đầu ở giây thứ 5
-                "end_time": 6,     # Kết thúc ở giây thứ 6
-                "y_offset": 865,   # Vị trí Y
-                "animation": "fade_in_out"
-            },
-            {
-                "image": "2.png",  # Ảnh 2
-                "start_time": 6,   # Bắt đầu ở giây thứ 6
-                "end_time": 7,     # Kết thúc ở giây thứ 7
-                "y_offset": 900,   # Vị trí Y (giống ảnh 3)
-                "animation": "slide_left"
-            },
-            {
-                "image": "3.png",  # Ảnh 3 
-                "start_time": 7,   # Bắt đầu ở giây thứ 7
-                "end_time": 8,     # Kết thúc ở giây thứ 8
-                "y_offset": 900,   # Vị trí Y (giống ảnh 2)
-                "animation": "zoom_in"
-            }
-        ]
+        # Compile timeline thành filter graph (có cache theo timeline + kích thước khung hình)
+        if timeline is None:
+            timeline = get_default_timeline_path("custom_timeline")
+        canvas_size = probe_canvas_size(main_video_path)
+        compiled = compile_timeline(timeline, canvas_size, base_dir=img_folder)
         
-        # Kiểm tra file ảnh
-        inputs = ['-i', main_video_path]
-        filter_parts = []
+        if not compiled.items:
+            print("❌ Không tìm thấy ảnh nào!")
+            return False
+        
+        for i, item in enumerate(compiled.items):
+            print(f"📋 Overlay {i+1}: {item['file']} ({item['start']}s-{item['end']}s, {item['animation']['type']})")
+        
+        graph = FilterGraph()
+        current = graph.input(main_video_path)
         
         # Thêm subtitle trước - ĐÃ SỬA
         if subtitle_path and os.path.exists(subtitle_path):
-            subtitle_path_escaped = subtitle_path.replace('\\', '/').replace(':', '\\:')
-            
             # SỬA: Sử dụng style system
             from subtitle_styles import get_subtitle_style_string
             style_string = get_subtitle_style_string(
@@ -922,71 +817,12 @@ def add_images_with_custom_timeline(main_video_path, subtitle_path, output_path,
                 font_size=10,            # Font size phù hợp
                 margin_v=50
             )
-            
-            # BEFORE: 
-            # subtitle_filter = f"[0:v]subtitles='{subtitle_path_escaped}':force_style='FontName=Arial,FontSize=12,PrimaryColour=&Hffffff,OutlineColour=&H000000,Outline=2,Shadow=1,MarginV=50'[sub]"
-            
-            # AFTER:
-            subtitle_filter = f"[0:v]subtitles='{subtitle_path_escaped}':force_style='{style_string}'[sub]"
-            filter_parts.append(subtitle_filter)
-            current_input = "sub"
-        else:
-            current_input = "0:v"
-        
-        # Xử lý từng ảnh
-        valid_configs = []
-        for i, config in enumerate(image_configs):
-            img_path = os.path.join(img_folder, config["image"])
-            if os.path.exists(img_path):
-                inputs.extend(['-i', img_path])
-                # input_index là số thứ tự của input (0=main_video, 1=image1, 2=image2, 3=image3)
-                valid_configs.append({**config, 'input_index': len(inputs)//2 - 1})
-                print(f"📋 Ảnh {i+1}: {config['image']} ({config['start_time']}s-{config['end_time']}s, Y={config['y_offset']})")
-            else:
-                print(f"⚠️ Không tìm thấy: {img_path}")
-        
-        if not valid_configs:
-            print("❌ Không tìm thấy ảnh nào!")
-            return False
+            current = graph.subtitles(current, subtitle_path, style_string)
         
-        # Tạo filter overlay cho từng ảnh
-        for i, config in enumerate(valid_configs):
-            input_idx = config['input_index']
-            
-            # Scale ảnh (kích thước nhỏ 20% chiều cao video)
-            scale_filter = f"[{input_idx}]scale=-1:ih*0.2[scaled{i}]"
-            filter_parts.append(scale_filter)
-            
-            # Animation filter
-            anim_duration = 0.5  # Thời gian animation ngắn
-            if config['animation'] == 'fade_in_out':
-                anim_filter = f"[scaled{i}]fade=t=in:st={config['start_time']}:d={anim_duration}:alpha=1,fade=t=out:st={config['end_time']-anim_duration}:d={anim_duration}:alpha=1[anim{i}]"
-            elif config['animation'] == 'slide_left':
-                # Slide từ phải sang trái
-                x_expr = f"if(lt(t,{config['start_time']+anim_duration}),w-(w*(t-{config['start_time']})/{anim_duration}),0)"
-                anim_filter = f"[scaled{i}]fade=t=in:st={config['start_time']}:d={anim_duration}:alpha=1,fade=t=out:st={config['end_time']-anim_duration}:d={anim_duration}:alpha=1[anim{i}]"
-            elif config['animation'] == 'zoom_in':
-                # Zoom từ nhỏ lên bình thường
-                anim_filter = f"[scaled{i}]fade=t=in:st={config['start_time']}:d={anim_duration}:alpha=1,fade=t=out:st={config['end_time']-anim_duration}:d={anim_duration}:alpha=1[anim{i}]"
-            else:
-                anim_filter = f"[scaled{i}]fade=t=in:st={config['start_time']}:d={anim_duration}:alpha=1,fade=t=out:st={config['end_time']-anim_duration}:d={anim_duration}:alpha=1[anim{i}]"
-            
-            filter_parts.append(anim_filter)
-            
-            # Overlay với vị trí Y tùy chỉnh
-            x_pos = "(main_w-overlay_w)/2"  # Căn giữa theo chiều ngang
-            y_pos = str(config['y_offset'])  # Vị trí Y cố định
-            
-            overlay_filter = f"[{current_input}][anim{i}]overlay={x_pos}:{y_pos}:enable='between(t,{config['start_time']},{config['end_time']})'"
-            
-            if i < len(valid_configs) - 1:
-                overlay_filter += f"[tmp{i}]"
-                current_input = f"tmp{i}"
-            
-            filter_parts.append(overlay_filter)
+        graph.output(compiled.apply(graph, current))
         
         # Tạo command FFmpeg
-        filter_complex = ";".join(filter_parts)
+        inputs, filter_complex, _ = graph.compile()
         
         print(f"🔍 Debug Filter Complex:")
         print(f"📋 Inputs: {inputs}")
@@ -997,57 +833,30 @@ def add_images_with_custom_timeline(main_video_path, subtitle_path, output_path,
             ffmpeg_path,
             *inputs,
             '-filter_complex', filter_complex,
+            *encoder_args(encoder_profile),
             '-c:a', 'copy',
             '-y',
             output_path
         ]
         
-        print(f"🎬 Đang xử lý {len(valid_configs)} ảnh với timeline tùy chỉnh...")
+        print(f"🎬 Đang xử lý {len(compiled.items)} overlay với timeline tùy chỉnh...")
         print(f"📂 Video đầu vào: {main_video_path}")
         print(f"📁 Thư mục ảnh: {img_folder}")
         print(f"💾 Video đầu ra: {output_path}")
         
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = run_ffmpeg(cmd)
         
         if result.returncode != 0:
             print(f"❌ Lỗi FFmpeg: {result.stderr}")
             return False
         
-        print(f"✅ Hoàn thành! Video với 3 ảnh animation đã được tạo: {output_path}")
+        print(f"✅ Hoàn thành! Video với {len(compiled.items)} overlay đã được tạo: {output_path}")
         return True
         
     except Exception as e:
         print(f"❌ Lỗi: {str(e)}")
         return False
 
-def _create_animation_filter_for_multiple(animation, start_time, duration, animation_duration, input_label, output_label):
-    """Tạo animation filter cho multiple overlay"""
-    
-    fade_start = start_time
-    fade_end = start_time + animation_duration
-    fade_out_start = start_time + duration - animation_duration
-    
-    if animation == "fade_in":
-        return f"[{input_label}]fade=t=in:st={fade_start}:d={animation_duration}:alpha=1[{output_label}]"
-    
-    elif animation == "fade_out":
-        return f"[{input_label}]fade=t=out:st={fade_out_start}:d={animation_duration}:alpha=1[{output_label}]"
-    
-    elif animation == "fade_in_out":
-        return f"[{input_label}]fade=t=in:st={fade_start}:d={animation_duration}:alpha=1,fade=t=out:st={fade_out_start}:d={animation_duration}:alpha=1[{output_label}]"
-    
-    elif animation == "zoom_in":
-        zoom_factor = f"if(lt(t,{fade_end}),0.3+0.7*(t-{fade_start})/{animation_duration},1)"
-        return f"[{input_label}]scale=iw*{zoom_factor}:ih*{zoom_factor}[{output_label}]"
-    
-    elif animation == "pulse":
-        pulse_scale = f"1+0.3*sin(6*PI*(t-{fade_start})/2)"
-        return f"[{input_label}]scale=iw*{pulse_scale}:ih*{pulse_scale}[{output_label}]"
-    
-    else:
-        # Mặc định
-        return f"[{input_label}]fade=t=in:st={fade_start}:d={animation_duration}:alpha=1[{output_label}]"
-
 if __name__ == "__main__":
     # Test function
     print("📹 Module Video Overlay đã sẵn sàng!")
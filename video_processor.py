@@ -3,12 +3,17 @@ import subprocess
 import shutil
 import traceback
 from subtitle_config import SubtitleConfig, get_legacy_subtitle_style
+from filter_graph import FilterGraph
+from image_cache import image_overlay_input
+from encoder_profiles import encoder_args
+from ffmpeg_runner import run_ffmpeg, probe_duration
 
 class VideoProcessor:
     def __init__(self):
         self.ffmpeg_path = self._find_ffmpeg()
     
-    def add_subtitle_to_video(self, video_path, subtitle_path, output_path, subtitle_style=None):
+    def add_subtitle_to_video(self, video_path, subtitle_path, output_path, subtitle_style=None,
+                              encoder_profile=None):
         """
         Chỉ ghép phụ đề vào video (không có overlay ảnh) - PUBLIC METHOD
         
@@ -27,6 +32,7 @@ class VideoProcessor:
                     "opacity": 255,              # Độ đục (0-255)
                     "preset": "default"          # Hoặc dùng preset có sẵn
                 }
+            encoder_profile (str, optional): Profile encoder (encoder_profiles), None = mặc định
         """
         try:
             print("📝 Ghép phụ đề vào video...")
@@ -36,7 +42,7 @@ class VideoProcessor:
                 subtitle_style = {"preset": "default"}
                 
             # Gọi hàm xử lý subtitle với style
-            self._add_subtitle_only(video_path, subtitle_path, output_path, subtitle_style)
+            self._add_subtitle_only(video_path, subtitle_path, output_path, subtitle_style, encoder_profile)
                 
         except Exception as e:
             raise Exception(f"Không thể ghép phụ đề vào video: {str(e)}")
@@ -104,7 +110,7 @@ class VideoProcessor:
             ]
             
             print(f"🎵 Đang trích xuất audio từ {video_path}...")
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = run_ffmpeg(cmd)
             
             if result.returncode != 0:
                 print("⚠️ Không thể trích xuất audio, tạo file audio trống...")
@@ -124,30 +130,20 @@ class VideoProcessor:
         Tạo file audio trống với thời lượng bằng video
         """
         try:
-            # Lấy thời lượng video
-            duration_cmd = [
-                self.ffmpeg_path,
-                '-i', video_path,
-                '-f', 'null',
-                '-'
-            ]
-            
-            duration_result = subprocess.run(duration_cmd, capture_output=True, text=True)
-            
-            # Tạo audio trống
+            # anullsrc là nguồn vô hạn: giới hạn bằng -t theo độ dài video (ffprobe đọc header,
+            # không decode); không đọc được độ dài thì dùng 10 giây
+            duration = probe_duration(video_path) or 10
             silent_cmd = [
                 self.ffmpeg_path,
                 '-f', 'lavfi',
                 '-i', 'anullsrc=channel_layout=stereo:sample_rate=44100',
-                '-i', video_path,
+                '-t', f"{duration:.3f}",
                 '-c:a', 'pcm_s16le',
-                '-map', '0:a',
-                '-shortest',
                 '-y',
                 audio_output_path
             ]
             
-            result = subprocess.run(silent_cmd, capture_output=True, text=True)
+            result = run_ffmpeg(silent_cmd)
             
             if result.returncode != 0:
                 # Fallback: tạo audio trống 10 giây
@@ -161,7 +157,7 @@ class VideoProcessor:
                     audio_output_path
                 ]
                 
-                result = subprocess.run(fallback_cmd, capture_output=True, text=True)
+                result = run_ffmpeg(fallback_cmd)
                 
                 if result.returncode != 0:
                     raise Exception(f"Không thể tạo audio trống: {result.stderr}")
@@ -208,7 +204,7 @@ class VideoProcessor:
             ]
             
             print(f"🔄 Đang chuyển đổi tỉ lệ khung hình...")
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = run_ffmpeg(cmd)
             
             if result.returncode != 0:
                 raise Exception(f"Lỗi chuyển đổi tỉ lệ: {result.stderr}")
@@ -393,7 +389,7 @@ class VideoProcessor:
                     print(f"🖼️ Ảnh: {config['image']} ({config['start_time']}s-{config['end_time']}s)")
             print(f"📂 Output: {output_path}")
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = run_ffmpeg(cmd)
             
             if result.returncode != 0:
                 raise Exception(f"Lỗi ghép phụ đề và ảnh: {result.stderr}")
@@ -403,7 +399,8 @@ class VideoProcessor:
         except Exception as e:
             raise Exception(f"Không thể ghép phụ đề và ảnh với filter: {str(e)}")
 
-    def convert_aspect_ratio(self, input_path, output_path, target_width=1080, target_height=1920):
+    def convert_aspect_ratio(self, input_path, output_path, target_width=1080, target_height=1920,
+                             encoder_profile=None):
         """
         Chuyển đổi video thành tỉ lệ 9:16 cho TikTok/Instagram Reels
         
@@ -412,6 +409,7 @@ class VideoProcessor:
             output_path (str): Đường dẫn video đầu ra
             target_width (int): Chiều rộng đích
             target_height (int): Chiều cao đích
+            encoder_profile (str, optional): Profile encoder
         """
         try:
             # Lấy thông tin video gốc
@@ -434,37 +432,36 @@ class VideoProcessor:
             original_ratio = width / height
             target_ratio = target_width / target_height
             
+            graph = FilterGraph()
+            stream = graph.input(input_path)
+            
             if abs(original_ratio - target_ratio) < 0.01:
                 # Video đã có tỉ lệ đúng, chỉ cần scale
-                cmd = [
-                    self.ffmpeg_path,
-                    '-i', input_path,
-                    '-vf', f'scale={target_width}:{target_height}',
-                    '-c:a', 'copy',
-                    '-y',
-                    output_path
-                ]
+                stream = graph.scale(stream, target_width, target_height)
             else:
                 # Video chưa đúng tỉ lệ, cần pad hoặc crop
                 if original_ratio > target_ratio:
                     # Video rộng hơn, cần crop chiều rộng
                     new_width = int(height * target_ratio)
                     x_offset = (width - new_width) // 2
-                    vf = f'crop={new_width}:{height}:{x_offset}:0,scale={target_width}:{target_height}'
+                    stream = graph.filter(stream, 'crop', new_width, height, x_offset, 0)
+                    stream = graph.scale(stream, target_width, target_height)
                 else:
                     # Video cao hơn, cần pad chiều rộng với blur background
-                    vf = f'scale={target_width}:{target_height}:force_original_aspect_ratio=decrease,pad={target_width}:{target_height}:(ow-iw)/2:(oh-ih)/2:black'
-                
-                cmd = [
-                    self.ffmpeg_path,
-                    '-i', input_path,
-                    '-vf', vf,
-                    '-c:a', 'copy',
-                    '-y',
-                    output_path
-                ]
+                    stream = graph.scale(stream, target_width, target_height, force_original_aspect_ratio='decrease')
+                    stream = graph.filter(stream, 'pad', target_width, target_height, '(ow-iw)/2', '(oh-ih)/2', 'black')
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            cmd = [
+                self.ffmpeg_path,
+                '-i', input_path,
+                '-vf', graph.compile_simple(),
+                *encoder_args(encoder_profile),
+                '-c:a', 'copy',
+                '-y',
+                output_path
+            ]
+            
+            result = run_ffmpeg(cmd)
             
             if result.returncode != 0:
                 raise Exception(f"Lỗi chuyển đổi tỉ lệ: {result.stderr}")
@@ -548,14 +545,12 @@ class VideoProcessor:
         return None
     
  
-    def _add_subtitle_only(self, video_path, subtitle_path, output_path, subtitle_style=None):
+    def _add_subtitle_only(self, video_path, subtitle_path, output_path, subtitle_style=None,
+                           encoder_profile=None):
         """
         Chỉ ghép phụ đề vào video với hỗ trợ subtitle config mới
         """
         try:
-            # Chuẩn bị subtitle path
-            subtitle_path_escaped = subtitle_path.replace('\\', '/').replace(':', '\\:')
-            
             # ✅ SỬA: Sử dụng SubtitleConfig system
             if subtitle_style is None:
                 # Default config
@@ -575,17 +570,15 @@ class VideoProcessor:
             style_string = subtitle_config.get_full_style_string(detected_language)
             
             # Tạo filter subtitle
-            font_path = self._get_font_path()
-            if font_path:
-                subtitle_filter = f"subtitles='{subtitle_path_escaped}':fontsdir='{font_path}':force_style='{style_string}'"
-            else:
-                subtitle_filter = f"subtitles='{subtitle_path_escaped}':force_style='{style_string}'"
+            graph = FilterGraph()
+            graph.subtitles(graph.input(video_path), subtitle_path, style_string, fonts_dir=self._get_font_path())
             
             # Tạo command
             cmd = [
                 self.ffmpeg_path,
                 '-i', video_path,
-                '-vf', subtitle_filter,
+                '-vf', graph.compile_simple(),
+                *encoder_args(encoder_profile),
                 '-c:a', 'copy',
                 '-y',
                 output_path
@@ -598,7 +591,7 @@ class VideoProcessor:
             print(f"🎨 Style: {style_string}")
             print(f"💾 Output: {output_path}")
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = run_ffmpeg(cmd)
             
             if result.returncode != 0:
                 raise Exception(f"Lỗi ghép phụ đề: {result.stderr}")
@@ -646,7 +639,8 @@ class VideoProcessor:
         except Exception:
             return 'en'  # Default if detection fails
 
-    def _add_subtitle_and_media_overlay(self, video_path, subtitle_path, output_path, img_folder, overlay_times, subtitle_style=None):
+    def _add_subtitle_and_media_overlay(self, video_path, subtitle_path, output_path, img_folder, overlay_times,
+                                        subtitle_style=None, encoder_profile=None):
         """
         Ghép phụ đề, ảnh và video overlay (với chroma key) vào video chính
         
@@ -657,13 +651,11 @@ class VideoProcessor:
             img_folder (str): Thư mục chứa ảnh/video overlay
             overlay_times (dict): Thời gian hiển thị overlay
             subtitle_style (dict): Kiểu phụ đề
+            encoder_profile (str, optional): Profile encoder
         """
         try:
             from subtitle_styles import get_subtitle_style_string, get_preset_style
             
-            # Chuẩn bị subtitle path
-            subtitle_path_escaped = subtitle_path.replace('\\', '/').replace(':', '\\:')
-            
             # Tìm tất cả file media trong thư mục
             import glob
             media_files = []
@@ -678,7 +670,8 @@ class VideoProcessor:
             
             if not media_files:
                 print("⚠️ Không tìm thấy file media nào, chỉ ghép phụ đề...")
-                return self._add_subtitle_only(video_path, subtitle_path, output_path, subtitle_style)
+                return self._add_subtitle_only(video_path, subtitle_path, output_path, subtitle_style,
+                                               encoder_profile=encoder_profile)
             
             # Chuẩn bị danh sách overlay
             overlay_configs = []
@@ -703,17 +696,8 @@ class VideoProcessor:
             
             if not overlay_configs:
                 print("⚠️ Không có file nào trong overlay_times, chỉ ghép phụ đề...")
-                return self._add_subtitle_only(video_path, subtitle_path, output_path, subtitle_style)
-            
-            # Tạo command FFmpeg
-            inputs = ['-i', video_path]
-            
-            # Thêm tất cả file overlay vào inputs
-            for config in overlay_configs:
-                inputs.extend(['-i', config['file']])
-            
-            # Tạo filter complex
-            filter_parts = []
+                return self._add_subtitle_only(video_path, subtitle_path, output_path, subtitle_style,
+                                               encoder_profile=encoder_profile)
             
             # Xác định style subtitle - ĐÃ CẬP NHẬT MẶC ĐỊNH
             if subtitle_style is None:
@@ -738,55 +722,41 @@ class VideoProcessor:
                     opacity=subtitle_style.get("opacity", 255)
                 )
             
+            graph = FilterGraph()
+            main_stream = graph.input(video_path)
+            
             # Bước 1: Thêm subtitles
-            font_path = self._get_font_path()
-            if font_path:
-                subtitle_filter = f"[0:v]subtitles='{subtitle_path_escaped}':fontsdir='{font_path}':force_style='{style_string}'[sub]"
-            else:
-                subtitle_filter = f"[0:v]subtitles='{subtitle_path_escaped}':force_style='{style_string}'[sub]"
-            filter_parts.append(subtitle_filter)
+            current = graph.subtitles(main_stream, subtitle_path, style_string, fonts_dir=self._get_font_path())
             
             # Bước 2: Xử lý từng overlay
-            current_input = "sub"
-            for i, config in enumerate(overlay_configs):
-                input_index = i + 1  # Input index của overlay
+            for config in overlay_configs:
+                end_time = config['start_time'] + config['duration']
                 
                 if config['is_video']:
                     # Xử lý video overlay với chroma key
                     # Scale video overlay xuống 30% chiều cao
-                    scale_filter = f"[{input_index}:v]scale=-1:ih*0.3[scaled{i}]"
-                    filter_parts.append(scale_filter)
+                    overlay_stream = graph.scale(graph.input(config['file']), -1, "ih*0.3")
                     
                     # Áp dụng chroma key để xóa phông xanh
-                    chromakey_filter = f"[scaled{i}]chromakey=0x00ff00:0.1:0.1[chroma{i}]"
-                    filter_parts.append(chromakey_filter)
-                    
-                    # Overlay video
-                    end_time = config['start_time'] + config['duration']
-                    overlay_filter = f"[{current_input}][chroma{i}]overlay=(main_w-overlay_w)/2:(main_h-overlay_h)/2:enable='between(t,{config['start_time']},{end_time})'"
+                    overlay_stream = graph.filter(overlay_stream, 'chromakey', '0x00ff00', 0.1, 0.1)
                     
+                    # Overlay video (giữ hành vi cũ: lặp frame cuối nếu video ngắn hơn)
+                    current = graph.overlay(current, overlay_stream, "(main_w-overlay_w)/2", "(main_h-overlay_h)/2",
+                                            config['start_time'], end_time, eof_action=None)
                 else:
-                    # Xử lý ảnh overlay
-                    # Scale ảnh xuống 10%
-                    scale_filter = f"[{input_index}]scale=iw*0.1:ih*0.1[img{i}]"
-                    filter_parts.append(scale_filter)
-                    
-                    # Overlay ảnh
-                    end_time = config['start_time'] + config['duration']
-                    overlay_filter = f"[{current_input}][img{i}]overlay=(main_w-overlay_w)/2:(main_h-overlay_h)/2:enable='between(t,{config['start_time']},{end_time})'"
-                
-                if i < len(overlay_configs) - 1:
-                    overlay_filter += f"[tmp{i}]"
-                    current_input = f"tmp{i}"
-                
-                filter_parts.append(overlay_filter)
+                    # Xử lý ảnh overlay - ảnh đã được thu nhỏ 10% sẵn trong cache
+                    overlay_stream = image_overlay_input(graph, config['file'], 0.1, config['start_time'], config['duration'])
+                    current = graph.overlay(current, overlay_stream, "(main_w-overlay_w)/2", "(main_h-overlay_h)/2",
+                                            config['start_time'], end_time)
             
-            filter_complex = ";".join(filter_parts)
+            graph.output(current)
+            input_args, filter_complex, _ = graph.compile()
             
             cmd = [
                 self.ffmpeg_path,
-                *inputs,
+                *input_args,
                 '-filter_complex', filter_complex,
+                *encoder_args(encoder_profile),
                 '-c:a', 'copy',
                 '-y',
                 output_path
@@ -801,7 +771,7 @@ class VideoProcessor:
                 print(f"🎭 {media_type}: {config['filename']} ({config['start_time']}s, {config['duration']}s)")
             print(f"📂 Output: {output_path}")
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = run_ffmpeg(cmd)
             
             if result.returncode != 0:
                 print(f"❌ FFmpeg error: {result.stderr}")
@@ -815,63 +785,33 @@ class VideoProcessor:
 
     # ===== HÀM BỔ SUNG: SỬA CÁC HARDCODE STYLES KHÁC =====
 
-    def add_subtitle_to_video_with_images_filter(self, video_path, subtitle_path, output_path, img_folder):
+    def add_subtitle_to_video_with_images_filter(self, video_path, subtitle_path, output_path, img_folder, timeline=None,
+                                                 encoder_profile=None):
         """
         Sử dụng filter để burn-in phụ đề và ghép ảnh cùng lúc vào video - ĐÃ SỬA
+        
+        Args:
+            timeline (str | dict, optional): Timeline overlay khai báo
+                                             (None = timelines/images_filter.json)
+            encoder_profile (str, optional): Profile encoder
         """
         try:
             from subtitle_styles import get_subtitle_style_string
+            from overlay_timeline import (
+                compile_timeline, get_default_timeline_path, probe_canvas_size
+            )
             
-            # Chuyển đổi đường dẫn Windows cho phụ đề
-            subtitle_path_escaped = subtitle_path.replace('\\', '/').replace(':', '\\:')
+            # Compile timeline ảnh (thay cho image_configs hardcode trước đây)
+            if timeline is None:
+                timeline = get_default_timeline_path("images_filter")
+            compiled = compile_timeline(timeline, probe_canvas_size(video_path), base_dir=img_folder)
             
-            # Định nghĩa ảnh và thời gian xuất hiện
-            image_configs = [
-                {
-                    "image": "1.png",  # Ảnh 1
-                    "start_time": 5,   # Bắt đầu ở giây thứ 5
-                    "end_time": 6,     # Kết thúc ở giây thứ 7
-                    "y_offset": 865   # Vị trí Y
-                },
-                {
-                    "image": "2.png",  # Ảnh 2
-                    "start_time": 6,   # Bắt đầu ở giây thứ 7
-                    "end_time": 7,     # Kết thúc ở giây thứ 9
-                    "y_offset": 900   # Vị trí Y (giống ảnh 3)
-                },
-                {
-                    "image": "3.png",  # Ảnh 3 
-                    "start_time": 7,   # Bắt đầu ở giây thứ 7
-                    "end_time": 8,     # Kết thúc ở giây thứ 9
-                    "y_offset": 900   # Vị trí Y
-                }
-            ]
-            
-            # Kiểm tra ảnh có tồn tại không
-            existing_images = []
-            for config in image_configs:
-                img_path = os.path.join(img_folder, config["image"])
-                if os.path.exists(img_path):
-                    existing_images.append(config)
-                else:
-                    print(f"⚠️ Ảnh không tồn tại: {img_path}, bỏ qua...")
+            graph = FilterGraph()
+            main_stream = graph.input(video_path)
             
-            # Tạo command FFmpeg
-            inputs = ['-i', video_path]
-            
-            if existing_images:
-                # Có ảnh để ghép
-                for config in existing_images:
-                    img_path = os.path.join(img_folder, config["image"])
-                    img_path = img_path.replace('\\', '/')
-                    inputs.extend(['-i', img_path])
-                
-                # Tạo filter complex: subtitles + overlay images
-                filter_parts = []
-                
+            if compiled.items:
+                # Có ảnh để ghép: subtitles + overlay images
                 # Bước 1: Thêm subtitles vào video với font tùy chỉnh - ĐÃ SỬA
-                font_path = self._get_font_path()
-                
                 # SỬA: Sử dụng style system thay vì hardcode
                 style_string = get_subtitle_style_string(
                     text_color="black",      # Màu mới
@@ -880,42 +820,17 @@ class VideoProcessor:
                     font_size=10,             # Font size nhỏ cho ảnh overlay
                     margin_v=100
                 )
+                current = graph.subtitles(main_stream, subtitle_path, style_string, fonts_dir=self._get_font_path())
                 
-                if font_path:
-                    subtitle_filter = f"[0:v]subtitles='{subtitle_path_escaped}':fontsdir='{font_path}':force_style='{style_string}'[sub]"
-                else:
-                    subtitle_filter = f"[0:v]subtitles='{subtitle_path_escaped}':force_style='{style_string}'[sub]"
-                filter_parts.append(subtitle_filter)
-                
-                # Bước 2: Thêm từng ảnh với scale 10%
-                current_input = "sub"
-                for i, config in enumerate(existing_images):
-                    img_input = str(i + 1)  # Input index của ảnh
-                    
-                    # Thêm filter scale để thu nhỏ ảnh xuống 10%
-                    scale_filter = f"[{img_input}]scale=iw*0.1:ih*0.1[img{i}]"
-                    filter_parts.append(scale_filter)
-                    
-                    # Tính toán vị trí overlay
-                    x_pos = "(main_w-overlay_w)/2"  # Căn giữa
-                    y_pos = str(config["y_offset"])
-                    
-                    # Overlay với ảnh đã scale
-                    overlay_filter = f"[{current_input}][img{i}]overlay={x_pos}:{y_pos}:enable='between(t,{config['start_time']},{config['end_time']})'"
-                    
-                    if i < len(existing_images) - 1:
-                        # Không phải ảnh cuối cùng
-                        overlay_filter += f"[tmp{i}]"
-                        current_input = f"tmp{i}"
-                    
-                    filter_parts.append(overlay_filter)
-                
-                filter_complex = ";".join(filter_parts)
+                # Bước 2: Thêm các overlay theo timeline
+                graph.output(compiled.apply(graph, current))
+                input_args, filter_complex, _ = graph.compile()
                 
                 cmd = [
                     self.ffmpeg_path,
-                    *inputs,
+                    *input_args,
                     '-filter_complex', filter_complex,
+                    *encoder_args(encoder_profile),
                     '-c:a', 'copy',
                     '-y',
                     output_path
@@ -930,11 +845,13 @@ class VideoProcessor:
                     font_size=10,
                     margin_v=150
                 )
+                graph.subtitles(main_stream, subtitle_path, style_string)
                 
                 cmd = [
                     self.ffmpeg_path,
                     '-i', video_path,
-                    '-vf', f"subtitles='{subtitle_path_escaped}':force_style='{style_string}'",
+                    '-vf', graph.compile_simple(),
+                    *encoder_args(encoder_profile),
                     '-c:a', 'copy',
                     '-y',
                     output_path
@@ -943,12 +860,11 @@ class VideoProcessor:
             print(f"🎞️ Đang ghép phụ đề và ảnh vào video...")
             print(f"📂 Video: {video_path}")
             print(f"📂 Subtitle: {subtitle_path}")
-            if existing_images:
-                for config in existing_images:
-                    print(f"🖼️ Ảnh: {config['image']} ({config['start_time']}s-{config['end_time']}s)")
+            for item in compiled.items:
+                print(f"🖼️ Ảnh: {item['file']} ({item['start']}s-{item['end']}s)")
             print(f"📂 Output: {output_path}")
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = run_ffmpeg(cmd)
             
             if result.returncode != 0:
                 raise Exception(f"Lỗi ghép phụ đề và ảnh: {result.stderr}")
@@ -956,4 +872,4 @@ class VideoProcessor:
             print(f"✅ Ghép phụ đề và ảnh thành công: {output_path}")
                 
         except Exception as e:
-            raise Exception(f"Không thể ghép phụ đề và ảnh với filter: {str(e)}")      
\ No newline at end of file
+            raise Exception(f"Không thể ghép phụ đề và ảnh với filter: {str(e)}")